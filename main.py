@@ -8,14 +8,22 @@ from preprocesing.extract_and_verify_fonts import (
                                                    get_font_files,
                                                    verify_font_files
                                                    )
-from preprocesing.convert_images import convert_images_to_bw
-from preprocesing.layout_engine.page_creator import render_pages
-from preprocesing.layout_engine.page_dataset_creator import (
-                                                        create_page_metadata
-                                                        )
-from tqdm import tqdm
+from preprocesing.convert_images import (
+                                        convert_images_to_bw,
+                                        catalog_images,
+                                        store_images,
+                                        pack_images,
+                                        unpack_images,
+                                        convert_zip_to_bw
+                                        )
+from preprocesing.layout_engine.page_creator import (
+                                                render_pages,
+                                                create_pages_metadata,
+                                                generate_and_render_pages,
+                                                pipeline_pages
+                                                )
+from preprocesing.layout_engine.assets import build_manifest
 import os
-import pandas as pd
 from argparse import ArgumentParser
 import pytest
 
@@ -50,15 +58,74 @@ if __name__ == '__main__':
     parser.add_argument("--convert_images", "-ci",
                         action="store_true",
                         help="Convert downloaded images to black and white")
+    parser.add_argument("--from_zip", "-fz",
+                        action="store_true",
+                        help="Convert images straight from the " +
+                        "downloaded archive without extracting it")
+    parser.add_argument("--crop_images", action="store_true",
+                        help="Crop the black areas of the images " +
+                        "when converting them from the archive")
+
+    parser.add_argument("--build_manifest", "-bm",
+                        action="store_true",
+                        help="Scan the datasets into the asset manifest " +
+                        "that page creation loads at startup")
+
+    parser.add_argument("--catalog_images", "-cat",
+                        action="store_true",
+                        help="Record the crop boxes of the black and " +
+                        "white images and flag unusable ones")
+
+    parser.add_argument("--store_images", "-si",
+                        action="store_true",
+                        help="Write cropped and page sized images to " +
+                        "memory mapped files for faster rendering")
+
+    parser.add_argument("--pack_images", "-pi",
+                        action="store_true",
+                        help="Pack the black and white images into " +
+                        "a few large files")
+    parser.add_argument("--unpack_images", "-ui",
+                        action="store_true",
+                        help="Write packed images back out as files")
 
     parser.add_argument("--create_page_metadata", "-pm", nargs=1, type=int)
     parser.add_argument("--render_pages", "-rp", action="store_true")
     parser.add_argument("--generate_pages", "-gp", nargs=1, type=int)
     parser.add_argument("--dry", action="store_true", default=False)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes for page creation")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed for reproducible page metadata")
+    parser.add_argument("--stream", action="store_true",
+                        help="Render pages as they are generated " +
+                        "without reading back their metadata")
+    parser.add_argument("--no_metadata", action="store_true",
+                        help="Don't write metadata when streaming pages")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Render pages while their metadata " +
+                        "is still being created")
+    parser.add_argument("--metadata_format", choices=["json", "compact",
+                                                      "seed", "plan"],
+                        default=None,
+                        help="Format to write page metadata in, " +
+                        "defaults to the one in the config")
+    parser.add_argument("--metadata_store", action="store_true",
+                        help="Write page metadata as records of a few " +
+                        "large shard files instead of a file per page")
+    parser.add_argument("--metadata_workers", type=int, default=None)
+    parser.add_argument("--render_workers", type=int, default=None)
+    parser.add_argument("--queue_size", type=int, default=None,
+                        help="Pages that can wait to be rendered " +
+                        "when pipelining")
     parser.add_argument("--run_tests", action="store_true")
 
     args = parser.parse_args()
 
+    # Render workers of the pipeline read metadata files by name
+    if args.metadata_store and args.pipeline:
+        parser.error("--metadata_store can't be used with --pipeline")
+
     # Wrangling with the text dataset
     if args.download_jesc:
         download_and_extract_jesc()
@@ -96,11 +163,37 @@ if __name__ == '__main__':
 
     # Download and convert image from Kaggle
     if args.download_images:
-        download_db_illustrations()
-        convert_images_to_bw()
+        download_db_illustrations(unzip=not args.from_zip)
+
+    if args.download_images or args.convert_images:
+        if args.from_zip:
+            # Catalogs them while converting
+            convert_zip_to_bw(crop=args.crop_images)
+        else:
+            convert_images_to_bw()
+            catalog_images()
+
+    if args.catalog_images and not (args.download_images or
+                                    args.convert_images):
+        catalog_images()
+
+    if args.pack_images:
+        pack_images()
 
-    if args.convert_images:
-        convert_images_to_bw()
+    if args.unpack_images:
+        unpack_images()
+
+    if args.store_images:
+        store_images()
+
+    # Asset manifest
+    if args.build_manifest:
+        print("Building asset manifest")
+        manifest = build_manifest()
+        print("Illustrations:", len(manifest['image_dir']),
+              "Fonts:", len(manifest['viable_font_files']),
+              "Speech bubbles:",
+              len(manifest['speech_bubble_catalog']['files']))
 
     # Page creation
     if args.create_page_metadata is not None:
@@ -110,42 +203,16 @@ if __name__ == '__main__':
 
         # number of pages
         n = args.create_page_metadata[0]
-        print("Loading files")
-        image_dir_path = "datasets/image_dataset/db_illustrations_bw/"
-        image_dir = os.listdir(image_dir_path)
-
-        text_dataset = pd.read_parquet("datasets/text_dataset/jesc_dialogues")
-
-        speech_bubbles_path = "datasets/speech_bubbles_dataset/"
-
-        speech_bubble_files = os.listdir(speech_bubbles_path+"/files/")
-        speech_bubble_files = [speech_bubbles_path+"files/"+filename
-                               for filename in speech_bubble_files
-                               ]
-
-        speech_bubble_tags = pd.read_csv(speech_bubbles_path +
-                                         "writing_area_labels.csv")
-        speech_bubble_tags['imagename'] = speech_bubble_tags['imagename'].str.replace('~', '-') # fix kaggle path error
-        font_files_path = "datasets/font_dataset/"
-        viable_font_files = []
-        with open(font_files_path+"viable_fonts.csv") as viable_fonts:
-
-            for line in viable_fonts.readlines():
-                path, viable = line.split(",")
-                viable = viable.replace("\n", "")
-                if viable == "True":
-                    viable_font_files.append(path)
 
         print("Running creation of metadata")
-        for i in tqdm(range(n)):
-            page = create_page_metadata(image_dir,
-                                        image_dir_path,
-                                        viable_font_files,
-                                        text_dataset,
-                                        speech_bubble_files,
-                                        speech_bubble_tags
-                                        )
-            page.dump_data(metadata_folder, dry=args.dry)
+        create_pages_metadata(n,
+                              metadata_folder,
+                              seed=args.seed,
+                              workers=args.workers,
+                              dry=args.dry,
+                              metadata_format=args.metadata_format,
+                              metadata_store=args.metadata_store
+                              )
 
     if args.render_pages:
 
@@ -158,63 +225,77 @@ if __name__ == '__main__':
                 os.mkdir(images_folder)
 
             print("Loading metadata and rendering")
-            render_pages(metadata_folder, images_folder, dry=args.dry)
+            render_pages(metadata_folder, images_folder,
+                         dry=args.dry, workers=args.workers)
 
     # Combines the above in case of small size
     if args.generate_pages is not None:
         # number of pages
         n = args.generate_pages[0]
 
+        # Pages are only rendered from their metadata files after
+        # they're written unless they're streamed so it's written
+        # even on dry runs
         metadata_folder = "datasets/page_metadata/"
-        if not os.path.isdir(metadata_folder) and not args.dry:
+        if not os.path.isdir(metadata_folder) and not (args.dry and
+                                                       args.stream):
             os.mkdir(metadata_folder)
 
-        print("Loading files")
-        image_dir_path = "datasets/image_dataset/db_illustrations_bw/"
-        image_dir = os.listdir(image_dir_path)
-
-        text_dataset = pd.read_parquet("datasets/text_dataset/jesc_dialogues")
-
-        speech_bubbles_path = "datasets/speech_bubbles_dataset/"
-
-        speech_bubble_files = os.listdir(speech_bubbles_path+"/files/")
-        speech_bubble_files = [speech_bubbles_path+"files/"+filename
-                               for filename in speech_bubble_files
-                               ]
-
-        speech_bubble_tags = pd.read_csv(speech_bubbles_path +
-                                         "writing_area_labels.csv")
-        speech_bubble_tags['imagename'] = speech_bubble_tags['imagename'].str.replace('~', '-') # fix kaggle path error
-        font_files_path = "datasets/font_dataset/"
-        viable_font_files = []
-        with open(font_files_path+"viable_fonts.csv") as viable_fonts:
-
-            for line in viable_fonts.readlines():
-                path, viable = line.split(",")
-                viable = viable.replace("\n", "")
-                if viable == "True":
-                    viable_font_files.append(path)
-
-        print("Running creation of metadata")
-        for i in tqdm(range(n)):
-            page = create_page_metadata(image_dir,
-                                        image_dir_path,
-                                        viable_font_files,
-                                        text_dataset,
-                                        speech_bubble_files,
-                                        speech_bubble_tags
-                                        )
-            page.dump_data(metadata_folder, dry=False)
+        if args.stream:
+            images_folder = "datasets/page_images/"
+            if not os.path.isdir(images_folder) and not args.dry:
+                os.mkdir(images_folder)
 
-        if not os.path.isdir(metadata_folder):
-            print("There is no metadata please generate metadata first")
-        else:
+            if args.no_metadata:
+                metadata_folder = None
+
+            print("Generating and rendering pages")
+            generate_and_render_pages(n,
+                                      images_folder,
+                                      metadata_dir=metadata_folder,
+                                      seed=args.seed,
+                                      workers=args.workers,
+                                      dry=args.dry,
+                                      metadata_format=args.metadata_format,
+                                      metadata_store=args.metadata_store
+                                      )
+        elif args.pipeline:
             images_folder = "datasets/page_images/"
             if not os.path.isdir(images_folder) and not args.dry:
                 os.mkdir(images_folder)
 
-            print("Loading metadata and rendering")
-            render_pages(metadata_folder, images_folder, dry=args.dry)
+            print("Generating and rendering pages")
+            pipeline_pages(n,
+                           metadata_folder,
+                           images_folder,
+                           seed=args.seed,
+                           metadata_workers=args.metadata_workers,
+                           render_workers=args.render_workers,
+                           queue_size=args.queue_size,
+                           dry=args.dry,
+                           metadata_format=args.metadata_format
+                           )
+        else:
+            print("Running creation of metadata")
+            create_pages_metadata(n,
+                                  metadata_folder,
+                                  seed=args.seed,
+                                  workers=args.workers,
+                                  dry=False,
+                                  metadata_format=args.metadata_format,
+                                  metadata_store=args.metadata_store
+                                  )
+
+            if not os.path.isdir(metadata_folder):
+                print("There is no metadata please generate metadata first")
+            else:
+                images_folder = "datasets/page_images/"
+                if not os.path.isdir(images_folder) and not args.dry:
+                    os.mkdir(images_folder)
+
+                print("Loading metadata and rendering")
+                render_pages(metadata_folder, images_folder,
+                             dry=args.dry, workers=args.workers)
 
     if args.run_tests:
         pytest.main([
@@ -1,42 +1,587 @@
 import os
+import zipfile
+from io import BytesIO
 from tqdm import tqdm
+import numpy as np
 from PIL import Image
 import concurrent.futures
+from itertools import repeat
+from collections import deque
 import time
 
+from . import config_file as cfg
+from .layout_engine.helpers import get_crop_box
+from .layout_engine.illustration_catalog import IllustrationCatalog
+from .layout_engine.illustration_store import write_illustration_store
+from .layout_engine.caches import load_illustration, open_illustration
+from .layout_engine.blob_store import BlobStore, pack_files, unpack_files
+
 image_dataset_dir = "datasets/image_dataset/tagged-anime-illustrations/"\
                     "danbooru-images/danbooru-images/"
 
 processed_image_dir = "datasets/image_dataset/db_illustrations_bw/"
 
+image_dataset_zip = "datasets/image_dataset/tagged-anime-illustrations.zip"
+
 
-def convert_single_image(image_path):
+def convert_single_image(image_path, output_dir=processed_image_dir):
     """
     Opens a anime illustration image and turns it black and white
+
+    :param image_path: Path to the illustration
+
+    :type image_path: str
+
+    :param output_dir: Folder to write the black and white image to
+
+    :type output_dir: str, optional
+
+    :return: Whether the image was converted
+
+    :rtype: bool
     """
-    img = Image.open(image_path)
-    bw_img = img.convert("L")
     filename = image_path.split("/")[-1]
-    bw_img.save(processed_image_dir+filename, "JPEG")
+    output_path = output_dir + filename
+
+    # Written under another name first so that an interrupted
+    # run never leaves a partial image that looks up to date
+    tmp_path = output_path + ".tmp"
+    try:
+        img = Image.open(image_path)
+        bw_img = img.convert("L")
+        bw_img.save(tmp_path, "JPEG")
+    except (OSError, SyntaxError, ValueError,
+            Image.DecompressionBombError):
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+        return False
 
+    os.replace(tmp_path, output_path)
+    return True
 
-def convert_images_to_bw():
+
+def remove_partial_images(output_dir):
+    """
+    Remove the partial images interrupted runs left in a folder
+
+    :param output_dir: Folder the images are written to
+
+    :type output_dir: str
+    """
+    for entry in os.scandir(output_dir):
+        if entry.name.endswith(".tmp"):
+            os.remove(entry.path)
+
+
+def convert_images_to_bw(image_dataset_dir=image_dataset_dir,
+                         output_dir=processed_image_dir,
+                         workers=None):
     """
     Concurrently and in parallel convert the anime
-    illustration images to black and white
+    illustration images to black and white. Images that
+    were already converted since they last changed are skipped.
+
+    :param image_dataset_dir: Folder of the folders of illustrations
+
+    :type image_dataset_dir: str, optional
+
+    :param output_dir: Folder to write the black and white images to
+
+    :type output_dir: str, optional
+
+    :param workers: Number of worker processes, defaults to None
+    i.e. one per CPU
+
+    :type workers: int, optional
     """
-    if not os.path.isdir(processed_image_dir):
-        os.mkdir(processed_image_dir)
+    if not os.path.isdir(output_dir):
+        os.mkdir(output_dir)
 
-    print("Converting images to black and white")
-    image_folders = os.listdir(image_dataset_dir)
-    for folder in tqdm(image_folders):
+    remove_partial_images(output_dir)
+
+    # Modification times of what's already been converted
+    converted = {entry.name: entry.stat().st_mtime
+                 for entry in os.scandir(output_dir)
+                 if entry.is_file()}
+
+    image_paths = []
+    skipped = 0
+    for folder in sorted(os.listdir(image_dataset_dir)):
         folder_path = image_dataset_dir+folder + "/"
-        if os.path.isdir(folder_path):
-            image_paths = [folder_path + image
-                           for image in os.listdir(folder_path)
-                           if image.endswith(".jpg")]
-
-            # Since image processing is CPU and IO intensive
-            with concurrent.futures.ProcessPoolExecutor() as executor:
-                results = executor.map(convert_single_image, image_paths)
+        if not os.path.isdir(folder_path):
+            continue
+
+        for entry in os.scandir(folder_path):
+            if not entry.name.endswith(".jpg"):
+                continue
+
+            if converted.get(entry.name, -1) >= entry.stat().st_mtime:
+                skipped += 1
+                continue
+
+            image_paths.append(folder_path + entry.name)
+
+    print("Converting images to black and white")
+    print("Skipping", skipped, "images that are already converted")
+
+    start = time.time()
+    chunksize = max(1, min(256, len(image_paths)//((workers or
+                                                   os.cpu_count())*4)))
+
+    # Since image processing is CPU and IO intensive
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers) as executor:
+        results = list(tqdm(executor.map(convert_single_image,
+                                         image_paths,
+                                         repeat(output_dir),
+                                         chunksize=chunksize),
+                            total=len(image_paths)))
+
+    duration = time.time() - start
+    failed = len(results) - sum(results)
+    print("Converted", sum(results), "images in", round(duration, 2),
+          "seconds at", round(len(results)/max(duration, 1e-9), 2),
+          "images/sec")
+    if failed > 0:
+        print(failed, "images couldn't be converted")
+
+
+def catalog_single_image(image_path):
+    """
+    Find an illustration's dimensions and the box around the
+    part of it that isn't black and check whether it can be used
+
+    :param image_path: Path to the illustration
+
+    :type image_path: str
+
+    :return: A tuple of the size, crop box and whether it's valid
+
+    :rtype: tuple
+    """
+    try:
+        img = open_illustration(image_path)
+        img.draft("L", img.size)
+        size = img.size
+        img_array = np.asarray(img.convert("L"))
+    except (OSError, SyntaxError, ValueError,
+            Image.DecompressionBombError):
+        # Corrupt or truncated files
+        return (0, 0), (0, 0, 0, 0), False
+
+    crop_box, valid = get_catalog_entry(img_array)
+
+    return size, crop_box, valid
+
+
+def get_catalog_entry(img_array):
+    """
+    Find the box around the part of a black and white
+    illustration that isn't black and check whether it can be used
+
+    :param img_array: The illustration
+
+    :type img_array: numpy.ndarray
+
+    :return: A tuple of the crop box and whether it's valid
+
+    :rtype: tuple
+    """
+    crop_box = get_crop_box(img_array)
+    width = crop_box[2] - crop_box[0]
+    height = crop_box[3] - crop_box[1]
+
+    # All black images or ones that would be
+    # too small once cropped
+    valid = (img_array.max() > 0 and
+             width >= cfg.illustration_min_size and
+             height >= cfg.illustration_min_size)
+
+    return crop_box, bool(valid)
+
+
+def catalog_images(image_dir=processed_image_dir,
+                   catalog_file=cfg.illustration_catalog_file,
+                   workers=None):
+    """
+    Concurrently and in parallel record every black and white
+    illustration's dimensions and crop box in a catalog that
+    rendering crops with and page creation picks valid
+    illustrations from
+
+    :param image_dir: Folder of the illustrations
+
+    :type image_dir: str, optional
+
+    :param catalog_file: Where to write the catalog
+
+    :type catalog_file: str, optional
+
+    :param workers: Number of worker processes, defaults to None
+    i.e. one per CPU
+
+    :type workers: int, optional
+
+    :return: The catalog
+
+    :rtype: IllustrationCatalog
+    """
+    print("Cataloging images")
+    names = sorted(name for name in list_images(image_dir)
+                   if name.endswith(".jpg") or name.endswith(".png"))
+    image_paths = [image_dir + name for name in names]
+
+    chunksize = max(1, min(256, len(names)//((workers or
+                                             os.cpu_count())*4)))
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers) as executor:
+        results = list(tqdm(executor.map(catalog_single_image,
+                                         image_paths,
+                                         chunksize=chunksize),
+                            total=len(names)))
+
+    sizes = [size for size, crop_box, valid in results]
+    crop_boxes = [crop_box for size, crop_box, valid in results]
+    valid = [valid for size, crop_box, valid in results]
+
+    catalog = IllustrationCatalog(names, sizes, crop_boxes, valid)
+    catalog.save(catalog_file)
+
+    print("Cataloged", len(catalog), "images of which",
+          len(catalog) - sum(valid), "can't be used")
+
+    return catalog
+
+
+def map_bounded(executor, function, tasks, max_in_flight):
+    """
+    Run a function on tasks in a pool of workers like
+    executor.map but only submit more tasks as the
+    results of earlier ones are used so that only so
+    many results are ever held in memory
+
+    :param executor: The pool of workers
+
+    :type executor: concurrent.futures.Executor
+
+    :param function: The function
+
+    :type function: function
+
+    :param tasks: The tasks
+
+    :type tasks: list
+
+    :param max_in_flight: Most tasks submitted whose results
+    haven't been used yet
+
+    :type max_in_flight: int
+
+    :return: A generator of the results in order
+
+    :rtype: generator
+    """
+    pending = deque()
+    for task in tasks:
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+        pending.append(executor.submit(function, task))
+
+    while pending:
+        yield pending.popleft().result()
+
+
+def resize_single_image(task):
+    """
+    Crop, make black and white and resize an
+    illustration for the illustration store
+
+    :param task: A tuple of the path to the illustration
+    and the size to resize it to
+
+    :type task: tuple
+
+    :return: The illustration
+
+    :rtype: numpy.ndarray
+    """
+    image_path, size = task
+    return np.asarray(load_illustration(image_path, size))
+
+
+def store_images(image_dir=processed_image_dir,
+                 store_dir=cfg.illustration_store_dir,
+                 size=None,
+                 workers=None):
+    """
+    Concurrently and in parallel crop and resize the black and white
+    illustrations and write them to memory mapped files that render
+    workers read them from instead of decoding and resampling them.
+    Only the illustrations the catalog found valid are stored if
+    there is a catalog.
+
+    :param image_dir: Folder of the illustrations
+
+    :type image_dir: str, optional
+
+    :param store_dir: Folder to write the store to
+
+    :type store_dir: str, optional
+
+    :param size: Size to resize the illustrations to, defaults
+    to None i.e. the one in the config
+
+    :type size: tuple, optional
+
+    :param workers: Number of worker processes, defaults to None
+    i.e. one per CPU
+
+    :type workers: int, optional
+
+    :return: The store
+
+    :rtype: IllustrationStore
+    """
+    if size is None:
+        size = cfg.illustration_store_size
+    print("Storing images at", size)
+    if os.path.isfile(cfg.illustration_catalog_file):
+        catalog = IllustrationCatalog.load(cfg.illustration_catalog_file)
+        names = catalog.valid_names()
+    else:
+        names = sorted(name for name in list_images(image_dir)
+                       if name.endswith(".jpg") or name.endswith(".png"))
+
+    tasks = [(image_dir + name, size) for name in names]
+
+    # Each resized illustration is width*height bytes so only
+    # a few per worker are let wait to be written
+    max_in_flight = (workers or os.cpu_count())*2
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers) as executor:
+        illustrations = map_bounded(executor, resize_single_image,
+                                    tasks, max_in_flight)
+        store = write_illustration_store(
+                    store_dir,
+                    size,
+                    tqdm(zip(names, illustrations), total=len(names)),
+                    cfg.illustration_store_shard_bytes
+                    )
+
+    print("Stored", len(store), "images in", store_dir)
+
+    return store
+
+
+def list_images(image_dir=processed_image_dir):
+    """
+    List the black and white illustrations from their
+    folder or from the pack if they've been packed.
+    Partial images left by interrupted runs are left out
+
+    :param image_dir: Folder of the illustrations
+
+    :type image_dir: str, optional
+
+    :return: Filenames of the illustrations
+
+    :rtype: list
+    """
+    if os.path.isdir(image_dir):
+        return [name for name in os.listdir(image_dir)
+                if not name.endswith(".tmp")]
+
+    return BlobStore.load(cfg.illustration_pack_dir).names
+
+
+def pack_images(image_dir=processed_image_dir,
+                pack_dir=cfg.illustration_pack_dir,
+                shard_bytes=cfg.illustration_pack_shard_bytes):
+    """
+    Pack the black and white illustrations into a few large
+    files that they're read from without opening each one
+
+    :param image_dir: Folder of the illustrations
+
+    :type image_dir: str, optional
+
+    :param pack_dir: Folder to write the pack to
+
+    :type pack_dir: str, optional
+
+    :param shard_bytes: Largest size of each of the pack's files
+
+    :type shard_bytes: int, optional
+
+    :return: The pack
+
+    :rtype: BlobStore
+    """
+    print("Packing images")
+    names = sorted(name for name in os.listdir(image_dir)
+                   if name.endswith(".jpg") or name.endswith(".png"))
+    pack = pack_files(image_dir, pack_dir, shard_bytes, names)
+    print("Packed", len(pack), "images into", pack_dir)
+
+    return pack
+
+
+def unpack_images(pack_dir=cfg.illustration_pack_dir,
+                  image_dir=processed_image_dir):
+    """
+    Write the packed black and white illustrations
+    back out as separate files
+
+    :param pack_dir: Folder of the pack
+
+    :type pack_dir: str, optional
+
+    :param image_dir: Folder to write the illustrations to
+
+    :type image_dir: str, optional
+    """
+    print("Unpacking images")
+    num_images = unpack_files(pack_dir, image_dir)
+    print("Unpacked", num_images, "images into", image_dir)
+
+
+# The archive each zip conversion worker reads from
+worker_zip = None
+
+
+def init_zip_worker(zip_path):
+    """
+    Open the archive once per worker process
+
+    :param zip_path: Path of the archive
+
+    :type zip_path: str
+    """
+    global worker_zip
+    worker_zip = zipfile.ZipFile(zip_path)
+
+
+def convert_zip_member(task):
+    """
+    Read an anime illustration straight from the archive,
+    decode it to black and white, optionally crop it and
+    write it with it's catalog entry
+
+    :param task: A tuple of the archive member's name,
+    the folder to write to and whether to crop the image
+
+    :type task: tuple
+
+    :return: A tuple of the filename, size, crop box and
+    whether the image is valid
+
+    :rtype: tuple
+    """
+    member, output_dir, crop = task
+    filename = member.split("/")[-1]
+
+    try:
+        img = Image.open(BytesIO(worker_zip.read(member)))
+        # JPEGs are decoded straight to black and white
+        img.draft("L", img.size)
+        bw_img = img.convert("L")
+    except (OSError, SyntaxError, ValueError,
+            Image.DecompressionBombError):
+        # Corrupt or truncated files aren't written
+        return filename, (0, 0), (0, 0, 0, 0), False
+
+    img_array = np.asarray(bw_img)
+    crop_box, valid = get_catalog_entry(img_array)
+
+    if crop:
+        bw_img = bw_img.crop(crop_box)
+        crop_box = (0, 0) + bw_img.size
+
+    # Written under another name first so that an interrupted
+    # run never leaves a partial image that looks converted
+    output_path = output_dir + filename
+    tmp_path = output_path + ".tmp"
+    try:
+        bw_img.save(tmp_path, "JPEG")
+    except BaseException:
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+
+    return filename, bw_img.size, crop_box, valid
+
+
+def convert_zip_to_bw(zip_path=image_dataset_zip,
+                      output_dir=processed_image_dir,
+                      crop=False,
+                      catalog_file=cfg.illustration_catalog_file,
+                      workers=None):
+    """
+    Concurrently and in parallel convert the anime illustrations
+    to black and white straight from the downloaded archive
+    without extracting it and catalog them along the way
+
+    :param zip_path: Path of the archive
+
+    :type zip_path: str, optional
+
+    :param output_dir: Folder to write the black and
+    white illustrations to
+
+    :type output_dir: str, optional
+
+    :param crop: Whether to write the illustrations already
+    cropped of their black areas, defaults to False
+
+    :type crop: bool, optional
+
+    :param catalog_file: Where to write the illustration catalog,
+    None doesn't write one
+
+    :type catalog_file: str, optional
+
+    :param workers: Number of worker processes, defaults to None
+    i.e. one per CPU
+
+    :type workers: int, optional
+
+    :return: The catalog of the converted illustrations
+
+    :rtype: IllustrationCatalog
+    """
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    remove_partial_images(output_dir)
+
+    with zipfile.ZipFile(zip_path) as zip_file:
+        members = [member for member in zip_file.namelist()
+                   if "danbooru-images/" in member and
+                   member.endswith(".jpg")]
+
+    print("Converting images to black and white from", zip_path)
+    tasks = [(member, output_dir, crop) for member in members]
+    chunksize = max(1, min(64, len(tasks)//((workers or
+                                            os.cpu_count())*4)))
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_zip_worker,
+            initargs=(zip_path,)) as executor:
+        results = list(tqdm(executor.map(convert_zip_member,
+                                         tasks,
+                                         chunksize=chunksize),
+                            total=len(tasks)))
+
+    names = [result[0] for result in results]
+    sizes = [result[1] for result in results]
+    crop_boxes = [result[2] for result in results]
+    valid = [result[3] for result in results]
+
+    catalog = IllustrationCatalog(names, sizes, crop_boxes, valid)
+    if catalog_file is not None:
+        catalog.save(catalog_file)
+
+    print("Converted", len(catalog), "images of which",
+          len(catalog) - sum(valid), "can't be used")
+
+    return catalog
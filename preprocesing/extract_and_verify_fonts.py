@@ -1,4 +1,6 @@
 import os
+import hashlib
+import pickle
 import concurrent.futures
 import zipfile
 import time
@@ -6,10 +8,12 @@ import shutil
 from PIL import Image, ImageFont, ImageDraw
 import dask.dataframe as dd
 import itertools
+import numpy as np
 from fontTools.ttLib import TTFont
 from fontTools.unicode import Unicode
 from fontTools.ttLib import TTLibError
 from tqdm import tqdm
+from .layout_engine.font_index import FontIndex
 from . import config_file as cfg
 
 
@@ -163,16 +167,181 @@ def has_glyph(font, glyph):
     return 0
 
 
+def get_font_codepoints(font_path):
+    """
+    Get every character a font file has a glyph for
+    from the union of all of it's cmap tables
+
+    :param font_path: Path to the font file
+
+    :type font_path: str
+
+    :return: Sorted unique codepoints
+
+    :rtype: numpy.ndarray
+    """
+    font = TTFont(font_path, lazy=True)
+    codepoints = set()
+    for table in font['cmap'].tables:
+        codepoints.update(table.cmap.keys())
+    font.close()
+
+    return np.array(sorted(codepoints), dtype=np.int64)
+
+
+def hash_font_file(font_path):
+    """
+    Hash a font file's contents
+
+    :param font_path: Path to the font file
+
+    :type font_path: str
+
+    :return: Hex digest of the file
+
+    :rtype: str
+    """
+    file_hash = hashlib.sha1()
+    with open(font_path, "rb") as font_file:
+        for block in iter(lambda: font_file.read(1024*1024), b""):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+# Hashes of the font files whose codepoints are already
+# cached which the font verification workers skip reading
+worker_known_hashes = set()
+
+
+def init_font_worker(known_hashes):
+    """
+    Give a font verification worker the hashes of
+    the font files that are already cached
+
+    :param known_hashes: Hashes of the cached font files
+
+    :type known_hashes: set
+    """
+    global worker_known_hashes
+    worker_known_hashes = known_hashes
+
+
+def read_font_codepoints(font_path):
+    """
+    Hash a font file and get it's codepoints if
+    they aren't cached already
+
+    :param font_path: Path to the font file
+
+    :type font_path: str
+
+    :return: A tuple of the file's hash and it's codepoints which
+    are None if they're cached and an empty array if the font
+    can't be read
+
+    :rtype: tuple
+    """
+    file_hash = hash_font_file(font_path)
+    if file_hash in worker_known_hashes:
+        return file_hash, None
+
+    try:
+        codepoints = get_font_codepoints(font_path)
+    except (TTLibError, KeyError, OSError, AssertionError) as e:
+        print("Couldn't read font:", font_path, e)
+        codepoints = np.array([], dtype=np.int64)
+
+    return file_hash, codepoints
+
+
+def load_font_codepoints(font_paths, cache_file, workers=None):
+    """
+    Get the codepoints of many font files in parallel reading only
+    the ones whose contents aren't in the cache and then update it
+
+    :param font_paths: Paths to the font files
+
+    :type font_paths: list
+
+    :param cache_file: Path of the cache of codepoints by file hash
+
+    :type cache_file: str
+
+    :param workers: Number of worker processes, defaults to None
+    i.e. one per CPU
+
+    :type workers: int, optional
+
+    :return: Codepoints of each font file in order
+
+    :rtype: list
+    """
+    cache = {}
+    if os.path.isfile(cache_file):
+        with open(cache_file, "rb") as f:
+            cache = pickle.load(f)
+
+    chunksize = max(1, min(16, len(font_paths)//((workers or
+                                                 os.cpu_count())*4)))
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_font_worker,
+            initargs=(set(cache),)) as executor:
+        results = list(tqdm(executor.map(read_font_codepoints,
+                                         font_paths,
+                                         chunksize=chunksize),
+                            total=len(font_paths)))
+
+    font_codepoints = []
+    for file_hash, codepoints in results:
+        if codepoints is not None:
+            cache[file_hash] = codepoints
+        font_codepoints.append(cache[file_hash])
+
+    with open(cache_file, "wb") as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return font_codepoints
+
+
+def get_font_coverage(codepoints, chars):
+    """
+    Work out how much of a set of characters a font has glyphs for
+
+    :param codepoints: Sorted unique codepoints of the font
+
+    :type codepoints: numpy.ndarray
+
+    :param chars: Codepoints of the characters
+
+    :type chars: numpy.ndarray
+
+    :return: Proportion of the characters covered
+
+    :rtype: float
+    """
+    if len(chars) == 0:
+        return 0.0
+
+    return float(np.isin(chars, codepoints).mean())
+
+
 def verify_font_files(dataframe_file,
                       render_text_test_file,
                       font_file_dir,
-                      font_dataset_path
+                      font_dataset_path,
+                      workers=None
                       ):
     """
     A function that tests whether the font files
     that have been scraped meet the benchmark of
     rendering at least x% (as specififed in the config)
-    of the unique characters in the text corpus
+    of the unique characters in the text corpus.
+    Fonts are read in parallel and the characters they have
+    are cached by file contents so re-runs only read new fonts.
+    An index of which characters each viable font has is
+    written next to the list of viable fonts.
     """
     if not os.path.isfile(render_text_test_file):
         print("Character test string does exist. Generating!")
@@ -184,28 +353,22 @@ def verify_font_files(dataframe_file,
     with open(render_text_test_file, "r") as test_file:
         test_string = test_file.readlines()[0]
 
-    chars = test_string.split(" ")
-    all_fonts = os.listdir(font_file_dir)
+    chars = np.unique([ord(char) for char in test_string.split(" ")
+                       if len(char) == 1])
 
-    total_chars = len(chars)
+    all_fonts = [font_name for font_name in sorted(os.listdir(font_file_dir))
+                 if font_name != ".DS_Store"]
+    font_paths = [font_file_dir + font_name for font_name in all_fonts]
 
-    coverages = []
     print("Verifying fonts")
-    for font_name in tqdm(all_fonts):
-        if font_name == ".DS_Store":
-            continue
-        font_path = font_file_dir + font_name
-        try:
-            font = TTFont(font_path)
-        except TTLibError as e:
-            print(font_path)
-
-        has_glyph_list = []
-        for char in chars:
-            has_glyph_list.append(has_glyph(font, char))
-
-        coverage = sum(has_glyph_list)/total_chars
-        coverages.append([font_path, coverage])
+    font_codepoints = load_font_codepoints(font_paths,
+                                           font_dataset_path +
+                                           "font_codepoints_cache.pkl",
+                                           workers=workers)
+
+    coverages = [[font_path, get_font_coverage(codepoints, chars)]
+                 for font_path, codepoints in zip(font_paths,
+                                                  font_codepoints)]
 
     print("Writing viability to file:", font_dataset_path+"viable_fonts.csv")
     with open(font_dataset_path+"viable_fonts.csv", "w+") as viable_font_file:
@@ -216,3 +379,16 @@ def verify_font_files(dataframe_file,
             else:
                 viable = False
             viable_font_file.write(font[0] + ","+str(viable)+"\n")
+
+    # Index which of the corpus' characters each viable font
+    # has so speech bubbles can pick fonts that render their text
+    viable_fonts = [(font_path, codepoints)
+                    for font_path, codepoints, coverage in zip(
+                        font_paths, font_codepoints, coverages)
+                    if coverage[1] > cfg.font_character_coverage]
+    font_index = FontIndex.build([font[0] for font in viable_fonts],
+                                 [font[1] for font in viable_fonts],
+                                 chars)
+
+    print("Writing font index to file:", font_dataset_path+"font_index.npz")
+    font_index.save(font_dataset_path+"font_index.npz")
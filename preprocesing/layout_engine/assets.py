@@ -0,0 +1,402 @@
+import os
+import pickle
+import pandas as pd
+
+from .speech_bubble_catalog import (
+    SpeechBubbleCatalog, load_speech_bubble_catalog
+)
+from .text_sampler import load_text_corpus
+from .illustration_catalog import IllustrationCatalog
+from .blob_store import BlobStore
+from .font_index import FontIndex
+from .. import config_file as cfg
+
+
+image_dir_path = "datasets/image_dataset/db_illustrations_bw/"
+text_dataset_path = "datasets/text_dataset/jesc_dialogues"
+speech_bubbles_path = "datasets/speech_bubbles_dataset/"
+font_files_path = "datasets/font_dataset/"
+manifest_file = "datasets/asset_manifest.pkl"
+
+# Bump when the manifest's contents change
+manifest_version = 1
+
+
+def load_viable_fonts(font_files_path):
+    """
+    Read which font files were verified to have enough
+    coverage of the text corpus
+
+    :param font_files_path: Path to the font dataset which
+    has the viable_fonts.csv file
+
+    :type font_files_path: str
+
+    :return: A list of viable font file paths
+
+    :rtype: list
+    """
+    viable_font_files = []
+    with open(font_files_path+"viable_fonts.csv") as viable_fonts:
+
+        for line in viable_fonts.readlines():
+            path, viable = line.split(",")
+            viable = viable.replace("\n", "")
+            if viable == "True":
+                viable_font_files.append(path)
+
+    return viable_font_files
+
+
+def load_font_index(font_files_path, viable_font_files):
+    """
+    Read the index of which characters the viable fonts have
+    if it was written for the same fonts
+
+    :param font_files_path: Path to the font dataset which
+    has the font_index.npz file
+
+    :type font_files_path: str
+
+    :param viable_font_files: Paths of the viable fonts
+
+    :type viable_font_files: list
+
+    :return: The index or the list of viable fonts if there's
+    no index for them
+
+    :rtype: FontIndex
+    """
+    index_file = font_files_path + "font_index.npz"
+    if not os.path.isfile(index_file):
+        return viable_font_files
+
+    font_index = FontIndex.load(index_file)
+    if font_index.font_files != list(viable_font_files):
+        print("Font index is out of date, run --verify_fonts to rebuild it")
+        return viable_font_files
+
+    return font_index
+
+
+def load_speech_bubble_files(speech_bubbles_path):
+    """
+    List the speech bubble template files
+
+    :param speech_bubbles_path: Path of the speech bubble dataset
+
+    :type speech_bubbles_path: str
+
+    :return: A list of speech bubble template file paths
+
+    :rtype: list
+    """
+    speech_bubble_files = os.listdir(speech_bubbles_path+"/files/")
+    speech_bubble_files = [speech_bubbles_path+"files/"+filename
+                           for filename in speech_bubble_files
+                           ]
+
+    return speech_bubble_files
+
+
+def get_manifest_sources(image_dir_path,
+                         speech_bubbles_path,
+                         font_files_path):
+    """
+    Get the folders and files an asset manifest is made from
+    and their modification times so that a manifest can be
+    checked against them
+
+    :param image_dir_path: Path of the illustrations folder
+
+    :type image_dir_path: str
+
+    :param speech_bubbles_path: Path of the speech bubble dataset
+
+    :type speech_bubbles_path: str
+
+    :param font_files_path: Path of the font dataset
+
+    :type font_files_path: str
+
+    :return: A dictionary of modification times by path
+
+    :rtype: dict
+    """
+    sources = [speech_bubbles_path + "files/",
+               speech_bubbles_path + "writing_area_labels.csv",
+               font_files_path + "viable_fonts.csv"
+               ]
+
+    # A folder's modification time changes when
+    # files are added to or removed from it
+    mtimes = {path: os.stat(path).st_mtime_ns for path in sources}
+
+    # The illustrations can be in their folder or packed
+    # and the illustration catalog is optional
+    optional_sources = [image_dir_path,
+                        os.path.join(cfg.illustration_pack_dir, "index.npz"),
+                        cfg.illustration_catalog_file
+                        ]
+    for path in optional_sources:
+        mtimes[path] = None
+        if os.path.exists(path):
+            mtimes[path] = os.stat(path).st_mtime_ns
+
+    return mtimes
+
+
+def build_manifest(image_dir_path=image_dir_path,
+                   speech_bubbles_path=speech_bubbles_path,
+                   font_files_path=font_files_path,
+                   manifest_file=manifest_file):
+    """
+    Scan the illustrations, speech bubbles and fonts once and
+    write what was found to a manifest that later runs can load
+    instead of scanning again
+
+    :param image_dir_path: Path of the illustrations folder
+
+    :type image_dir_path: str, optional
+
+    :param speech_bubbles_path: Path of the speech bubble dataset
+
+    :type speech_bubbles_path: str, optional
+
+    :param font_files_path: Path of the font dataset
+
+    :type font_files_path: str, optional
+
+    :param manifest_file: Where to write the manifest, defaults to
+    the datasets folder. None doesn't write it
+
+    :type manifest_file: str, optional
+
+    :return: The manifest
+
+    :rtype: dict
+    """
+    # Taken before scanning so that changes
+    # made during the scan make it stale
+    sources = get_manifest_sources(image_dir_path,
+                                   speech_bubbles_path,
+                                   font_files_path)
+
+    if os.path.isdir(image_dir_path):
+        # Leave out partial images left by interrupted conversions
+        image_dir = [name for name in os.listdir(image_dir_path)
+                     if not name.endswith(".tmp")]
+    else:
+        image_dir = BlobStore.load(cfg.illustration_pack_dir).names
+
+    # Leave out illustrations the catalog
+    # found to be corrupt or degenerate
+    if os.path.isfile(cfg.illustration_catalog_file):
+        illustration_catalog = IllustrationCatalog.load(
+                                    cfg.illustration_catalog_file
+                                    )
+        invalid = (set(illustration_catalog.names) -
+                   set(illustration_catalog.valid_names()))
+        image_dir = [name for name in image_dir if name not in invalid]
+
+    speech_bubble_files = load_speech_bubble_files(speech_bubbles_path)
+
+    labels_file = speech_bubbles_path + "writing_area_labels.csv"
+    speech_bubble_tags = pd.read_csv(labels_file)
+    # fix kaggle path error
+    speech_bubble_tags['imagename'] = speech_bubble_tags[
+                                        'imagename'].str.replace('~', '-')
+
+    speech_bubble_catalog = load_speech_bubble_catalog(
+                                speech_bubble_files,
+                                speech_bubble_tags,
+                                labels_file,
+                                speech_bubbles_path + "catalog.pkl"
+                                )
+
+    viable_font_files = load_viable_fonts(font_files_path)
+
+    manifest = dict(
+        version=manifest_version,
+        sources=sources,
+        image_dir=image_dir,
+        viable_font_files=viable_font_files,
+        speech_bubble_catalog=speech_bubble_catalog.to_dict()
+    )
+
+    if manifest_file is not None:
+        # Write it under another name first so that other
+        # processes never read a half written manifest
+        tmp_file = manifest_file + ".tmp%d" % os.getpid()
+        with open(tmp_file, "wb") as f:
+            pickle.dump(manifest, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, manifest_file)
+
+    return manifest
+
+
+def load_manifest(image_dir_path=image_dir_path,
+                  speech_bubbles_path=speech_bubbles_path,
+                  font_files_path=font_files_path,
+                  manifest_file=manifest_file):
+    """
+    Load the asset manifest if it's up to date with the datasets
+
+    :param image_dir_path: Path of the illustrations folder
+
+    :type image_dir_path: str, optional
+
+    :param speech_bubbles_path: Path of the speech bubble dataset
+
+    :type speech_bubbles_path: str, optional
+
+    :param font_files_path: Path of the font dataset
+
+    :type font_files_path: str, optional
+
+    :param manifest_file: Path of the manifest
+
+    :type manifest_file: str, optional
+
+    :return: The manifest or None if it's missing, it or any of it's
+    parts are from a different version or the datasets changed
+    since it was built
+
+    :rtype: dict
+    """
+    if manifest_file is None or not os.path.isfile(manifest_file):
+        return None
+
+    with open(manifest_file, "rb") as f:
+        manifest = pickle.load(f)
+
+    if manifest.get('version') != manifest_version:
+        return None
+
+    speech_bubble_catalog = manifest.get('speech_bubble_catalog', {})
+    if speech_bubble_catalog.get('version') != SpeechBubbleCatalog.version:
+        return None
+
+    try:
+        sources = get_manifest_sources(image_dir_path,
+                                       speech_bubbles_path,
+                                       font_files_path)
+    except FileNotFoundError:
+        return None
+
+    if manifest['sources'] != sources:
+        return None
+
+    return manifest
+
+
+def load_render_assets(speech_bubbles_path=speech_bubbles_path,
+                       font_files_path=font_files_path,
+                       manifest_file=manifest_file):
+    """
+    Find the font files and speech bubble templates that render
+    workers can load ahead of rendering. Missing datasets are skipped.
+
+    :param speech_bubbles_path: Path of the speech bubble dataset
+
+    :type speech_bubbles_path: str, optional
+
+    :param font_files_path: Path of the font dataset
+
+    :type font_files_path: str, optional
+
+    :param manifest_file: Path of the asset manifest to read
+    them from if it's up to date
+
+    :type manifest_file: str, optional
+
+    :return: A tuple of a list of font files and a list of
+    speech bubble template files
+
+    :rtype: tuple
+    """
+    manifest = load_manifest(speech_bubbles_path=speech_bubbles_path,
+                             font_files_path=font_files_path,
+                             manifest_file=manifest_file)
+    if manifest is not None:
+        return (manifest['viable_font_files'],
+                manifest['speech_bubble_catalog']['files'])
+
+    font_files = []
+    if os.path.isfile(font_files_path+"viable_fonts.csv"):
+        font_files = load_viable_fonts(font_files_path)
+
+    speech_bubble_files = []
+    if os.path.isdir(speech_bubbles_path+"files/"):
+        speech_bubble_files = load_speech_bubble_files(speech_bubbles_path)
+
+    return font_files, speech_bubble_files
+
+
+def load_assets(image_dir_path=image_dir_path,
+                text_dataset_path=text_dataset_path,
+                speech_bubbles_path=speech_bubbles_path,
+                font_files_path=font_files_path,
+                manifest_file=manifest_file):
+    """
+    Load the illustrations, texts, speech bubbles and fonts
+    that pages are made of from the asset manifest. The manifest
+    is built first if it's missing or out of date.
+
+    :param image_dir_path: Path of the illustrations folder
+
+    :type image_dir_path: str, optional
+
+    :param text_dataset_path: Path of the text corpus parquet files
+
+    :type text_dataset_path: str, optional
+
+    :param speech_bubbles_path: Path of the speech bubble dataset
+
+    :type speech_bubbles_path: str, optional
+
+    :param font_files_path: Path of the font dataset
+
+    :type font_files_path: str, optional
+
+    :param manifest_file: Path of the asset manifest, None
+    scans the datasets without writing a manifest
+
+    :type manifest_file: str, optional
+
+    :return: A tuple of the assets in the order create_page_metadata
+    takes them with the texts as a sampler, the fonts as an index
+    if there's one and the speech bubble writing areas as a catalog
+
+    :rtype: tuple
+    """
+    paths = (image_dir_path, speech_bubbles_path, font_files_path)
+
+    manifest = load_manifest(*paths, manifest_file=manifest_file)
+    speech_bubble_tags = None
+    if manifest is not None:
+        speech_bubble_tags = SpeechBubbleCatalog.from_dict(
+                                manifest['speech_bubble_catalog']
+                                )
+
+    # Rebuilt if any part of it can't be loaded
+    if speech_bubble_tags is None:
+        manifest = build_manifest(*paths, manifest_file=manifest_file)
+        speech_bubble_tags = SpeechBubbleCatalog.from_dict(
+                                manifest['speech_bubble_catalog']
+                                )
+
+    text_dataset = load_text_corpus(text_dataset_path, cfg.text_columns)
+    # Only templates with writing areas can be picked
+    speech_bubble_files = speech_bubble_tags.files
+
+    font_files = load_font_index(font_files_path,
+                                 manifest['viable_font_files'])
+
+    return (manifest['image_dir'],
+            image_dir_path,
+            font_files,
+            text_dataset,
+            speech_bubble_files,
+            speech_bubble_tags
+            )
@@ -0,0 +1,271 @@
+import os
+import mmap
+from io import BytesIO
+import numpy as np
+from PIL import Image
+
+
+class BlobStore(object):
+    """
+    A class that reads files packed one after another into a few
+    large shard files through memory maps so that reading one
+    doesn't need the filesystem to open or stat it
+
+    :param store_dir: Folder of the store's files
+
+    :type store_dir: str
+
+    :param names: Filenames of the packed files
+
+    :type names: list
+
+    :param shards: Which shard each file is in
+
+    :type shards: numpy.ndarray
+
+    :param offsets: Where in it's shard each file starts
+
+    :type offsets: numpy.ndarray
+
+    :param lengths: Size of each file in bytes
+
+    :type lengths: numpy.ndarray
+    """
+
+    def __init__(self, store_dir, names, shards, offsets, lengths):
+        """
+        Constructor method
+        """
+
+        self.store_dir = store_dir
+        self.names = list(names)
+        self.shards = np.asarray(shards, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+
+        self.index = {name: idx for idx, name in enumerate(self.names)}
+
+        # Shards are mapped the first time they're read
+        self.shard_maps = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __getstate__(self):
+        # Maps can't be pickled so they're remade by each process
+        state = dict(self.__dict__)
+        state['shard_maps'] = {}
+        return state
+
+    def get_shard(self, shard):
+        """
+        Get the memory map of one of the store's shards
+
+        :param shard: Number of the shard
+
+        :type shard: int
+
+        :return: The shard's bytes
+
+        :rtype: mmap.mmap
+        """
+        if shard not in self.shard_maps:
+            with open(get_pack_file(self.store_dir, shard), "rb") as f:
+                self.shard_maps[shard] = mmap.mmap(f.fileno(), 0,
+                                                   access=mmap.ACCESS_READ)
+        return self.shard_maps[shard]
+
+    def get_bytes(self, name):
+        """
+        Get a packed file's contents without copying them
+
+        :param name: Filename of the packed file
+
+        :type name: str
+
+        :return: A view of the file's bytes or None
+        if it isn't in the store
+
+        :rtype: memoryview
+        """
+        idx = self.index.get(name)
+        if idx is None:
+            return None
+
+        offset = int(self.offsets[idx])
+        length = int(self.lengths[idx])
+        data = self.get_shard(int(self.shards[idx]))
+
+        return memoryview(data)[offset:offset + length]
+
+    def open_image(self, name):
+        """
+        Open a packed image
+
+        :param name: Filename of the image
+
+        :type name: str
+
+        :return: The image or None if it isn't in the store
+
+        :rtype: PIL.Image
+        """
+        data = self.get_bytes(name)
+        if data is None:
+            return None
+
+        return Image.open(BytesIO(data))
+
+    @classmethod
+    def load(cls, store_dir):
+        """
+        Read a store's index
+
+        :param store_dir: Folder of the store's files
+
+        :type store_dir: str
+
+        :return: The store
+
+        :rtype: BlobStore
+        """
+        with np.load(os.path.join(store_dir, "index.npz")) as data:
+            names = data['names'].tobytes().decode("utf-8")
+            names = names.split("\n") if len(names) > 0 else []
+
+            return cls(store_dir,
+                       names,
+                       data['shards'],
+                       data['offsets'],
+                       data['lengths'])
+
+
+def get_pack_file(store_dir, shard):
+    """
+    Get the path of one of a store's shards
+
+    :param store_dir: Folder of the store's files
+
+    :type store_dir: str
+
+    :param shard: Number of the shard
+
+    :type shard: int
+
+    :return: Path of the shard
+
+    :rtype: str
+    """
+    return os.path.join(store_dir, "blobs_%03d.pack" % shard)
+
+
+def pack_files(src_dir, store_dir, shard_bytes, names=None):
+    """
+    Pack the files of a folder one after another into shards no
+    bigger than a maximum size unless a single file is and then
+    write the index of where each one is
+
+    :param src_dir: Folder of the files to pack
+
+    :type src_dir: str
+
+    :param store_dir: Folder to write the store to
+
+    :type store_dir: str
+
+    :param shard_bytes: Largest size of each shard
+
+    :type shard_bytes: int
+
+    :param names: Filenames to pack, defaults to None
+    i.e. all the files in the folder
+
+    :type names: list, optional
+
+    :return: The store
+
+    :rtype: BlobStore
+    """
+    if names is None:
+        names = sorted(name for name in os.listdir(src_dir)
+                       if os.path.isfile(os.path.join(src_dir, name)))
+
+    if not os.path.isdir(store_dir):
+        os.makedirs(store_dir)
+
+    # A previous store isn't valid while it's being overwritten
+    index_file = os.path.join(store_dir, "index.npz")
+    if os.path.isfile(index_file):
+        os.remove(index_file)
+
+    shards = []
+    offsets = []
+    lengths = []
+    shard = -1
+    shard_file = None
+    position = 0
+    try:
+        for name in names:
+            with open(os.path.join(src_dir, name), "rb") as f:
+                data = f.read()
+
+            if shard_file is None or (position > 0 and
+                                      position + len(data) > shard_bytes):
+                if shard_file is not None:
+                    shard_file.close()
+                shard += 1
+                shard_file = open(get_pack_file(store_dir, shard), "wb")
+                position = 0
+
+            shard_file.write(data)
+            shards.append(shard)
+            offsets.append(position)
+            lengths.append(len(data))
+            position += len(data)
+    finally:
+        if shard_file is not None:
+            shard_file.close()
+
+    # The index is written last so a store
+    # is only ever read once it's complete
+    encoded_names = np.frombuffer("\n".join(names).encode("utf-8"),
+                                  dtype=np.uint8)
+    with open(index_file, "wb") as f:
+        np.savez(f,
+                 names=encoded_names,
+                 shards=np.array(shards, dtype=np.int32),
+                 offsets=np.array(offsets, dtype=np.int64),
+                 lengths=np.array(lengths, dtype=np.int64))
+
+    return BlobStore(store_dir, names, shards, offsets, lengths)
+
+
+def unpack_files(store_dir, out_dir):
+    """
+    Write the files of a store back out as separate files
+
+    :param store_dir: Folder of the store's files
+
+    :type store_dir: str
+
+    :param out_dir: Folder to write the files to
+
+    :type out_dir: str
+
+    :return: Number of files written
+
+    :rtype: int
+    """
+    store = BlobStore.load(store_dir)
+
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    for name in store.names:
+        with open(os.path.join(out_dir, name), "wb") as f:
+            f.write(store.get_bytes(name))
+
+    return len(store)
@@ -0,0 +1,581 @@
+import os
+from collections import OrderedDict
+from io import BytesIO
+import numpy as np
+from PIL import Image, ImageFont
+
+from .helpers import crop_image_only_outside
+from .illustration_catalog import IllustrationCatalog
+from .illustration_store import IllustrationStore
+from .blob_store import BlobStore
+from .text_sampler import load_text_corpus
+from .assets import text_dataset_path
+from .. import config_file as cfg
+
+
+class LRUCache(object):
+    """
+    A size bounded and memory budgeted least recently used cache.
+    Since each render worker is it's own process a module level
+    instance of this class is shared by all the pages a worker renders
+
+    :param max_items: Maximum number of items to keep
+
+    :type max_items: int
+
+    :param max_bytes: Maximum approximate memory to use for items,
+    defaults to None i.e. no memory budget
+
+    :type max_bytes: int, optional
+
+    :param get_size: A function that returns the approximate size
+    in bytes of an item, defaults to None
+
+    :type get_size: function, optional
+    """
+
+    def __init__(self, max_items, max_bytes=None, get_size=None):
+        """
+        Constructor method
+        """
+
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.get_size = get_size
+
+        # Key to (value, size in bytes) with the
+        # least recently used item first
+        self.items = OrderedDict()
+        self.current_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, load):
+        """
+        Get an item from the cache and if it isn't there
+        load it and store it
+
+        :param key: Key of the item
+
+        :type key: tuple
+
+        :param load: A function with no arguments that
+        returns the item if it isn't in the cache
+
+        :type load: function
+
+        :return: The cached or loaded item
+        """
+
+        if key in self.items:
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key][0]
+
+        self.misses += 1
+        value = load()
+        self.put(key, value)
+
+        return value
+
+    def put(self, key, value):
+        """
+        Store an item in the cache and evict the least
+        recently used items if it's over it's bounds
+
+        :param key: Key of the item
+
+        :type key: tuple
+
+        :param value: The item to store
+        """
+
+        size = 0
+        if self.get_size is not None:
+            size = self.get_size(value)
+
+        # Items larger than the whole budget would just
+        # flush the cache so don't store them
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        if key in self.items:
+            self.current_bytes -= self.items.pop(key)[1]
+
+        self.items[key] = (value, size)
+        self.current_bytes += size
+
+        while (len(self.items) > self.max_items or
+               (self.max_bytes is not None and
+                self.current_bytes > self.max_bytes)):
+
+            _, (_, evicted_size) = self.items.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all items from the cache and reset it's counters
+        """
+        self.items.clear()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        Get the counters of the cache
+
+        :return: A dictionary of hits, misses, evictions
+        number of items and the bytes they use
+
+        :rtype: dict
+        """
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            items=len(self.items),
+            bytes=self.current_bytes
+        )
+
+
+def image_nbytes(img):
+    """
+    Approximate the memory used by a PIL image
+
+    :param img: Image to measure
+
+    :type img: PIL.Image
+
+    :return: Size of the image in bytes
+
+    :rtype: int
+    """
+    return img.size[0]*img.size[1]*len(img.getbands())
+
+
+# Crop boxes of the illustrations if they've been cataloged
+illustration_catalog = None
+illustration_catalog_loaded = False
+
+
+def get_illustration_catalog():
+    """
+    Get the illustration catalog, loading it the first
+    time if it's been built
+
+    :return: The catalog or None if there isn't one
+
+    :rtype: IllustrationCatalog
+    """
+    global illustration_catalog, illustration_catalog_loaded
+    if not illustration_catalog_loaded:
+        illustration_catalog_loaded = True
+        if os.path.isfile(cfg.illustration_catalog_file):
+            illustration_catalog = IllustrationCatalog.load(
+                                    cfg.illustration_catalog_file
+                                    )
+
+    return illustration_catalog
+
+
+def set_illustration_catalog(catalog):
+    """
+    Set the illustration catalog used by this process
+
+    :param catalog: The catalog or None to not use one
+
+    :type catalog: IllustrationCatalog
+    """
+    global illustration_catalog, illustration_catalog_loaded
+    illustration_catalog = catalog
+    illustration_catalog_loaded = True
+
+
+# Packed illustration files if they've been packed
+illustration_pack = None
+illustration_pack_loaded = False
+
+
+def get_illustration_pack():
+    """
+    Get the illustration pack, loading it's index
+    the first time if it's been built
+
+    :return: The pack or None if there isn't one
+
+    :rtype: BlobStore
+    """
+    global illustration_pack, illustration_pack_loaded
+    if not illustration_pack_loaded:
+        illustration_pack_loaded = True
+        index_file = os.path.join(cfg.illustration_pack_dir, "index.npz")
+        if os.path.isfile(index_file):
+            illustration_pack = BlobStore.load(cfg.illustration_pack_dir)
+
+    return illustration_pack
+
+
+def set_illustration_pack(pack):
+    """
+    Set the illustration pack used by this process
+
+    :param pack: The pack or None to not use one
+
+    :type pack: BlobStore
+    """
+    global illustration_pack, illustration_pack_loaded
+    illustration_pack = pack
+    illustration_pack_loaded = True
+
+
+# Text corpus that compact page metadata refers to
+text_corpus = None
+text_corpus_loaded = False
+
+
+def get_text_corpus():
+    """
+    Get the text corpus, memory mapping it the
+    first time if it's been downloaded
+
+    :return: The corpus or None if there isn't one
+
+    :rtype: TextSampler
+    """
+    global text_corpus, text_corpus_loaded
+    if not text_corpus_loaded:
+        text_corpus_loaded = True
+        corpus_file = text_dataset_path.rstrip("/") + ".arrow"
+        if os.path.isdir(text_dataset_path):
+            text_corpus = load_text_corpus(text_dataset_path,
+                                           cfg.text_columns)
+        elif os.path.isfile(corpus_file):
+            text_corpus = load_text_corpus(corpus_file, cfg.text_columns)
+
+    return text_corpus
+
+
+def set_text_corpus(corpus):
+    """
+    Set the text corpus used by this process
+
+    :param corpus: The corpus or None to not use one
+
+    :type corpus: TextSampler
+    """
+    global text_corpus, text_corpus_loaded
+    text_corpus = corpus
+    text_corpus_loaded = True
+
+
+def open_illustration(path):
+    """
+    Open an illustration from the illustration pack
+    or from it's file if it isn't packed
+
+    :param path: Path to the illustration
+
+    :type path: str
+
+    :return: The illustration
+
+    :rtype: PIL.Image
+    """
+    pack = get_illustration_pack()
+    if pack is not None:
+        img = pack.open_image(os.path.basename(path))
+        if img is not None:
+            return img
+
+    return Image.open(path)
+
+
+# Pre-resized illustrations if they've been stored
+illustration_store = None
+illustration_store_loaded = False
+
+
+def get_illustration_store():
+    """
+    Get the illustration store, loading it's index
+    the first time if it's been built
+
+    :return: The store or None if there isn't one
+
+    :rtype: IllustrationStore
+    """
+    global illustration_store, illustration_store_loaded
+    if not illustration_store_loaded:
+        illustration_store_loaded = True
+        index_file = os.path.join(cfg.illustration_store_dir, "index.npz")
+        if os.path.isfile(index_file):
+            illustration_store = IllustrationStore.load(
+                                    cfg.illustration_store_dir
+                                    )
+
+    return illustration_store
+
+
+def set_illustration_store(store):
+    """
+    Set the illustration store used by this process
+
+    :param store: The store or None to not use one
+
+    :type store: IllustrationStore
+    """
+    global illustration_store, illustration_store_loaded
+    illustration_store = store
+    illustration_store_loaded = True
+
+
+def get_stored_illustration(path, size=None):
+    """
+    Get an illustration from the illustration store
+    without decoding or resampling it
+
+    :param path: Path to the illustration
+
+    :type path: str
+
+    :param size: Size the illustration is needed at, defaults
+    to None i.e. whatever size it's stored at
+
+    :type size: tuple, optional
+
+    :return: The illustration as a view of the store or None
+    if it isn't stored or isn't stored at that size
+
+    :rtype: PIL.Image
+    """
+    store = get_illustration_store()
+    if store is None:
+        return None
+
+    img_array = store.get(os.path.basename(path), size)
+    if img_array is None:
+        return None
+
+    return Image.fromarray(img_array)
+
+
+def load_illustration(path, size=None):
+    """
+    Open an illustration, make it black and white and crop
+    the black areas around it so that it's ready to paste
+    onto a page. Cataloged illustrations are cropped with their
+    stored crop box instead of finding it again.
+
+    :param path: Path to the illustration
+
+    :type path: str
+
+    :param size: Size to resize the illustration to, defaults to None
+    i.e. keep the cropped size
+
+    :type size: tuple, optional
+
+    :return: Ready to paste illustration
+
+    :rtype: PIL.Image
+    """
+    entry = None
+    catalog = get_illustration_catalog()
+    if catalog is not None:
+        entry = catalog.get(os.path.basename(path))
+
+    img = open_illustration(path)
+    if entry is not None:
+        # JPEGs are decoded straight to black and white
+        img.draft("L", img.size)
+        img = img.convert("L").crop(entry[1])
+    else:
+        img = img.convert("L")
+
+        # Clean it up by cropping the black areas
+        img_array = np.asarray(img)
+        crop_array = crop_image_only_outside(img_array)
+        img = Image.fromarray(crop_array)
+
+    if size is not None:
+        img = img.resize(size)
+
+    return img
+
+
+# Shared by all the pages rendered in this process
+illustration_cache = LRUCache(cfg.illustration_cache_max_items,
+                              cfg.illustration_cache_max_bytes,
+                              get_size=image_nbytes
+                              )
+
+
+def get_illustration(path, size=None):
+    """
+    Get a ready to paste illustration from the illustration
+    store or cache or load it
+
+    :param path: Path to the illustration
+
+    :type path: str
+
+    :param size: Size to resize the illustration to, defaults to None
+
+    :type size: tuple, optional
+
+    :return: Ready to paste illustration. This is shared
+    with the cache so it should not be modified in place
+
+    :rtype: PIL.Image
+    """
+    if size is not None:
+        size = tuple(size)
+
+        img = get_stored_illustration(path, size)
+        if img is not None:
+            return img
+
+    return illustration_cache.get((path, size),
+                                  lambda: load_illustration(path, size))
+
+
+def read_font_file(path):
+    """
+    Read a font file's bytes
+
+    :param path: Path to the font file
+
+    :type path: str
+
+    :return: The contents of the font file
+
+    :rtype: bytes
+    """
+    with open(path, "rb") as font_file:
+        return font_file.read()
+
+
+# Raw font files so that fonts at new sizes
+# don't have to be read from disk again
+font_file_cache = LRUCache(cfg.font_cache_max_fonts,
+                           cfg.font_file_cache_max_bytes,
+                           get_size=len
+                           )
+
+# FreeType font objects by font path and size
+font_cache = LRUCache(cfg.font_cache_max_fonts)
+
+
+def load_font(path, size):
+    """
+    Load a FreeType font object from a font file or
+    from it's bytes in memory
+
+    :param path: Path to the font file
+
+    :type path: str
+
+    :param size: Font size
+
+    :type size: int
+
+    :return: A font object
+
+    :rtype: PIL.ImageFont.FreeTypeFont
+    """
+    if cfg.font_cache_in_memory:
+        font_bytes = font_file_cache.get(path, lambda: read_font_file(path))
+        return ImageFont.truetype(BytesIO(font_bytes), size)
+
+    return ImageFont.truetype(path, size)
+
+
+def get_font(path, size):
+    """
+    Get a font object from the font cache or load it
+
+    :param path: Path to the font file
+
+    :type path: str
+
+    :param size: Font size
+
+    :type size: int
+
+    :return: A font object
+
+    :rtype: PIL.ImageFont.FreeTypeFont
+    """
+    size = int(size)
+    return font_cache.get((path, size), lambda: load_font(path, size))
+
+
+# Black and white speech bubble templates by path
+speech_bubble_cache = LRUCache(cfg.speech_bubble_cache_max_items)
+
+
+def get_speech_bubble_template(path):
+    """
+    Get a black and white speech bubble template
+    from the cache or load it
+
+    :param path: Path to the speech bubble template
+
+    :type path: str
+
+    :return: The template. This is shared with the cache
+    so it should be copied before being drawn on
+
+    :rtype: PIL.Image
+    """
+    return speech_bubble_cache.get(path,
+                                   lambda: Image.open(path).convert("L"))
+
+
+def warm_caches(font_files=[], speech_bubble_files=[]):
+    """
+    Load font files, speech bubble templates and the illustration
+    catalog, pack and store ahead of rendering so that the first pages a worker
+    renders don't pay for them
+
+    :param font_files: Font files to read into memory until
+    the font file cache's memory budget is used up
+
+    :type font_files: list, optional
+
+    :param speech_bubble_files: Speech bubble templates to load
+
+    :type speech_bubble_files: list, optional
+    """
+    # Importing all the image plugins up front
+    Image.init()
+    get_illustration_catalog()
+    get_illustration_pack()
+    get_illustration_store()
+
+    if cfg.font_cache_in_memory:
+        for path in font_files[:font_file_cache.max_items]:
+            if path in font_file_cache:
+                continue
+
+            # Fonts read past the memory budget would only push
+            # out the ones read before them
+            if font_file_cache.max_bytes is not None and \
+                    font_file_cache.current_bytes + os.path.getsize(path) > \
+                    font_file_cache.max_bytes:
+                break
+            font_file_cache.get(path, lambda: read_font_file(path))
+
+    for path in speech_bubble_files[:cfg.speech_bubble_cache_max_items]:
+        get_speech_bubble_template(path)
@@ -0,0 +1,197 @@
+import numpy as np
+
+
+class FontIndex(object):
+    """
+    A class that indexes which fonts have a glyph for each
+    character of the text corpus as one bitset of fonts per
+    character so that the fonts that can render a text are
+    found by intersecting the bitsets of it's characters.
+    It can be used in place of the list of font files.
+
+    :param font_files: Paths of the fonts
+
+    :type font_files: list
+
+    :param chars: Sorted codepoints of the corpus' characters
+
+    :type chars: numpy.ndarray
+
+    :param bits: Packed bits of which fonts have each character
+    with a row per character
+
+    :type bits: numpy.ndarray
+    """
+
+    def __init__(self, font_files, chars, bits):
+        """
+        Constructor method
+        """
+
+        self.font_files = list(font_files)
+        self.chars = np.asarray(chars, dtype=np.int64)
+        self.bits = np.asarray(bits, dtype=np.uint8).reshape(
+                                                len(self.chars), -1)
+
+    def __len__(self):
+        return len(self.font_files)
+
+    def __getitem__(self, idx):
+        return self.font_files[idx]
+
+    @classmethod
+    def build(cls, font_files, font_codepoints, chars):
+        """
+        Build the index from the characters each font has
+
+        :param font_files: Paths of the fonts
+
+        :type font_files: list
+
+        :param font_codepoints: Sorted codepoints each font has
+
+        :type font_codepoints: list
+
+        :param chars: Codepoints of the corpus' characters
+
+        :type chars: numpy.ndarray
+
+        :return: The index
+
+        :rtype: FontIndex
+        """
+        chars = np.unique(np.asarray(chars, dtype=np.int64))
+
+        has_char = np.zeros((len(chars), len(font_files)), dtype=bool)
+        for idx, codepoints in enumerate(font_codepoints):
+            has_char[:, idx] = np.isin(chars, codepoints)
+
+        return cls(font_files, chars, np.packbits(has_char, axis=1))
+
+    def get_rows(self, text):
+        """
+        Find the rows of the index of a text's characters.
+        Characters that aren't in the index are left out.
+
+        :param text: The text
+
+        :type text: str
+
+        :return: Indices of the rows
+
+        :rtype: numpy.ndarray
+        """
+        codepoints = np.unique(np.fromiter(map(ord, text),
+                                           dtype=np.int64,
+                                           count=len(text)))
+
+        rows = np.searchsorted(self.chars, codepoints)
+        rows = rows[rows < len(self.chars)]
+        return rows[np.isin(self.chars[rows], codepoints)]
+
+    def get_compatible_fonts(self, text):
+        """
+        Find the fonts that have every character of a text.
+        Characters that aren't in the index are ignored.
+
+        :param text: The text
+
+        :type text: str
+
+        :return: Indices of the fonts
+
+        :rtype: numpy.ndarray
+        """
+        rows = self.get_rows(text)
+
+        # Every font is compatible with a text with no known characters
+        bits = np.bitwise_and.reduce(self.bits[rows], axis=0,
+                                     initial=255)
+
+        return np.flatnonzero(np.unpackbits(bits,
+                                            count=len(self.font_files)))
+
+    def get_coverage(self, text):
+        """
+        Count how many of a text's characters each font has.
+        Characters that aren't in the index are ignored.
+
+        :param text: The text
+
+        :type text: str
+
+        :return: The count of each font
+
+        :rtype: numpy.ndarray
+        """
+        has_char = np.unpackbits(self.bits[self.get_rows(text)], axis=1,
+                                 count=len(self.font_files))
+        return has_char.sum(axis=0)
+
+    def choose_font(self, font_idx, text):
+        """
+        Swap a font that was picked for a random one that has
+        all the characters of a text if it doesn't. Random
+        numbers are only used when the font is swapped.
+
+        :param font_idx: Index of the picked font
+
+        :type font_idx: int
+
+        :param text: The text
+
+        :type text: str
+
+        :return: Index of the font to use which is the one with
+        the most of the characters if no font has all of them
+
+        :rtype: int
+        """
+        compatible = self.get_compatible_fonts(text)
+        if font_idx in compatible:
+            return font_idx
+
+        if len(compatible) > 0:
+            return int(compatible[np.random.randint(len(compatible))])
+
+        coverage = self.get_coverage(text)
+        if coverage[font_idx] == coverage.max():
+            return font_idx
+
+        return int(np.argmax(coverage))
+
+    def save(self, filename):
+        """
+        Write the index to a .npz file
+
+        :param filename: Path of the index file
+
+        :type filename: str
+        """
+        font_files = np.frombuffer("\n".join(self.font_files).encode(
+                                    "utf-8"), dtype=np.uint8)
+        with open(filename, "wb") as index_file:
+            np.savez(index_file,
+                     font_files=font_files,
+                     chars=self.chars,
+                     bits=self.bits)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Read an index from a .npz file
+
+        :param filename: Path of the index file
+
+        :type filename: str
+
+        :return: The index
+
+        :rtype: FontIndex
+        """
+        with np.load(filename) as data:
+            font_files = data['font_files'].tobytes().decode("utf-8")
+            font_files = font_files.split("\n") if len(font_files) > 0 \
+                else []
+
+            return cls(font_files, data['chars'], data['bits'])
@@ -21,6 +21,29 @@ def crop_image_only_outside(img, tol=0):
 
     :rtype: PIL.Image
     """
+    col_start, row_start, col_end, row_end = get_crop_box(img, tol)
+
+    return img[row_start:row_end, col_start:col_end]
+
+
+def get_crop_box(img, tol=0):
+    """
+    Find the box around the part of the image
+    that isn't black
+
+    :param img: image data
+
+    :type img: numpy.ndarray
+
+    :param tol: tollerance level, defaults to 0
+
+    :type tol: int, optional
+
+    :return: The left, top, right and bottom of the box
+    the way PIL's crop takes it
+
+    :rtype: tuple
+    """
     # img is 2D image data
     # tol  is tolerance
     mask = img > tol
@@ -31,7 +54,83 @@ def crop_image_only_outside(img, tol=0):
     col_start, col_end = mask0.argmax(), n-mask0[::-1].argmax()
     row_start, row_end = mask1.argmax(), m-mask1[::-1].argmax()
 
-    return img[row_start:row_end, col_start:col_end]
+    return int(col_start), int(row_start), int(col_end), int(row_end)
+
+
+def get_polygon_bbox(polygon, size):
+    """
+    Get the integer bounding box of a polygon
+    clipped to an image's size
+
+    :param polygon: A list of xy coordinates
+
+    :type polygon: list
+
+    :param size: Width and height of the image
+
+    :type size: tuple
+
+    :return: A tuple of the left, top, right and bottom
+    of the box where right and bottom are exclusive
+
+    :rtype: tuple
+    """
+    xs = [coord[0] for coord in polygon]
+    ys = [coord[1] for coord in polygon]
+
+    x0 = max(0, math.floor(min(xs)))
+    y0 = max(0, math.floor(min(ys)))
+    x1 = min(size[0], math.ceil(max(xs)) + 1)
+    y1 = min(size[1], math.ceil(max(ys)) + 1)
+
+    return x0, y0, x1, y1
+
+
+def paste_illustration_in_bbox(page_img, img, polygon):
+    """
+    Paste an illustration stretched to the size of the page
+    into a panel's polygon by only working within the
+    polygon's bounding box rather than with page sized
+    masks and images
+
+    NOTE: This function performs actions by reference
+
+    :param page_img: Page to paste the illustration onto
+
+    :type page_img: PIL.Image
+
+    :param img: Cropped illustration at it's original size
+    or already at the page's size
+
+    :type img: PIL.Image
+
+    :param polygon: The panel's polygon
+
+    :type polygon: list
+    """
+    W, H = page_img.size
+    x0, y0, x1, y1 = get_polygon_bbox(polygon, (W, H))
+    if x1 <= x0 or y1 <= y0:
+        return
+
+    # Rasterize the polygon at the box's offset
+    mask = Image.new("L", (x1 - x0, y1 - y0), 0)
+    draw_mask = ImageDraw.Draw(mask)
+    draw_mask.polygon([(x - x0, y - y0) for x, y in polygon], fill=255)
+
+    if img.size == (W, H):
+        tile = img.crop((x0, y0, x1, y1))
+    else:
+        # Only resample the part of the illustration that
+        # lands inside the box when stretched to the page
+        w_ratio = img.size[0]/W
+        h_ratio = img.size[1]/H
+        tile = img.resize((x1 - x0, y1 - y0),
+                          box=(x0*w_ratio, y0*h_ratio,
+                               x1*w_ratio, y1*h_ratio)
+                          )
+
+    page_img.paste(tile, (x0, y0), mask)
 
 
 def invert_for_next(current):
@@ -0,0 +1,119 @@
+import numpy as np
+
+
+class IllustrationCatalog(object):
+    """
+    A class that indexes the dimensions and non-black crop boxes
+    of the illustrations so that they don't have to be worked out
+    every time an illustration is rendered and so that corrupt or
+    degenerate illustrations can be left out
+
+    :param names: Filenames of the illustrations
+
+    :type names: list
+
+    :param sizes: Width and height of each illustration
+
+    :type sizes: numpy.ndarray
+
+    :param crop_boxes: Left, top, right and bottom of the part
+    of each illustration that isn't black
+
+    :type crop_boxes: numpy.ndarray
+
+    :param valid: Whether each illustration can be used
+
+    :type valid: numpy.ndarray
+    """
+
+    def __init__(self, names, sizes, crop_boxes, valid):
+        """
+        Constructor method
+        """
+
+        self.names = list(names)
+        self.sizes = np.asarray(sizes, dtype=np.int32).reshape(-1, 2)
+        self.crop_boxes = np.asarray(crop_boxes,
+                                     dtype=np.int32).reshape(-1, 4)
+        self.valid = np.asarray(valid, dtype=bool)
+
+        self.index = {name: idx for idx, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def get(self, name):
+        """
+        Get an illustration's size, crop box and whether it's valid
+
+        :param name: Filename of the illustration
+
+        :type name: str
+
+        :return: A tuple of the size, crop box and validity
+        or None if the illustration isn't in the catalog
+
+        :rtype: tuple
+        """
+        idx = self.index.get(name)
+        if idx is None:
+            return None
+
+        return (tuple(self.sizes[idx].tolist()),
+                tuple(self.crop_boxes[idx].tolist()),
+                bool(self.valid[idx]))
+
+    def valid_names(self):
+        """
+        Get the filenames of the illustrations that can be used
+
+        :return: Filenames of the valid illustrations
+
+        :rtype: list
+        """
+        return [name for name, valid in zip(self.names, self.valid)
+                if valid]
+
+    def save(self, filename):
+        """
+        Write the catalog to a .npz file
+
+        :param filename: Path of the catalog file
+
+        :type filename: str
+        """
+        # Names are stored as one newline separated buffer
+        # rather than a fixed width unicode array
+        names = np.frombuffer("\n".join(self.names).encode("utf-8"),
+                              dtype=np.uint8)
+        with open(filename, "wb") as catalog_file:
+            np.savez(catalog_file,
+                     names=names,
+                     sizes=self.sizes,
+                     crop_boxes=self.crop_boxes,
+                     valid=self.valid)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Read a catalog from a .npz file
+
+        :param filename: Path of the catalog file
+
+        :type filename: str
+
+        :return: The catalog
+
+        :rtype: IllustrationCatalog
+        """
+        with np.load(filename) as data:
+            names = data['names'].tobytes().decode("utf-8")
+            names = names.split("\n") if len(names) > 0 else []
+
+            return cls(names,
+                       data['sizes'],
+                       data['crop_boxes'],
+                       data['valid'])
@@ -0,0 +1,242 @@
+import os
+import numpy as np
+
+
+class IllustrationStore(object):
+    """
+    A class that reads illustrations that were already cropped,
+    made black and white and resized for rendering from memory
+    mapped files so that they don't have to be decoded or resampled.
+    The files are mapped read only so all the processes reading
+    them share the same pages.
+
+    :param store_dir: Folder of the store's files
+
+    :type store_dir: str
+
+    :param names: Filenames of the illustrations
+
+    :type names: list
+
+    :param shards: Which file each illustration is in
+
+    :type shards: numpy.ndarray
+
+    :param offsets: Where in it's file each illustration starts
+
+    :type offsets: numpy.ndarray
+
+    :param size: Width and height of every illustration
+
+    :type size: tuple
+    """
+
+    def __init__(self, store_dir, names, shards, offsets, size):
+        """
+        Constructor method
+        """
+
+        self.store_dir = store_dir
+        self.names = list(names)
+        self.shards = np.asarray(shards, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.size = tuple(size)
+
+        self.index = {name: idx for idx, name in enumerate(self.names)}
+
+        # Shard files are mapped the first time they're read
+        self.shard_maps = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __getstate__(self):
+        # Maps can't be pickled so they're remade by each process
+        state = dict(self.__dict__)
+        state['shard_maps'] = {}
+        return state
+
+    def get_shard(self, shard):
+        """
+        Get the memory map of one of the store's files
+
+        :param shard: Number of the file
+
+        :type shard: int
+
+        :return: The file's bytes
+
+        :rtype: numpy.memmap
+        """
+        if shard not in self.shard_maps:
+            self.shard_maps[shard] = np.memmap(
+                                        get_shard_file(self.store_dir, shard),
+                                        dtype=np.uint8,
+                                        mode="r"
+                                        )
+        return self.shard_maps[shard]
+
+    def get(self, name, size=None):
+        """
+        Get an illustration as a view of the store's files
+
+        :param name: Filename of the illustration
+
+        :type name: str
+
+        :param size: Size the illustration is needed at, defaults
+        to None i.e. whatever size it's stored at
+
+        :type size: tuple, optional
+
+        :return: A read only array of the illustration or None if
+        it isn't in the store or is stored at a different size
+
+        :rtype: numpy.ndarray
+        """
+        idx = self.index.get(name)
+        if idx is None:
+            return None
+
+        if size is not None and tuple(size) != self.size:
+            return None
+
+        width, height = self.size
+        offset = self.offsets[idx]
+        data = self.get_shard(int(self.shards[idx]))
+
+        return data[offset:offset + width*height].reshape(height, width)
+
+    @classmethod
+    def load(cls, store_dir):
+        """
+        Read a store's index
+
+        :param store_dir: Folder of the store's files
+
+        :type store_dir: str
+
+        :return: The store
+
+        :rtype: IllustrationStore
+        """
+        with np.load(os.path.join(store_dir, "index.npz")) as data:
+            names = data['names'].tobytes().decode("utf-8")
+            names = names.split("\n") if len(names) > 0 else []
+
+            return cls(store_dir,
+                       names,
+                       data['shards'],
+                       data['offsets'],
+                       data['size'].tolist())
+
+
+def get_shard_file(store_dir, shard):
+    """
+    Get the path of one of a store's files
+
+    :param store_dir: Folder of the store's files
+
+    :type store_dir: str
+
+    :param shard: Number of the file
+
+    :type shard: int
+
+    :return: Path of the file
+
+    :rtype: str
+    """
+    return os.path.join(store_dir, "illustrations_%03d.bin" % shard)
+
+
+def write_illustration_store(store_dir, size, illustrations, shard_bytes):
+    """
+    Write illustrations one after another into the store's files
+    starting a new file when one would go over it's maximum size
+    and then write the index of where each one is. Files of a
+    previous store in the folder that aren't used are removed.
+
+    :param store_dir: Folder to write the store to
+
+    :type store_dir: str
+
+    :param size: Width and height of every illustration
+
+    :type size: tuple
+
+    :param illustrations: Pairs of filenames and their
+    illustrations as uint8 arrays of the store's size
+
+    :type illustrations: iterable
+
+    :param shard_bytes: Largest size of each file
+
+    :type shard_bytes: int
+
+    :return: The store
+
+    :rtype: IllustrationStore
+    """
+    if not os.path.isdir(store_dir):
+        os.makedirs(store_dir)
+
+    # A previous store isn't valid while it's being overwritten
+    index_file = os.path.join(store_dir, "index.npz")
+    if os.path.isfile(index_file):
+        os.remove(index_file)
+
+    width, height = size
+    illustration_bytes = width*height
+    per_shard = max(1, shard_bytes//illustration_bytes)
+
+    names = []
+    shards = []
+    offsets = []
+    shard_file = None
+    try:
+        for name, img_array in illustrations:
+            if img_array.shape != (height, width):
+                raise ValueError("Illustration " + name +
+                                 " isn't the store's size")
+
+            shard, position = divmod(len(names), per_shard)
+            if position == 0:
+                if shard_file is not None:
+                    shard_file.close()
+                shard_file = open(get_shard_file(store_dir, shard), "wb")
+
+            shard_file.write(np.ascontiguousarray(img_array,
+                                                  dtype=np.uint8).tobytes())
+            names.append(name)
+            shards.append(shard)
+            offsets.append(position*illustration_bytes)
+    finally:
+        if shard_file is not None:
+            shard_file.close()
+
+    # Remove the files of a previous store with more files
+    num_shards = shards[-1] + 1 if len(shards) > 0 else 0
+    for filename in os.listdir(store_dir):
+        if not (filename.startswith("illustrations_") and
+                filename.endswith(".bin")):
+            continue
+        shard = filename[len("illustrations_"):-len(".bin")]
+        if shard.isdigit() and int(shard) >= num_shards:
+            os.remove(os.path.join(store_dir, filename))
+
+    # The index is written last so a store
+    # is only ever read once it's complete
+    encoded_names = np.frombuffer("\n".join(names).encode("utf-8"),
+                                  dtype=np.uint8)
+    with open(index_file, "wb") as f:
+        np.savez(f,
+                 names=encoded_names,
+                 shards=np.array(shards, dtype=np.int32),
+                 offsets=np.array(offsets, dtype=np.int64),
+                 size=np.array(size, dtype=np.int64))
+
+    return IllustrationStore(store_dir, names, shards, offsets, size)
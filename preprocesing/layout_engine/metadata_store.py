@@ -0,0 +1,447 @@
+import os
+import time
+import uuid
+import numpy as np
+
+from .metadata_serializers import (
+    JSONSerializer, get_serializer, loads_metadata
+)
+from .. import config_file as cfg
+
+
+class MetadataStoreWriter(object):
+    """
+    A class that appends the metadata of pages as records to shard
+    files it owns so that many writers can fill the same store
+    at once. A shard is closed and a new one started once it's
+    bigger than a maximum size. Each record is followed by a line
+    with it's page's name, where it is and when it was written in
+    the shard's index so a store is readable at any point without
+    closing the writer.
+    JSON metadata is written one page per line so shards of it
+    are also JSON Lines files.
+
+    :param store_dir: Folder of the store's files
+
+    :type store_dir: str
+
+    :param metadata_format: "json", "compact", "seed" or "plan",
+    defaults to None i.e. the one in the config
+
+    :type metadata_format: str, optional
+
+    :param shard_bytes: Largest size of each shard, defaults
+    to the one in the config
+
+    :type shard_bytes: int, optional
+    """
+
+    def __init__(self, store_dir, metadata_format=None, shard_bytes=None):
+        """
+        Constructor method
+        """
+
+        self.store_dir = store_dir
+        self.serializer = get_serializer(metadata_format)
+        if type(self.serializer) is JSONSerializer:
+            self.serializer = JSONSerializer(indent=None)
+
+        if shard_bytes is None:
+            shard_bytes = cfg.metadata_store_shard_bytes
+        self.shard_bytes = shard_bytes
+
+        # Writers never share shards
+        self.writer_id = uuid.uuid4().hex[:12]
+        self.shard = -1
+        self.shard_file = None
+        self.index_file = None
+        self.position = 0
+        self.last_written = 0
+
+        if not os.path.isdir(store_dir):
+            os.makedirs(store_dir, exist_ok=True)
+
+    def next_shard(self):
+        """
+        Close the current shard and start a new one
+        """
+        self.close()
+        self.shard += 1
+
+        shard_file = get_shard_file(self.store_dir, self.writer_id,
+                                    self.shard)
+        self.shard_file = open(shard_file, "ab")
+        self.index_file = open(shard_file[:-len(".shard")] + ".idx", "a")
+        self.position = self.shard_file.tell()
+
+    def write(self, name, metadata):
+        """
+        Append a page's serialized metadata to the store
+
+        :param name: Name of the page
+
+        :type name: str
+
+        :param metadata: The page's metadata
+
+        :type metadata: bytes
+
+        :return: Path of the shard, where the record
+        starts in it and it's length
+
+        :rtype: tuple
+        """
+        if isinstance(metadata, str):
+            metadata = metadata.encode("utf-8")
+        if isinstance(self.serializer, JSONSerializer):
+            metadata += b"\n"
+
+        if self.shard_file is None or (
+                self.position > 0 and
+                self.position + len(metadata) > self.shard_bytes):
+            self.next_shard()
+
+        offset = self.position
+        self.shard_file.write(metadata)
+        self.shard_file.flush()
+        self.position += len(metadata)
+
+        # Orders the records of a page written more than once
+        # and never goes back even if the clock does
+        written = max(time.time_ns(), self.last_written + 1)
+        self.last_written = written
+
+        # Only recorded once the record is in the shard
+        self.index_file.write("%s\t%d\t%d\t%d\n" % (name, offset,
+                                                    len(metadata),
+                                                    written))
+        self.index_file.flush()
+
+        return self.shard_file.name, offset, len(metadata)
+
+    def write_page(self, page):
+        """
+        Serialize a page and append it to the store
+
+        :param page: The page
+
+        :type page: Page
+
+        :return: Path of the shard, where the record
+        starts in it and it's length
+
+        :rtype: tuple
+        """
+        return self.write(page.name, page.dump_metadata(self.serializer))
+
+    def close(self):
+        """
+        Close the current shard
+        """
+        if self.shard_file is not None:
+            self.shard_file.close()
+            self.index_file.close()
+            self.shard_file = None
+            self.index_file = None
+
+
+class MetadataStore(object):
+    """
+    A class that reads the pages of a metadata store either one
+    at a time by their name or all of them in the order they're
+    in the shards
+
+    :param store_dir: Folder of the store's files
+
+    :type store_dir: str
+
+    :param names: Names of the pages
+
+    :type names: list
+
+    :param shard_files: Paths of the shards
+
+    :type shard_files: list
+
+    :param shards: Which shard each page is in
+
+    :type shards: numpy.ndarray
+
+    :param offsets: Where in it's shard each page starts
+
+    :type offsets: numpy.ndarray
+
+    :param lengths: Size of each page's record in bytes
+
+    :type lengths: numpy.ndarray
+    """
+
+    def __init__(self, store_dir, names, shard_files, shards, offsets,
+                 lengths):
+        """
+        Constructor method
+        """
+
+        self.store_dir = store_dir
+        self.names = list(names)
+        self.shard_files = list(shard_files)
+        self.shards = np.asarray(shards, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+
+        self.index = {name: idx for idx, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def get_location(self, name):
+        """
+        Find where a page's record is
+
+        :param name: Name of the page
+
+        :type name: str
+
+        :return: Path of the shard, where the record starts
+        in it and it's length or None if it isn't in the store
+
+        :rtype: tuple
+        """
+        idx = self.index.get(name)
+        if idx is None:
+            return None
+
+        return (self.shard_files[self.shards[idx]],
+                int(self.offsets[idx]),
+                int(self.lengths[idx]))
+
+    def get_locations(self):
+        """
+        Get where every page's record is in the order they're
+        in the shards so reading them in turn reads each
+        shard from start to end
+
+        :return: Tuples of the path of the shard, where the
+        record starts in it and it's length
+
+        :rtype: list
+        """
+        order = np.lexsort((self.offsets, self.shards))
+        return [(self.shard_files[self.shards[idx]],
+                 int(self.offsets[idx]),
+                 int(self.lengths[idx]))
+                for idx in order]
+
+    def get(self, name, text_corpus=None):
+        """
+        Read a page's metadata
+
+        :param name: Name of the page
+
+        :type name: str
+
+        :param text_corpus: The text corpus to read compact
+        metadata's texts from, defaults to None i.e. the
+        one in the datasets folder
+
+        :type text_corpus: TextSampler, optional
+
+        :return: The page's metadata or None if
+        it isn't in the store
+
+        :rtype: dict
+        """
+        location = self.get_location(name)
+        if location is None:
+            return None
+
+        return loads_metadata(read_record(*location), text_corpus)
+
+    def iter_pages(self, text_corpus=None):
+        """
+        Read the metadata of every page going through
+        each shard from start to end
+
+        :param text_corpus: The text corpus to read compact
+        metadata's texts from, defaults to None i.e. the
+        one in the datasets folder
+
+        :type text_corpus: TextSampler, optional
+
+        :return: A generator of the pages' metadata
+
+        :rtype: generator
+        """
+        order = np.lexsort((self.offsets, self.shards))
+        shard = None
+        shard_file = None
+        try:
+            for idx in order:
+                if self.shards[idx] != shard:
+                    if shard_file is not None:
+                        shard_file.close()
+                    shard = self.shards[idx]
+                    shard_file = open(self.shard_files[shard], "rb")
+
+                shard_file.seek(self.offsets[idx])
+                metadata = shard_file.read(self.lengths[idx])
+                yield loads_metadata(metadata, text_corpus)
+        finally:
+            if shard_file is not None:
+                shard_file.close()
+
+    @classmethod
+    def load(cls, store_dir):
+        """
+        Read the indices of a store's shards. Records that
+        were only partly written are left out and a page
+        that was written more than once is read from the
+        record that was written last.
+
+        :param store_dir: Folder of the store's files
+
+        :type store_dir: str
+
+        :return: The store
+
+        :rtype: MetadataStore
+        """
+        names = []
+        shard_files = []
+        shards = []
+        offsets = []
+        lengths = []
+        written = []
+        # Oldest shards first so that records of indices from
+        # before records had the time they were written win
+        # by the order they're read in
+        index_files = [filename for filename in os.listdir(store_dir)
+                       if filename.endswith(".idx")]
+        index_files.sort(key=lambda filename: (
+            os.path.getmtime(os.path.join(store_dir, filename)), filename))
+
+        for filename in index_files:
+
+            shard_file = os.path.join(store_dir,
+                                      filename[:-len(".idx")] + ".shard")
+            if not os.path.isfile(shard_file):
+                continue
+            shard_size = os.path.getsize(shard_file)
+
+            shard = len(shard_files)
+            shard_files.append(shard_file)
+            with open(os.path.join(store_dir, filename)) as index_file:
+                for line in index_file:
+                    entry = line.rstrip("\n").split("\t")
+                    if len(entry) not in (3, 4) or \
+                            not line.endswith("\n"):
+                        continue
+
+                    name, offset, length = entry[0], int(entry[1]), \
+                        int(entry[2])
+                    if offset + length > shard_size:
+                        continue
+
+                    names.append(name)
+                    shards.append(shard)
+                    offsets.append(offset)
+                    lengths.append(length)
+                    written.append(int(entry[3]) if len(entry) == 4
+                                   else -1)
+
+        # Keep the last written record of each page
+        last = {}
+        for idx, name in enumerate(names):
+            if name not in last or written[idx] >= written[last[name]]:
+                last[name] = idx
+        keep = sorted(last.values())
+
+        return cls(store_dir,
+                   [names[idx] for idx in keep],
+                   shard_files,
+                   [shards[idx] for idx in keep],
+                   [offsets[idx] for idx in keep],
+                   [lengths[idx] for idx in keep])
+
+
+def get_shard_file(store_dir, writer_id, shard):
+    """
+    Get the path of one of a writer's shards
+
+    :param store_dir: Folder of the store's files
+
+    :type store_dir: str
+
+    :param writer_id: Id of the writer
+
+    :type writer_id: str
+
+    :param shard: Number of the writer's shard
+
+    :type shard: int
+
+    :return: Path of the shard
+
+    :rtype: str
+    """
+    return os.path.join(store_dir,
+                        "metadata_%s_%03d.shard" % (writer_id, shard))
+
+
+def is_metadata_store(store_dir):
+    """
+    Check whether a folder has a metadata store's shards in it
+
+    :param store_dir: The folder
+
+    :type store_dir: str
+
+    :rtype: bool
+    """
+    return os.path.isdir(store_dir) and any(
+        filename.endswith(".idx") for filename in os.listdir(store_dir))
+
+
+# Shards opened by this process to read records from
+open_shards = {}
+
+
+def read_record(shard_file, offset, length):
+    """
+    Read a record from a shard without moving
+    a shared file position
+
+    :param shard_file: Path of the shard
+
+    :type shard_file: str
+
+    :param offset: Where the record starts
+
+    :type offset: int
+
+    :param length: Length of the record
+
+    :type length: int
+
+    :return: The record
+
+    :rtype: bytes
+    """
+    fd = open_shards.get(shard_file)
+    if fd is None:
+        fd = os.open(shard_file, os.O_RDONLY)
+        open_shards[shard_file] = fd
+
+    return os.pread(fd, length, offset)
+
+
+def close_shards():
+    """
+    Close the shards this process opened to read records from
+    """
+    while open_shards:
+        shard_file, fd = open_shards.popitem()
+        os.close(fd)
@@ -1,54 +1,1303 @@
 from PIL import Image, ImageDraw
 import numpy as np
 import os
-import concurrent
+import json
+import gc
+import multiprocessing
+import random
+import threading
+import time
+import uuid
+import concurrent.futures
+from collections import deque
 from tqdm import tqdm
 
 from .page_object_classes import Page
+from .page_dataset_creator import create_page_metadata
+from .assets import load_assets, load_render_assets
+from .caches import illustration_cache, get_text_corpus, warm_caches
+from .metadata_serializers import (
+    SeedSerializer, get_metadata_file, get_serializer, is_metadata_file,
+    loads_metadata, read_metadata
+)
+from .metadata_store import (
+    MetadataStore, MetadataStoreWriter, is_metadata_store, read_record,
+    close_shards
+)
+from .render_plan import get_render_plan, is_render_plan, render_page_plan
+from .seed_metadata import (
+    check_fingerprint, get_fingerprint, is_seed_record, make_seed_record
+)
 from .. import config_file as cfg
 
 
+# Encodes and writes the pages rendered by this process in the
+# background and limits how many are waiting to be written
+image_writer = None
+image_writer_slots = None
+image_writes = []
+
+
+def save_page_image(img, filename):
+    """
+    Encode and write a rendered page. It's written to a temporary
+    file that's renamed once it's complete so that a page that
+    failed to be written isn't taken as rendered.
+
+    :param img: Rendered page
+
+    :type img: PIL.Image
+
+    :param filename: Path to write the page to
+
+    :type filename: str
+    """
+    image_format = Image.registered_extensions()[
+        os.path.splitext(filename)[1].lower()]
+
+    tmp_filename = filename + ".tmp"
+    try:
+        img.save(tmp_filename, format=image_format,
+                 **cfg.image_encoder_options)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.isfile(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+
+def finish_page_image(future):
+    """
+    Free up a writer slot once a page is written
+
+    :param future: The page's write
+
+    :type future: concurrent.futures.Future
+    """
+    image_writer_slots.release()
+
+
+def write_page_image(img, filename):
+    """
+    Write a rendered page in the background so that the next page
+    can be rendered while it's encoded. Waits when too many
+    pages are already waiting to be written.
+
+    :param img: Rendered page
+
+    :type img: PIL.Image
+
+    :param filename: Path to write the page to
+
+    :type filename: str
+    """
+    global image_writer, image_writer_slots, image_writes
+    if cfg.image_writer_threads < 1:
+        save_page_image(img, filename)
+        return
+
+    # Fail the page if an earlier page wasn't written
+    image_writes = check_writes(image_writes)
+
+    if image_writer is None:
+        image_writer = concurrent.futures.ThreadPoolExecutor(
+                            max_workers=cfg.image_writer_threads)
+        image_writer_slots = threading.BoundedSemaphore(
+                                cfg.image_writer_max_in_flight)
+
+    image_writer_slots.acquire()
+    future = image_writer.submit(save_page_image, img, filename)
+    future.add_done_callback(finish_page_image)
+    image_writes.append(future)
+
+
+def flush_page_images():
+    """
+    Wait for all the pages waiting to be written in this
+    process and raise the error of any that failed
+    """
+    global image_writer, image_writes
+    if image_writer is not None:
+        image_writer.shutdown(wait=True)
+        image_writer = None
+
+    writes = image_writes
+    image_writes = []
+    check_writes(writes)
+
+
+def check_writes(writes):
+    """
+    Raise the error of a background write that failed
+
+    :param writes: Futures of the writes submitted so far
+
+    :type writes: list
+
+    :return: Futures of the writes that haven't finished
+
+    :rtype: list
+    """
+    done = []
+    pending = []
+    for write in writes:
+        if write.done():
+            done.append(write)
+        else:
+            pending.append(write)
+
+    for write in done:
+        write.result()
+
+    return pending
+
+
 def create_single_page(data):
     """
-    This function is used to render a single page from a metadata json file
-    to a target location.
+    This function is used to render a single page from a metadata file
+    or a record of a metadata store to a target location.
 
-    :param paths:  a tuple of the page metadata and output path
-    as well as whether or not to save the rendered file i.e. dry run or
-    wet run
+    :param paths:  a tuple of the page metadata's path or where it's
+    record is and output path as well as whether or not to save the
+    rendered file i.e. dry run or wet run
 
     :type paths: tuple
+
+    :return: The id of the worker process and it's
+    illustration cache counters
+
+    :rtype: tuple
     """
     metadata = data[0]
     images_path = data[1]
     dry = data[2]
 
+    # Pages that were already rendered aren't laid out again and
+    # texts are only read from the corpus if they're laid out
+    data = read_page_metadata(metadata, read_texts=False)
+    filename = images_path+data['name']+cfg.output_format
+    if os.path.isfile(filename):
+        return os.getpid(), illustration_cache.stats()
+
+    # Rendered straight from the metadata without building the page
+    plan = get_page_render_plan(data)
+    if not dry:
+
+        img = render_page_plan(plan)
+        write_page_image(img, filename)
+
+    return os.getpid(), illustration_cache.stats()
+
+
+def read_page_metadata(metadata, read_texts=True):
+    """
+    Read a page's metadata from a metadata file
+    or a record of a metadata store
+
+    :param metadata: Path of the metadata file or a tuple of
+    the path of the shard, where the record starts in it
+    and it's length
+
+    :type metadata: str or tuple
+
+    :param read_texts: Whether to read compact metadata's texts
+    from the corpus now or leave them as None to be read with
+    load_bubble_texts when they're needed, defaults to True
+
+    :type read_texts: bool, optional
+
+    :return: The page's metadata
+
+    :rtype: dict
+    """
+    if isinstance(metadata, tuple):
+        return loads_metadata(read_record(*metadata),
+                              read_texts=read_texts)
+
+    return read_metadata(metadata, read_texts=read_texts)
+
+
+def load_page(metadata, assets=None):
+    """
+    Load a page from a metadata file or a record of a metadata
+    store and make it again from it's seed if that's all it has
+
+    :param metadata: Path of the metadata file or a tuple of
+    the path of the shard, where the record starts in it
+    and it's length
+
+    :type metadata: str or tuple
+
+    :param assets: A tuple of the assets in the order
+    create_page_metadata takes them, defaults to None
+    i.e. the ones this process has
+
+    :type assets: tuple, optional
+
+    :return: The page
+
+    :rtype: Page
+    """
+    # Bubbles read their texts from the corpus when they're needed
+    data = read_page_metadata(metadata, read_texts=False)
+
+    if is_seed_record(data):
+        return regenerate_page(data, assets)
+    if is_render_plan(data):
+        raise ValueError("Page " + data['name'] + " only has it's " +
+                         "render plan so it can only be rendered")
+
     page = Page()
-    page.load_data(metadata)
-    filename = images_path+page.name+cfg.output_format
-    if not os.path.isfile(filename) and not dry:
+    page.load_data_dict(data)
 
-        img = page.render(show=False)
-        img.save(filename)
+    return page
 
 
-def render_pages(metadata_dir, images_dir, dry=False):
+def load_render_plan(metadata, assets=None):
     """
-    Takes metadata json files and renders page images
+    Get a page's render plan from a metadata file or a record of
+    a metadata store in any format. Pages are only built when
+    they have to be made again from their seeds.
+
+    :param metadata: Path of the metadata file or a tuple of
+    the path of the shard, where the record starts in it
+    and it's length
+
+    :type metadata: str or tuple
+
+    :param assets: A tuple of the assets in the order
+    create_page_metadata takes them, defaults to None
+    i.e. the ones this process has
 
-    :param metadata_dir: A directory containing all the metadata json files
+    :type assets: tuple, optional
+
+    :return: The page's render plan
+
+    :rtype: dict
+    """
+    data = read_page_metadata(metadata, read_texts=False)
+    return get_page_render_plan(data, assets)
+
+
+def get_page_render_plan(data, assets=None):
+    """
+    Get a page's render plan from it's metadata in any format.
+    Pages are only built when they have to be made again
+    from their seeds.
+
+    :param data: The page's metadata
+
+    :type data: dict
+
+    :param assets: A tuple of the assets in the order
+    create_page_metadata takes them, defaults to None
+    i.e. the ones this process has
+
+    :type assets: tuple, optional
+
+    :return: The page's render plan
+
+    :rtype: dict
+    """
+    if is_seed_record(data):
+        return regenerate_page(data, assets).get_render_plan()
+    if is_render_plan(data):
+        return data
+
+    return get_render_plan(data)
+
+
+def has_seed_records(filenames):
+    """
+    Check whether any of the pages to render only have their
+    seeds. Records of a metadata store are checked by the first
+    one of each shard since a shard is written in one format.
+
+    :param filenames: Each page's render task
+
+    :type filenames: list
+
+    :rtype: bool
+    """
+    checked_shards = set()
+    for task in filenames:
+        metadata = task[0]
+        if not isinstance(metadata, tuple):
+            if metadata.endswith(SeedSerializer.extension):
+                return True
+        elif metadata[0] not in checked_shards:
+            checked_shards.add(metadata[0])
+            # Seed records are JSON so others aren't decoded
+            record = read_record(*metadata)
+            if record.startswith(b"{") and \
+                    is_seed_record(json.loads(record)):
+                close_shards()
+                return True
+
+    close_shards()
+    return False
+
+
+def init_render_worker(font_files=[], speech_bubble_files=[], assets=None):
+    """
+    Warm up a render worker before it gets any pages by loading
+    fonts and speech bubble templates into it's caches and then
+    moving everything loaded so far out of the garbage collector's
+    way so that it isn't scanned or copied on write
+
+    :param font_files: Font files to read into memory
+
+    :type font_files: list, optional
+
+    :param speech_bubble_files: Speech bubble templates to load
+
+    :type speech_bubble_files: list, optional
+
+    :param assets: A tuple of the assets in the order
+    create_page_metadata takes them to make pages from their
+    seeds with, defaults to None i.e. load them from the
+    datasets folder if a page needs them
+
+    :type assets: tuple, optional
+    """
+    global worker_assets, worker_fingerprint
+    if assets is not None:
+        worker_assets = assets
+    worker_fingerprint = None
+
+    warm_caches(font_files, speech_bubble_files)
+    gc.freeze()
+
+
+def render_pages(metadata_dir,
+                 images_dir,
+                 dry=False,
+                 workers=None,
+                 chunksize=None,
+                 preload=None,
+                 assets=None):
+    """
+    Takes metadata files in any format and the pages of a metadata
+    store in the same directory and renders page images. Pages
+    whose metadata is only their seed are made again first.
+
+    :param metadata_dir: A directory containing all the metadata files
 
     :type metadata_dir: str
 
     :param images_dir: The output directory for the rendered pages
 
     :type images_dir: str
+
+    :param workers: Number of worker processes, defaults to None
+    i.e. one per CPU
+
+    :type workers: int, optional
+
+    :param chunksize: How many files to send to a worker at once,
+    defaults to None i.e. the one in the config or if that's None
+    picked from the number of files and workers
+
+    :type chunksize: int, optional
+
+    :param preload: Whether to warm up the caches in this process
+    and fork workers that share them rather than warming up
+    each worker, defaults to None i.e. the one in the config
+
+    :type preload: bool, optional
+
+    :param assets: A tuple of the assets in the order
+    create_page_metadata takes them to make pages from their
+    seeds with, defaults to None i.e. load them from the
+    datasets folder once before the workers start if
+    there are pages with only their seeds
+
+    :type assets: tuple, optional
     """
 
     filenames = [(metadata_dir+filename, images_dir, dry)
                  for filename in os.listdir(metadata_dir)
-                 if filename.endswith(".json")]
+                 if is_metadata_file(filename)]
+
+    # Records are read in the order they're in each shard
+    if is_metadata_store(metadata_dir):
+        store = MetadataStore.load(metadata_dir)
+        filenames += [(location, images_dir, dry)
+                      for location in store.get_locations()]
+
+    if chunksize is None:
+        chunksize = cfg.render_chunksize
+    if chunksize is None:
+        chunksize = max(1, min(32, len(filenames) //
+                               ((workers or os.cpu_count())*4)))
+
+    if preload is None:
+        preload = cfg.render_fork_preload
+
+    # Loaded here so that workers don't each build the
+    # manifest and convert the text corpus at once
+    if assets is None and has_seed_records(filenames):
+        assets = load_assets()
+    # Compact metadata's texts are read from the text corpus
+    # so it's converted here if it's out of date
+    get_text_corpus()
+
+    font_files, speech_bubble_files = load_render_assets()
+
+    mp_context = None
+    initializer = init_render_worker
+    initargs = (font_files, speech_bubble_files, assets)
+    if preload and "fork" in multiprocessing.get_all_start_methods():
+        # Forked workers share what's loaded here copy on write
+        init_render_worker(font_files, speech_bubble_files, assets)
+        mp_context = multiprocessing.get_context("fork")
+        initializer = None
+        initargs = ()
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp_context,
+            initializer=initializer,
+            initargs=initargs) as executor:
+        results = map_page_chunks(executor, create_single_page, filenames,
+                                  chunksize)
+
+    if preload:
+        gc.unfreeze()
+
+    # Counters are cumulative per worker so keep the latest one
+    worker_stats = {}
+    for pid, stats in results:
+        lookups = stats['hits'] + stats['misses']
+        if pid not in worker_stats or lookups > (
+                worker_stats[pid]['hits'] + worker_stats[pid]['misses']):
+            worker_stats[pid] = stats
+
+    if len(worker_stats) > 0:
+        hits = sum(stats['hits'] for stats in worker_stats.values())
+        misses = sum(stats['misses'] for stats in worker_stats.values())
+        evictions = sum(stats['evictions']
+                        for stats in worker_stats.values())
+        print("Illustration cache hits:", hits,
+              "misses:", misses,
+              "evictions:", evictions)
+
+
+# Assets used by this process to create page metadata
+worker_assets = None
+
+# Hash of the config and assets this process creates pages from
+worker_fingerprint = None
+
+
+def init_metadata_worker(assets=None):
+    """
+    Load the assets used to create pages once per worker
+    process rather than sending them with every page
+
+    :param assets: A tuple of the assets in the order
+    create_page_metadata takes them, defaults to None
+    i.e. load them from the datasets folder
+
+    :type assets: tuple, optional
+    """
+    global worker_assets, worker_fingerprint
+    if assets is None:
+        assets = load_assets()
+
+    worker_assets = assets
+    worker_fingerprint = None
+
+    # The assets live as long as the worker so keep
+    # the garbage collector from scanning them
+    gc.freeze()
+
+
+def get_worker_assets():
+    """
+    Get the assets this process creates pages from and
+    load them from the datasets folder if it has none
+
+    :return: A tuple of the assets in the order
+    create_page_metadata takes them
+
+    :rtype: tuple
+    """
+    global worker_assets
+    if worker_assets is None:
+        worker_assets = load_assets()
+
+    return worker_assets
+
+
+def get_worker_fingerprint():
+    """
+    Get the hash of the config and assets this
+    process creates pages from
+
+    :return: The hash
+
+    :rtype: str
+    """
+    global worker_fingerprint
+    if worker_fingerprint is None:
+        worker_fingerprint = get_fingerprint(get_worker_assets())
+
+    return worker_fingerprint
+
+
+def seed_page(seed, page_idx):
+    """
+    Seed the random number generators used to create a page
+    such that each page only depends on the run's seed and
+    it's own index and not on which worker creates it.
+
+    :param seed: Seed of the run
+
+    :type seed: int
+
+    :param page_idx: Index of the page in the run
+
+    :type page_idx: int
+
+    :return: Name of the page derived from the same seed
+
+    :rtype: str
+    """
+    seed_sequence = np.random.SeedSequence([seed, page_idx])
+    state = seed_sequence.generate_state(8)
+
+    # The layout engine draws from numpy's global generator
+    # and python's random module so those are the ones seeded
+    np.random.seed(state[:4])
+    random.seed(int.from_bytes(state[:4].tobytes(), "little"))
+
+    return str(uuid.UUID(bytes=state[4:].tobytes(), version=4))
+
+
+def create_seeded_page(seed, page_idx, assets):
+    """
+    Create the metadata of one page of a seeded run
+
+    :param seed: Seed of the run
+
+    :type seed: int
+
+    :param page_idx: Index of the page in the run
+
+    :type page_idx: int
+
+    :param assets: A tuple of the assets in the order
+    create_page_metadata takes them
+
+    :type assets: tuple
+
+    :return: The created page
+
+    :rtype: Page
+    """
+    page_name = seed_page(seed, page_idx)
+    page = create_page_metadata(*assets, page_name=page_name)
+
+    return page
+
+
+def regenerate_page(data, assets=None):
+    """
+    Make a page again from it's seed metadata after making
+    sure it's made from the same config and assets as before
+
+    :param data: The page's seed metadata
+
+    :type data: dict
+
+    :param assets: A tuple of the assets in the order
+    create_page_metadata takes them, defaults to None
+    i.e. the ones this process has
+
+    :type assets: tuple, optional
+
+    :return: The page
+
+    :rtype: Page
+    """
+    if assets is None:
+        assets = get_worker_assets()
+        fingerprint = get_worker_fingerprint()
+    else:
+        fingerprint = get_fingerprint(assets)
+    check_fingerprint(data, fingerprint)
+
+    page = create_seeded_page(data['seed'], data['page_idx'], assets)
+    if page.name != data['name']:
+        raise ValueError("Page " + data['name'] + " was made again " +
+                         "as " + page.name + " from it's seed")
+
+    return page
+
+
+def make_seed_metadata(seed, page_idx):
+    """
+    Serialize the seed metadata of a page of a seeded
+    run without creating the page
+
+    :param seed: Seed of the run
+
+    :type seed: int
+
+    :param page_idx: Index of the page in the run
+
+    :type page_idx: int
+
+    :return: Name of the page and it's metadata
+
+    :rtype: tuple
+    """
+    name = seed_page(seed, page_idx)
+    record = make_seed_record(name, seed, page_idx,
+                              get_worker_fingerprint())
+
+    return name, get_serializer("seed").dumps(record)
+
+
+# Appends the metadata created by this process to
+# it's own shards when writing to a metadata store
+metadata_store_writer = None
+
+
+def get_metadata_store_writer(store_dir, metadata_format=None):
+    """
+    Get this process' writer of a metadata store
+
+    :param store_dir: Folder of the store's files
+
+    :type store_dir: str
+
+    :param metadata_format: "json", "compact", "seed" or "plan",
+    defaults to None i.e. the one in the config
+
+    :type metadata_format: str, optional
+
+    :return: The writer
+
+    :rtype: MetadataStoreWriter
+    """
+    global metadata_store_writer
+    key = (store_dir, metadata_format)
+    if metadata_store_writer is None or metadata_store_writer[0] != key:
+        if metadata_store_writer is not None:
+            metadata_store_writer[1].close()
+        metadata_store_writer = (key, MetadataStoreWriter(store_dir,
+                                                          metadata_format))
+
+    return metadata_store_writer[1]
+
+
+def create_single_page_metadata(data):
+    """
+    This function is used to create and dump the metadata
+    of a single page within a worker process
+
+    :param data: A tuple of the page's index, the run's seed,
+    the metadata output path, whether or not to save
+    the metadata i.e. dry run or wet run, the format
+    to save it in and whether to add it to a metadata store
+
+    :type data: tuple
+
+    :return: Name of the page
+
+    :rtype: str
+    """
+    page_idx, seed, metadata_dir, dry, metadata_format, \
+        metadata_store = data
+    if metadata_format is None:
+        metadata_format = cfg.metadata_format
+
+    # Pages are only made from their seeds when they're rendered
+    if metadata_format == "seed":
+        name, metadata = make_seed_metadata(seed, page_idx)
+        if metadata_store and not dry:
+            get_metadata_store_writer(metadata_dir,
+                                      metadata_format).write(name, metadata)
+        elif not dry:
+            write_metadata(get_metadata_file(metadata_dir, name,
+                                             metadata_format), metadata)
+        return name
+
+    page = create_seeded_page(seed, page_idx, worker_assets)
+    if metadata_store and not dry:
+        get_metadata_store_writer(metadata_dir,
+                                  metadata_format).write_page(page)
+    else:
+        page.dump_data(metadata_dir, dry=dry,
+                       metadata_format=metadata_format)
+
+    return page.name
+
+
+def create_pages_metadata(n,
+                          metadata_dir,
+                          seed=None,
+                          workers=None,
+                          assets=None,
+                          dry=False,
+                          metadata_format=None,
+                          metadata_store=False):
+    """
+    Create the metadata of n pages in parallel. Each page is
+    seeded from the run's seed and it's index so the same seed
+    gives the same pages whatever the number of workers.
+
+    :param n: Number of pages
+
+    :type n: int
+
+    :param metadata_dir: The output directory for the metadata files
+
+    :type metadata_dir: str
+
+    :param seed: Seed of the run, defaults to None i.e. a random seed
+
+    :type seed: int, optional
+
+    :param workers: Number of worker processes, defaults to None
+    i.e. one per CPU
+
+    :type workers: int, optional
+
+    :param assets: A tuple of the assets in the order
+    create_page_metadata takes them, defaults to None i.e.
+    load them from the datasets folder once before the
+    workers start
+
+    :type assets: tuple, optional
+
+    :param dry: Whether to just create the pages without writing them
+
+    :type dry: bool, optional
+
+    :param metadata_format: "json", "compact", "seed" or "plan",
+    defaults to None i.e. the one in the config
+
+    :type metadata_format: str, optional
+
+    :param metadata_store: Whether to write the pages as records
+    of a metadata store with a shard per worker rather than
+    a file per page, defaults to False
+
+    :type metadata_store: bool, optional
+
+    :return: Names of the pages created in order
+
+    :rtype: list
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    print("Creating page metadata with seed:", seed)
+
+    tasks = [(page_idx, seed, metadata_dir, dry, metadata_format,
+              metadata_store)
+             for page_idx in range(n)]
+
+    # Loaded here so that workers don't each build the
+    # manifest and convert the text corpus at once
+    if assets is None:
+        assets = load_assets()
+
+    if workers == 1:
+        init_metadata_worker(assets)
+        names = [create_single_page_metadata(task) for task in tqdm(tasks)]
+        gc.unfreeze()
+        return names
+
+    chunksize = max(1, min(64, n//((workers or os.cpu_count())*4)))
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_metadata_worker,
+            initargs=(assets,)) as executor:
+        names = list(tqdm(executor.map(create_single_page_metadata,
+                                       tasks,
+                                       chunksize=chunksize),
+                          total=n))
+
+    return names
+
+
+# Writes the metadata of pages rendered by this process
+# in the background so that rendering doesn't wait on it
+metadata_writer = None
+metadata_writes = []
+
+
+def flush_metadata_writes():
+    """
+    Wait for the metadata of all the pages waiting to be written
+    in this process and raise the error of any that failed
+    """
+    global metadata_writer, metadata_writes
+    if metadata_writer is not None:
+        metadata_writer.shutdown(wait=True)
+        metadata_writer = None
+
+    writes = metadata_writes
+    metadata_writes = []
+    check_writes(writes)
+
+
+def write_metadata(filename, metadata):
+    """
+    Write a page's serialized metadata to a file
+
+    :param filename: Path of the metadata file
+
+    :type filename: str
+
+    :param metadata: The page's metadata as JSON
+    or compact metadata
+
+    :type metadata: str
+    """
+    if isinstance(metadata, bytes):
+        with open(filename, "wb") as metadata_file:
+            metadata_file.write(metadata)
+    else:
+        with open(filename, "w+") as json_file:
+            json_file.write(metadata)
+
+
+def create_and_render_single_page(data):
+    """
+    This function is used to create a single page's metadata
+    and render it straight away in memory within a worker process
+    without reading the metadata back from a file
+
+    :param data: A tuple of the page's index, the run's seed,
+    the image output path, the metadata output path or None to not
+    write it, whether or not to save the files i.e. dry run
+    or wet run, the format to write the metadata in and whether
+    to add it to a metadata store
+
+    :type data: tuple
+
+    :return: Name of the page
+
+    :rtype: str
+    """
+    global metadata_writer, metadata_writes
+    page_idx, seed, images_dir, metadata_dir, dry, metadata_format, \
+        metadata_store = data
+    if metadata_format is None:
+        metadata_format = cfg.metadata_format
+
+    page = create_seeded_page(seed, page_idx, worker_assets)
+    plan = page.get_render_plan()
+
+    # Written in the background while the page renders
+    if metadata_dir is not None and not dry:
+        if metadata_writer is None:
+            metadata_writer = concurrent.futures.ThreadPoolExecutor(
+                                max_workers=1)
+
+        # Fail the page if an earlier page's metadata wasn't written
+        metadata_writes = check_writes(metadata_writes)
+
+        if metadata_store:
+            store_writer = get_metadata_store_writer(metadata_dir,
+                                                     metadata_format)
+            serializer = store_writer.serializer
+        else:
+            serializer = get_serializer(metadata_format)
+
+        if metadata_format == "seed":
+            metadata = serializer.dumps(
+                make_seed_record(page.name, seed, page_idx,
+                                 get_worker_fingerprint()))
+        elif metadata_format == "plan":
+            metadata = serializer.dumps(plan)
+        else:
+            metadata = page.dump_metadata(serializer)
+
+        if metadata_store:
+            write = metadata_writer.submit(store_writer.write, page.name,
+                                           metadata)
+        else:
+            write = metadata_writer.submit(write_metadata,
+                                           get_metadata_file(metadata_dir,
+                                                             page.name,
+                                                             metadata_format),
+                                           metadata
+                                           )
+        metadata_writes.append(write)
+
+    filename = images_dir+page.name+cfg.output_format
+    if not dry:
+        img = render_page_plan(plan)
+        write_page_image(img, filename)
+
+    return page.name
+
+
+def create_pages_chunk(data):
+    """
+    Run a worker function on a chunk of pages and wait for what
+    they write in the background before the chunk is done so
+    that pages only count as done once they're written and a
+    failed write fails the chunk
+
+    :param data: A tuple of the function and the tasks
+    of the chunk's pages
+
+    :type data: tuple
+
+    :return: The function's results in order and how long
+    the worker was busy with the chunk in seconds
+
+    :rtype: tuple
+    """
+    function, tasks = data
+
+    start = time.perf_counter()
+    results = [function(task) for task in tasks]
+    flush_metadata_writes()
+    flush_page_images()
+    close_shards()
+
+    return results, time.perf_counter() - start
+
+
+def map_page_chunks(executor, function, tasks, chunksize):
+    """
+    Run a worker function on every page's task in chunks
+    with a progress bar of the pages that are done
+
+    :param executor: The pool of worker processes
+
+    :type executor: concurrent.futures.ProcessPoolExecutor
+
+    :param function: The worker function
+
+    :type function: function
+
+    :param tasks: Each page's task
+
+    :type tasks: list
+
+    :param chunksize: How many pages to send to a worker at once
+
+    :type chunksize: int
+
+    :return: The function's results in order
+
+    :rtype: list
+    """
+    chunks = [(function, tasks[start:start + chunksize])
+              for start in range(0, len(tasks), chunksize)]
+
+    results = []
+    with tqdm(total=len(tasks)) as progress:
+        for chunk_results, _ in executor.map(create_pages_chunk, chunks):
+            results.extend(chunk_results)
+            progress.update(len(chunk_results))
+
+    return results
+
+
+def generate_and_render_pages(n,
+                              images_dir,
+                              metadata_dir=None,
+                              seed=None,
+                              workers=None,
+                              assets=None,
+                              dry=False,
+                              metadata_format=None,
+                              metadata_store=False):
+    """
+    Create and render n pages in parallel where each worker renders
+    the pages it creates without a metadata round trip. Metadata is
+    optionally written as a side output.
+
+    :param n: Number of pages
+
+    :type n: int
+
+    :param images_dir: The output directory for the rendered pages
+
+    :type images_dir: str
+
+    :param metadata_dir: The output directory for the metadata files,
+    defaults to None i.e. don't write metadata
+
+    :type metadata_dir: str, optional
+
+    :param seed: Seed of the run, defaults to None i.e. a random seed
+
+    :type seed: int, optional
+
+    :param workers: Number of worker processes, defaults to None
+    i.e. one per CPU
+
+    :type workers: int, optional
+
+    :param assets: A tuple of the assets in the order
+    create_page_metadata takes them, defaults to None i.e.
+    load them from the datasets folder once before the
+    workers start
+
+    :type assets: tuple, optional
+
+    :param dry: Whether to just create the pages without writing them
+
+    :type dry: bool, optional
+
+    :param metadata_format: "json", "compact", "seed" or "plan",
+    defaults to None i.e. the one in the config
+
+    :type metadata_format: str, optional
+
+    :param metadata_store: Whether to write the metadata as records
+    of a metadata store rather than a file per page,
+    defaults to False
+
+    :type metadata_store: bool, optional
+
+    :return: Names of the pages created in order
+
+    :rtype: list
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    print("Generating pages with seed:", seed)
+
+    tasks = [(page_idx, seed, images_dir, metadata_dir, dry,
+              metadata_format, metadata_store)
+             for page_idx in range(n)]
+
+    # Loaded here so that workers don't each build the
+    # manifest and convert the text corpus at once
+    if assets is None:
+        assets = load_assets()
+
+    chunksize = max(1, min(16, n//((workers or os.cpu_count())*4)))
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_metadata_worker,
+            initargs=(assets,)) as executor:
+        names = map_page_chunks(executor, create_and_render_single_page,
+                                tasks, chunksize)
+
+    return names
+
+
+def pipeline_pages(n,
+                   metadata_dir,
+                   images_dir,
+                   seed=None,
+                   metadata_workers=None,
+                   render_workers=None,
+                   queue_size=None,
+                   assets=None,
+                   dry=False,
+                   metadata_format=None):
+    """
+    Create and persist page metadata with one pool of workers while
+    rendering it with another. The pools are connected by a bounded
+    queue of pages waiting to be rendered so metadata workers stop
+    getting new pages when the render workers fall behind.
+
+    Since the queue ties the rate of both stages together how
+    busy each pool's workers were and how long the queue was
+    full or empty is reported to show which stage holds the
+    other one up. A full queue means rendering is the
+    bottleneck and an empty one means creating metadata is.
+
+    :param n: Number of pages
+
+    :type n: int
+
+    :param metadata_dir: The output directory for the metadata files
+
+    :type metadata_dir: str
+
+    :param images_dir: The output directory for the rendered pages
+
+    :type images_dir: str
+
+    :param seed: Seed of the run, defaults to None i.e. a random seed
+
+    :type seed: int, optional
+
+    :param metadata_workers: Number of metadata worker processes,
+    defaults to None i.e. a quarter of the CPUs
+
+    :type metadata_workers: int, optional
+
+    :param render_workers: Number of render worker processes,
+    defaults to None i.e. the rest of the CPUs
+
+    :type render_workers: int, optional
+
+    :param queue_size: Maximum number of pages being created or
+    waiting to be rendered, defaults to None i.e. four per
+    render worker
+
+    :type queue_size: int, optional
+
+    :param assets: A tuple of the assets in the order
+    create_page_metadata takes them, defaults to None i.e.
+    load them from the datasets folder once before the
+    workers start
+
+    :type assets: tuple, optional
+
+    :param dry: Whether to render pages without saving them. The
+    metadata is still written since it's how pages are passed
+    to the render workers
+
+    :type dry: bool, optional
+
+    :param metadata_format: "json", "compact", "seed" or "plan",
+    defaults to None i.e. the one in the config
+
+    :type metadata_format: str, optional
+
+    :return: Pages per second of each stage, the fraction of
+    the time each stage's workers were busy and the fraction
+    of the time the queue was full or empty
+
+    :rtype: dict
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    print("Generating pages with seed:", seed)
+
+    cpus = os.cpu_count()
+    if metadata_workers is None:
+        metadata_workers = max(1, cpus//4)
+    if render_workers is None:
+        render_workers = max(1, cpus - metadata_workers)
+    if queue_size is None:
+        queue_size = render_workers*4
+
+    if not os.path.isdir(metadata_dir):
+        os.makedirs(metadata_dir)
+
+    # Loaded here so that workers don't each build the
+    # manifest and convert the text corpus at once
+    if assets is None:
+        assets = load_assets()
+
+    metadata_pool = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=metadata_workers,
+                        initializer=init_metadata_worker,
+                        initargs=(assets,))
+    # Render workers need the assets to make pages from their seeds
+    render_pool = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=render_workers,
+                        initializer=init_render_worker,
+                        initargs=([], [], assets))
+
+    pending_metadata = set()
+    pending_renders = set()
+
+    # Pages that have metadata and are waiting to be rendered
+    ready = deque()
+
+    next_idx = 0
+    created = 0
+    rendered = 0
+
+    # Seconds the workers of each stage spent on pages and
+    # the queue spent full i.e. metadata workers were held
+    # back or empty i.e. render workers were waiting
+    busy = dict(metadata=0.0, render=0.0)
+    queue_full = 0.0
+    queue_empty = 0.0
+    start = time.time()
+
+    def rates():
+        elapsed = max(time.time() - start, 1e-9)
+        return dict(
+            metadata=created/elapsed,
+            render=rendered/elapsed,
+            metadata_busy=busy['metadata']/(elapsed*metadata_workers),
+            render_busy=busy['render']/(elapsed*render_workers),
+            queue_full=queue_full/elapsed,
+            queue_empty=queue_empty/elapsed
+        )
+
+    with metadata_pool, render_pool, tqdm(total=n) as progress:
+        while rendered < n:
+
+            # Only create more pages while the queue has room
+            while (next_idx < n and
+                   len(pending_metadata) + len(ready) < queue_size):
+                task = (next_idx, seed, metadata_dir, False,
+                        metadata_format, False)
+                pending_metadata.add(
+                    metadata_pool.submit(create_pages_chunk,
+                                         (create_single_page_metadata,
+                                          [task])))
+                next_idx += 1
+
+            # Keep the render workers busy without
+            # moving the whole queue into their pool
+            while ready and len(pending_renders) < render_workers*2:
+                name = ready.popleft()
+                task = (get_metadata_file(metadata_dir, name,
+                                          metadata_format),
+                        images_dir, dry)
+                # Each page is written before it counts as rendered
+                pending_renders.add(
+                    render_pool.submit(create_pages_chunk,
+                                       (create_single_page, [task])))
+
+            full = next_idx < n and \
+                len(pending_metadata) + len(ready) >= queue_size
+            empty = len(ready) == 0 and \
+                len(pending_renders) < render_workers
+            wait_start = time.time()
+
+            done, _ = concurrent.futures.wait(
+                        pending_metadata | pending_renders,
+                        return_when=concurrent.futures.FIRST_COMPLETED)
+
+            waited = time.time() - wait_start
+            if full:
+                queue_full += waited
+            elif empty:
+                queue_empty += waited
+
+            for future in done:
+                results, seconds = future.result()
+                if future in pending_metadata:
+                    pending_metadata.remove(future)
+                    ready.extend(results)
+                    busy['metadata'] += seconds
+                    created += 1
+                else:
+                    pending_renders.remove(future)
+                    busy['render'] += seconds
+                    rendered += 1
+                    progress.update(1)
+
+            stage_rates = rates()
+            progress.set_postfix(
+                metadata_pps="%.1f" % stage_rates['metadata'],
+                render_pps="%.1f" % stage_rates['render'],
+                metadata_busy="%.0f%%" % (stage_rates['metadata_busy']*100),
+                render_busy="%.0f%%" % (stage_rates['render_busy']*100),
+                queued=len(ready)
+            )
+
+    stage_rates = rates()
+    print("Metadata pages/sec:", round(stage_rates['metadata'], 2),
+          "Render pages/sec:", round(stage_rates['render'], 2))
+    print("Metadata workers busy:",
+          "%.0f%%" % (stage_rates['metadata_busy']*100),
+          "Render workers busy:",
+          "%.0f%%" % (stage_rates['render_busy']*100))
+    print("Queue full:", "%.0f%%" % (stage_rates['queue_full']*100),
+          "Queue empty:", "%.0f%%" % (stage_rates['queue_empty']*100))
 
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        results = list(tqdm(executor.map(create_single_page, filenames),
-                            total=len(filenames)))
+    return stage_rates
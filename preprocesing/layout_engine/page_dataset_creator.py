@@ -9,6 +9,9 @@ import json
 import uuid
 
 from .page_object_classes import Panel, Page, SpeechBubble
+from .speech_bubble_catalog import SpeechBubbleCatalog
+from .text_sampler import TextSampler
+from .font_index import FontIndex
 from .helpers import (
                       invert_for_next, choose, choose_and_return_other,
                       get_min_area_panels, get_leaf_panels,
@@ -1439,14 +1442,14 @@ def create_single_panel_metadata(panel,
     :type image_dir_path: str
 
     :param font_files: list of font files for speech bubble
-    text
+    text or an index of which characters they have
 
     :type font_files: list
 
     :param text_dataset: A dask dataframe of text to
-    pick to render within speech bubble
+    pick to render within speech bubble or a sampler of it
 
-    :type text_dataset: pandas.dataframe
+    :type text_dataset: pandas.dataframe or TextSampler
 
     :param speech_bubble_files: list of base speech bubble
     template files
@@ -1454,9 +1457,9 @@ def create_single_panel_metadata(panel,
     :type speech_bubble_files: list
 
     :param speech_bubble_tags: a list of speech bubble
-    writing area tags by filename
+    writing area tags by filename or a catalog of them
 
-    :type speech_bubble_tags: list
+    :type speech_bubble_tags: list or SpeechBubbleCatalog
 
     :param minimum_speech_bubbles: Set whether panels
     have a minimum number of speech bubbles, defaults to 0
@@ -1487,26 +1490,43 @@ def create_single_panel_metadata(panel,
         font = font_files[font_idx]
 
         # Select a speech bubble and get it's writing areas
-        speech_bubble_file_idx = np.random.randint(
-                                    0,
-                                    speech_bubble_dataset_len
-                                    )
-
-        speech_bubble_file = speech_bubble_files[speech_bubble_file_idx]
-
-        area_idx = speech_bubble_tags['imagename'] == speech_bubble_file
-        speech_bubble_writing_area = speech_bubble_tags[area_idx]['label']
-        speech_bubble_writing_area = speech_bubble_writing_area.values[0]
-        speech_bubble_writing_area = json.loads(speech_bubble_writing_area)
+        if isinstance(speech_bubble_tags, SpeechBubbleCatalog):
+            (speech_bubble_file,
+             speech_bubble_writing_area,
+             speech_bubble_size) = speech_bubble_tags.sample()
+        else:
+            speech_bubble_file_idx = np.random.randint(
+                                        0,
+                                        speech_bubble_dataset_len
+                                        )
+
+            speech_bubble_file = speech_bubble_files[speech_bubble_file_idx]
+
+            area_idx = speech_bubble_tags['imagename'] == speech_bubble_file
+            speech_bubble_writing_area = speech_bubble_tags[area_idx]['label']
+            speech_bubble_writing_area = speech_bubble_writing_area.values[0]
+            speech_bubble_writing_area = json.loads(
+                                            speech_bubble_writing_area
+                                            )
+            speech_bubble_size = None
 
         # Select text for writing areas
-        texts = []
-        text_indices = []
-        for i in range(len(speech_bubble_writing_area)):
-            text_idx = np.random.randint(0, text_dataset_len)
-            text_indices.append(text_idx)
-            text = text_dataset.iloc[text_idx].to_dict()
-            texts.append(text)
+        num_texts = len(speech_bubble_writing_area)
+        if isinstance(text_dataset, TextSampler):
+            text_indices, texts = text_dataset.sample(num_texts)
+        else:
+            text_indices = np.random.randint(0, text_dataset_len,
+                                             size=num_texts)
+            texts = text_dataset.iloc[text_indices].to_dict("records")
+            text_indices = text_indices.tolist()
+
+        # Swap the font for one that has every character
+        # of the texts so they don't render as boxes
+        if isinstance(font_files, FontIndex):
+            bubble_text = "".join(text.get('Japanese', '')
+                                  for text in texts)
+            font_idx = font_files.choose_font(font_idx, bubble_text)
+            font = font_files[font_idx]
 
         # resize bubble to < 40% of panel area
         max_area = panel.area*cfg.bubble_to_panel_area_max_ratio
@@ -1528,8 +1548,10 @@ def create_single_panel_metadata(panel,
             y_choice
         ]
 
-        speech_bubble_img = Image.open(speech_bubble_file)
-        w, h = speech_bubble_img.size
+        if speech_bubble_size is None:
+            speech_bubble_img = Image.open(speech_bubble_file)
+            speech_bubble_size = speech_bubble_img.size
+        w, h = speech_bubble_size
         # Create speech bubble
         speech_bubble = SpeechBubble(texts=texts,
                                      text_indices=text_indices,
@@ -1542,6 +1564,11 @@ def create_single_panel_metadata(panel,
                                      height=h,
                                      )
 
+        # Resolve font sizes and lines of text once here
+        # so that rendering only has to draw them
+        if cfg.precompute_text_layout:
+            speech_bubble.text_layout = speech_bubble.layout_text()
+
         panel.speech_bubbles.append(speech_bubble)
 
 
@@ -1572,14 +1599,14 @@ def populate_panels(page,
     :type image_dir_path: str
 
     :param font_files: list of font files for speech bubble
-    text
+    text or an index of which characters they have
 
     :type font_files: list
 
     :param text_dataset: A dask dataframe of text to
-    pick to render within speech bubble
+    pick to render within speech bubble or a sampler of it
 
-    :type text_dataset: pandas.dataframe
+    :type text_dataset: pandas.dataframe or TextSampler
 
     :param speech_bubble_files: list of base speech bubble
     template files
@@ -1587,9 +1614,9 @@ def populate_panels(page,
     :type speech_bubble_files: list
 
     :param speech_bubble_tags: a list of speech bubble
-    writing area tags by filename
+    writing area tags by filename or a catalog of them
 
-    :type speech_bubble_tags: list
+    :type speech_bubble_tags: list or SpeechBubbleCatalog
 
     :param minimum_speech_bubbles: Set whether panels
     have a minimum number of speech bubbles, defaults to 0
@@ -2248,7 +2275,8 @@ def create_page_metadata(image_dir,
                          font_files,
                          text_dataset,
                          speech_bubble_files,
-                         speech_bubble_tags):
+                         speech_bubble_tags,
+                         page_name=None):
     """
     This function creates page metadata for a single page. It includes
     transforms, background addition, random panel removal,
@@ -2265,14 +2293,14 @@ def create_page_metadata(image_dir,
     :type image_dir_path: str
 
     :param font_files: list of font files for speech bubble
-    text
+    text or an index of which characters they have
 
     :type font_files: list
 
     :param text_dataset: A dask dataframe of text to
-    pick to render within speech bubble
+    pick to render within speech bubble or a sampler of it
 
-    :type text_dataset: pandas.dataframe
+    :type text_dataset: pandas.dataframe or TextSampler
 
     :param speech_bubble_files: list of base speech bubble
     template files
@@ -2280,9 +2308,13 @@ def create_page_metadata(image_dir,
     :type speech_bubble_files: list
 
     :param speech_bubble_tags: a list of speech bubble
-    writing area tags by filename
+    writing area tags by filename or a catalog of them
+
+    :type speech_bubble_tags: list or SpeechBubbleCatalog
 
-    :type speech_bubble_tags: list
+    :param page_name: A specific name for the page
+
+    :type page_name: str, optional
 
     :return: Created Page with all the bells and whistles
 
@@ -2303,7 +2335,7 @@ def create_page_metadata(image_dir,
         p=list(cfg.num_pages_ratios.values())
     )
 
-    page = get_base_panels(number_of_panels, page_type)
+    page = get_base_panels(number_of_panels, page_type, page_name=page_name)
 
     if np.random.random() < cfg.panel_transform_chance:
         page = add_transforms(page)
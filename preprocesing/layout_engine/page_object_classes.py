@@ -1,11 +1,13 @@
 import numpy as np
 import random
-from PIL import Image, ImageDraw, ImageFont, ImageOps
-import json
 import uuid
-from .helpers import crop_image_only_outside
-import cjkwrap
 from .helpers import get_leaf_panels
+from .text_layout import layout_bubble_text, transform_writing_areas
+from .render_plan import draw_speech_bubble, get_bubble_op, render_page_plan
+from .metadata_serializers import (
+    PlanSerializer, SeedSerializer, get_serializer, load_bubble_texts,
+    read_metadata
+)
 from .. import config_file as cfg
 
 
@@ -248,7 +250,9 @@ class Panel(object):
                             height=speech_bubble['height'],
                             transforms=speech_bubble['transforms'],
                             transform_metadata=transform_metadata,
-                            text_orientation=speech_bubble['text_orientation']
+                            text_orientation=speech_bubble['text_orientation'],
+                            font_size=speech_bubble.get('font_size'),
+                            text_layout=speech_bubble.get('text_layout')
                             )
 
                 self.speech_bubbles.append(bubble)
@@ -342,23 +346,13 @@ class Page(Panel):
         # Size of the page
         self.page_size = cfg.page_size
 
-    def dump_data(self, dataset_path, dry=True):
+    def dump_data_dict(self):
         """
         A method to take all the Page's relevant data
-        and create a dictionary out of it so it can be
-        exported to JSON so that it can then be loaded
-        and rendered to images in parallel
-
-        :param dataset_path: Where to dump the JSON file
-
-        :type dataset_path: str
+        and create a dictionary out of it
 
-        :param dry: Whether to just return or write the JSON file
-
-        :type dry: bool, optional
-
-        :return: Optional return when running dry of a json data dump
-        :rtype: str
+        :return: A dictionary of the Page's data
+        :rtype: dict
         """
 
         # Recursively dump children
@@ -378,74 +372,142 @@ class Page(Panel):
             speech_bubbles=speech_bubbles
         )
 
+        return data
+
+    def dump_metadata(self, serializer):
+        """
+        A method to serialize the Page's data or it's render
+        plan with the serializer of a metadata format
+
+        :param serializer: The serializer
+
+        :type serializer: JSONSerializer or CompactSerializer
+
+        :return: The metadata which is a str for JSON
+        and bytes for compact metadata
+        :rtype: str
+        """
+
+        if isinstance(serializer, SeedSerializer):
+            raise ValueError("A page's seed is only known when it's " +
+                             "created so it can't be dumped as one")
+        if isinstance(serializer, PlanSerializer):
+            return serializer.dumps(self.get_render_plan())
+
+        return serializer.dumps(self.dump_data_dict())
+
+    def dump_data(self, dataset_path, dry=True, metadata_format=None):
+        """
+        A method to take all the Page's relevant data
+        and serialize it so that it can then be loaded
+        and rendered to images in parallel
+
+        :param dataset_path: Where to dump the metadata file
+
+        :type dataset_path: str
+
+        :param dry: Whether to just return or write the metadata file
+
+        :type dry: bool, optional
+
+        :param metadata_format: "json", "compact" or "plan",
+        defaults to None i.e. the one in the config
+
+        :type metadata_format: str, optional
+
+        :return: Optional return when running dry of the metadata
+        which is a str for JSON and bytes for compact metadata
+        :rtype: str
+        """
+
+        serializer = get_serializer(metadata_format)
+        metadata = self.dump_metadata(serializer)
+
         if not dry:
-            with open(dataset_path+self.name+".json", "w+") as json_file:
-                json.dump(data, json_file, indent=2)
+            filename = dataset_path+self.name+serializer.extension
+            if isinstance(metadata, bytes):
+                with open(filename, "wb") as metadata_file:
+                    metadata_file.write(metadata)
+            else:
+                with open(filename, "w+") as json_file:
+                    json_file.write(metadata)
         else:
-            return json.dumps(data, indent=2)
+            return metadata
 
     def load_data(self, filename):
 
         """
         This method reverses the dump_data function and
-        load's the metadata of the page from the JSON
-        file that has been loaded.
+        load's the metadata of the page from a JSON or compact
+        metadata file. Texts of compact metadata are read from
+        the text corpus when they're needed.
 
-        :param filename: JSON filename to load
+        :param filename: Metadata filename to load
 
         :type filename: str
         """
-        with open(filename, "rb") as json_file:
-
-            data = json.load(json_file)
-
-            self.name = data['name']
-            self.num_panels = int(data['num_panels'])
-            self.page_type = data['page_type']
-            self.background = data['background']
-
-            if len(data['speech_bubbles']) > 0:
-                for speech_bubble in data['speech_bubbles']:
-                    # Line constraints
-                    text_orientation = speech_bubble['text_orientation']
-                    transform_metadata = speech_bubble['transform_metadata']
-                    bubble = SpeechBubble(
-                                texts=speech_bubble['texts'],
-                                text_indices=speech_bubble['text_indices'],
-                                font=speech_bubble['font'],
-                                speech_bubble=speech_bubble['speech_bubble'],
-                                writing_areas=speech_bubble['writing_areas'],
-                                resize_to=speech_bubble['resize_to'],
-                                location=speech_bubble['location'],
-                                width=speech_bubble['width'],
-                                height=speech_bubble['height'],
-                                transforms=speech_bubble['transforms'],
-                                transform_metadata=transform_metadata,
-                                text_orientation=text_orientation
-                                )
-
-                    self.speech_bubbles.append(bubble)
-
-            # Recursively load children
-            if len(data['children']) > 0:
-                for child in data['children']:
-                    panel = Panel(
-                        coords=child['coordinates'],
-                        name=child['name'],
-                        parent=self,
-                        orientation=child['orientation'],
-                        non_rect=child['non_rect']
-                    )
-                    panel.load_data(child)
-                    self.children.append(panel)
+        self.load_data_dict(read_metadata(filename, read_texts=False))
 
-    def render(self, show=False):
+    def load_data_dict(self, data):
         """
-        A function to render this page to an image
+        This method reverses the dump_data_dict function and
+        load's the metadata of the page from a dictionary
 
-        :param show: Whether to return this image or to show it
+        :param data: A dictionary of the page's data
 
-        :type show: bool, optional
+        :type data: dict
+        """
+        self.name = data['name']
+        self.num_panels = int(data['num_panels'])
+        self.page_type = data['page_type']
+        self.background = data['background']
+
+        if len(data['speech_bubbles']) > 0:
+            for speech_bubble in data['speech_bubbles']:
+                # Line constraints
+                text_orientation = speech_bubble['text_orientation']
+                transform_metadata = speech_bubble['transform_metadata']
+                bubble = SpeechBubble(
+                            texts=speech_bubble['texts'],
+                            text_indices=speech_bubble['text_indices'],
+                            font=speech_bubble['font'],
+                            speech_bubble=speech_bubble['speech_bubble'],
+                            writing_areas=speech_bubble['writing_areas'],
+                            resize_to=speech_bubble['resize_to'],
+                            location=speech_bubble['location'],
+                            width=speech_bubble['width'],
+                            height=speech_bubble['height'],
+                            transforms=speech_bubble['transforms'],
+                            transform_metadata=transform_metadata,
+                            text_orientation=text_orientation,
+                            font_size=speech_bubble.get('font_size'),
+                            text_layout=speech_bubble.get('text_layout')
+                            )
+
+                self.speech_bubbles.append(bubble)
+
+        # Recursively load children
+        if len(data['children']) > 0:
+            for child in data['children']:
+                panel = Panel(
+                    coords=child['coordinates'],
+                    name=child['name'],
+                    parent=self,
+                    orientation=child['orientation'],
+                    non_rect=child['non_rect']
+                )
+                panel.load_data(child)
+                self.children.append(panel)
+
+    def get_render_plan(self):
+        """
+        A method to flatten this page into the leaf panels and
+        speech bubbles that are drawn in the order they're drawn
+        so that it can be rendered without it's tree of panels
+
+        :return: The page's name, background, polygon and
+        illustration of each panel and speech bubbles
+        :rtype: dict
         """
 
         leaf_children = []
@@ -455,92 +517,35 @@ class Page(Panel):
                 get_leaf_panels(self, leaf_children)
             else:
                 leaf_children = self.leaf_children
+            bubble_panels = leaf_children
+        else:
+            # If it's a single panel page
+            bubble_panels = [self]
 
-        W = cfg.page_width
-        H = cfg.page_height
-
-        # Create a new blank image
-        page_img = Image.new(size=(W, H), mode="L", color="white")
-        draw_rect = ImageDraw.Draw(page_img)
-
-        # Set background if needed
-        if self.background is not None:
-            bg = Image.open(self.background).convert("L")
-            img_array = np.asarray(bg)
-            crop_array = crop_image_only_outside(img_array)
-            bg = Image.fromarray(crop_array)
-            bg = bg.resize((W, H))
-            page_img.paste(bg, (0, 0))
-
-        # Render panels
-        for panel in leaf_children:
-
-            # Panel coords
-            rect = panel.get_polygon()
-
-            # Open the illustration to put within panel
-            if panel.image is not None:
-                img = Image.open(panel.image)
-
-                # Clean it up by cropping the black areas
-                img_array = np.asarray(img)
-                crop_array = crop_image_only_outside(img_array)
+        panels = [dict(polygon=[list(coord) for coord in panel.get_polygon()],
+                       image=panel.image)
+                  for panel in leaf_children]
+        speech_bubbles = [get_bubble_op(bubble.dump_data())
+                          for panel in bubble_panels
+                          for bubble in panel.speech_bubbles]
 
-                img = Image.fromarray(crop_array)
+        return dict(
+            name=self.name,
+            background=self.background,
+            panels=panels,
+            speech_bubbles=speech_bubbles
+        )
 
-                # Resize it to the page's size as a simple
-                # way to crop differnt parts of it
+    def render(self, show=False):
+        """
+        A function to render this page to an image
 
-                # TODO: Figure out how to do different types of
-                # image crops for smaller panels
-                w_rev_ratio = cfg.page_width/img.size[0]
-                h_rev_ratio = cfg.page_height/img.size[1]
+        :param show: Whether to return this image or to show it
 
-                img = img.resize(
-                    (round(img.size[0]*w_rev_ratio),
-                     round(img.size[1]*h_rev_ratio))
-                )
+        :type show: bool, optional
+        """
 
-                # Create a mask for the panel illustration
-                mask = Image.new("L", cfg.page_size, 0)
-                draw_mask = ImageDraw.Draw(mask)
-
-                # On the mask draw and therefore cut out the panel's
-                # area so that the illustration can be fit into
-                # the page itself
-                draw_mask.polygon(rect, fill=255)
-
-            # Draw outline
-            draw_rect.line(rect, fill="black", width=cfg.boundary_width)
-
-            # Paste illustration onto the page
-            if panel.image is not None:
-                page_img.paste(img, (0, 0), mask)
-
-        # If it's a single panel page
-        if self.num_panels < 2:
-            leaf_children.append(self)
-
-        # Render bubbles
-        for panel in leaf_children:
-            if len(panel.speech_bubbles) < 1:
-                continue
-            # For each bubble
-            for sb in panel.speech_bubbles:
-                states, bubble, mask, location = sb.render()
-                # Slightly shift mask so that you get outline for bubbles
-                new_mask_width = mask.size[0]+cfg.bubble_mask_x_increase
-                new_mask_height = mask.size[1]+cfg.bubble_mask_y_increase
-                bubble_mask = mask.resize((new_mask_width, new_mask_height))
-
-                w, h = bubble.size
-                crop_dims = (
-                    5, 5,
-                    5+w, 5+h,
-                )
-                # Uses a mask so that the "L" type bubble is cropped
-                bubble_mask = bubble_mask.crop(crop_dims)
-                page_img.paste(bubble, location, bubble_mask)
+        page_img = render_page_plan(self.get_render_plan())
 
         if show:
             page_img.show()
@@ -553,7 +558,8 @@ class SpeechBubble(object):
     A class to represent the metadata to render a speech bubble
 
     :param texts: A list of texts from the text corpus to render in this
-    bubble
+    bubble or None to read them from it by their indices when
+    they're needed
 
     :type texts: lists
 
@@ -608,6 +614,17 @@ class SpeechBubble(object):
     is written left to right ot top to bottom
 
     :type text_orientation: str, optional
+
+    :param font_size: Size of the font, defaults to None
+    i.e. chosen randomly
+
+    :type font_size: int, optional
+
+    :param text_layout: Precomputed font sizes and lines of text
+    of each writing area, defaults to None i.e. laid out
+    when rendering
+
+    :type text_layout: list, optional
     """
     def __init__(self,
                  texts,
@@ -621,7 +638,9 @@ class SpeechBubble(object):
                  height,
                  transforms=None,
                  transform_metadata=None,
-                 text_orientation=None):
+                 text_orientation=None,
+                 font_size=None,
+                 text_layout=None):
         """
         Constructor method
         """
@@ -689,11 +708,16 @@ class SpeechBubble(object):
         else:
             self.text_orientation = text_orientation
 
-        min_font_size = cfg.min_font_size
-        max_font_size = cfg.max_font_size
-        self.font_size = np.random.randint(min_font_size,
-                                           max_font_size
-                                           )
+        if font_size is None:
+            min_font_size = cfg.min_font_size
+            max_font_size = cfg.max_font_size
+            self.font_size = np.random.randint(min_font_size,
+                                               max_font_size
+                                               )
+        else:
+            self.font_size = font_size
+
+        self.text_layout = text_layout
 
     def dump_data(self):
         """
@@ -706,6 +730,7 @@ class SpeechBubble(object):
         dump_data method
         :rtype: dict
         """
+        self.load_texts()
         data = dict(
             texts=self.texts,
             text_indices=self.text_indices,
@@ -719,284 +744,56 @@ class SpeechBubble(object):
             height=self.height,
             transforms=self.transforms,
             transform_metadata=self.transform_metadata,
-            text_orientation=self.text_orientation
+            text_orientation=self.text_orientation,
+            text_layout=self.text_layout
         )
 
         return data
 
-    def render(self):
+    def load_texts(self):
         """
-        A function to render this speech bubble
-
-        :return: A list of states of the speech bubble,
-        the speech bubble itself, it's mask and it's location
-        on the page
-        :rtype: tuple
+        Read this bubble's texts from the text corpus if
+        it was loaded from compact metadata without them
         """
+        if self.texts is None:
+            bubble = dict(texts=None, text_indices=self.text_indices)
+            load_bubble_texts([bubble])
+            self.texts = bubble['texts']
 
-        bubble = Image.open(self.speech_bubble).convert("L")
-        mask = bubble.copy()
-
-        # Set variable font size
-        min_font_size = cfg.max_font_size
-        max_font_size = cfg.max_font_size
-        current_font_size = self.font_size
-        font = ImageFont.truetype(self.font, current_font_size)
-
-        # Center of bubble
-        w, h = bubble.size
-        cx, cy = w/2, h/2
-
-        # States is used to indicate whether this bubble is
-        # inverted or not to the page render function
-        states = []
-
-        # Pre-rendering transforms
-        for transform in self.transforms:
-            if transform == "invert":
-                states.append("inverted")
-                bubble = ImageOps.invert(bubble)
-
-            elif transform == "flip vertical":
-                bubble = ImageOps.flip(bubble)
-                mask = ImageOps.flip(mask)
-                # TODO: vertically flip box coordinates
-                new_writing_areas = []
-                for area in self.writing_areas:
-                    og_height = area['original_height']
-
-                    # Convert from percentage to actual values
-                    px_height = (area['height']/100)*og_height
-
-                    og_y = ((area['y']/100)*og_height)
-                    cydist = abs(cy - og_y)
-                    new_y = (2*cydist + og_y) - px_height
-                    new_y = (new_y/og_height)*100
-                    area['y'] = new_y
-                    new_writing_areas.append(area)
-
-                self.writing_areas = new_writing_areas
-                states.append("vflip")
-
-            elif transform == "flip horizontal":
-                bubble = ImageOps.mirror(bubble)
-                mask = ImageOps.mirror(mask)
-                new_writing_areas = []
-                for area in self.writing_areas:
-                    og_width = area['original_width']
-
-                    # Convert from percentage to actual values
-                    px_width = (area['width']/100)*og_width
-
-                    og_x = ((area['x']/100)*og_width)
-                    # og_y = ((area['y']/100)*og_height)
-                    cxdist = abs(cx - og_x)
-                    new_x = (2*cxdist + og_x) - px_width
-                    new_x = (new_x/og_width)*100
-                    area['x'] = new_x
-                    new_writing_areas.append(area)
-
-                self.writing_areas = new_writing_areas
-                states.append("hflip")
-
-            elif transform == "stretch x":
-
-                stretch_factor = self.transform_metadata['stretch_x_factor']
-                new_size = (round(w*(1+stretch_factor)), h)
-                # Reassign for resizing later
-                w, h = new_size
-                bubble = bubble.resize(new_size)
-                mask = mask.resize(new_size)
+    def transform_writing_areas(self):
+        """
+        Apply this bubble's flips and stretches to it's writing areas
+        so that they line up with the transformed bubble
 
-                new_writing_areas = []
-                for area in self.writing_areas:
-                    og_width = area['original_width']
+        :return: Transformed copies of the writing areas
+        :rtype: list
+        """
 
-                    # Convert from percentage to actual values
-                    px_width = (area['width']/100)*og_width
+        return transform_writing_areas(self.dump_data())
 
-                    area['original_width'] = og_width*(1+stretch_factor)
+    def layout_text(self):
+        """
+        Fit the text of each writing area and work out
+        where each of it's lines is drawn on the bubble
 
-                    new_writing_areas.append(area)
+        :return: A list with the font size and a list of
+        [x, y, text] lines for each writing area
+        :rtype: list
+        """
 
-                self.writing_areas = new_writing_areas
-                states.append("xstretch")
+        return layout_bubble_text(self.dump_data())
 
-            elif transform == "stretch y":
-                stretch_factor = self.transform_metadata['stretch_y_factor']
-                new_size = (w, round(h*(1+stretch_factor)))
+    def render(self):
+        """
+        A function to render this speech bubble
 
-                # Reassign for resizing later
-                w, h = new_size
-                bubble = bubble.resize(new_size)
-                mask = mask.resize(new_size)
+        :return: A list of states of the speech bubble,
+        the speech bubble itself, it's mask and it's location
+        on the page
+        :rtype: tuple
+        """
 
-                new_writing_areas = []
-                for area in self.writing_areas:
-                    og_height = area['original_height']
-
-                    # Convert from percentage to actual values
-                    px_height = (area['height']/100)*og_height
-
-                    area['original_height'] = og_height*(1+stretch_factor)
-
-                    new_writing_areas.append(area)
-
-                self.writing_areas = new_writing_areas
-                states.append("ystretch")
-
-        # Write text into bubble
-        write = ImageDraw.Draw(bubble)
-        if "inverted" in states:
-            fill_type = "white"
-        else:
-            fill_type = "black"
-
-        for i, area in enumerate(self.writing_areas):
-            og_width = area['original_width']
-            og_height = area['original_height']
-
-            # Convert from percentage to actual values
-            px_width = (area['width']/100)*og_width
-            px_height = (area['height']/100)*og_height
-
-            og_x = ((area['x']/100)*og_width)
-            og_y = ((area['y']/100)*og_height)
-
-            # at = (og_x, og_y, og_x+px_width, og_y+px_height)
-            # write.rectangle(at, outline="black")
-
-            # Padded
-            x = og_x + 20
-            y = og_y + 20
-
-            # More padding
-            max_x = px_width - 20
-            max_y = px_height - 20
-
-            text = self.texts[i]['Japanese']
-            text = text+text+text+text+text
-            text_segments = [text]
-            size = font.getsize(text)
-
-            if self.text_orientation == "ttb":
-
-                # Setup vertical wrapping
-                avg_height = size[0]/len(text)
-
-                # Maximum chars in line
-                max_chars = int((px_height//avg_height))
-                if size[0] > px_height:
-                    # Using specialized wrapping library
-                    if max_chars > 1:
-                        text_segments = cjkwrap.wrap(text, width=max_chars)
-
-                text_max_w = len(text_segments)*size[1]
-
-                is_fit = False
-
-                # Horizontal wrapping
-                # Reduce font or remove words till text fits
-                while not is_fit:
-                    if text_max_w > px_width:
-                        if current_font_size > min_font_size:
-                            current_font_size -= 1
-                            font = ImageFont.truetype(self.font,
-                                                      current_font_size)
-                            size = font.getsize(text)
-                            avg_height = size[0]/len(text)
-                            max_chars = int((max_y//avg_height))
-                            if max_chars > 1:
-                                text_segments = cjkwrap.wrap(text,
-                                                             width=max_chars)
-
-                            text_max_w = len(text_segments)*size[1]
-                        else:
-                            text_segments.pop()
-                            text_max_w = len(text_segments)*size[1]
-                    else:
-                        is_fit = True
-
-            # if text left to right
-            else:
-                pass
-                # Setup horizontal wrapping
-                avg_width = size[0]/len(text)
-                max_chars = int((px_width//avg_width))
-                if size[0] > px_width:
-                    # Using specialized wrapping library
-                    if max_chars > 1:
-                        text_segments = cjkwrap.wrap(text, width=max_chars)
-
-                # Setup vertical wrapping
-                text_max_h = len(text_segments)*size[1]
-                is_fit = False
-                while not is_fit:
-                    if text_max_h > px_height:
-                        if current_font_size > min_font_size:
-                            current_font_size -= 1
-                            font = ImageFont.truetype(self.font,
-                                                      current_font_size)
-                            size = font.getsize(text)
-                            avg_width = size[0]/len(text)
-                            max_chars = int((px_width//avg_width))
-                            if max_chars > 1:
-                                text_segments = cjkwrap.wrap(text,
-                                                             width=max_chars)
-                            text_max_h = len(text_segments)*size[1]
-                        else:
-                            text_segments.pop()
-                            text_max_h = len(text_segments)*size[1]
-                    else:
-                        is_fit = True
-
-            # Center bubble x axis
-            cbx = og_x + (px_width/2)
-            cby = og_y + (px_height/2)
-
-            # Render text
-            for i, text in enumerate(text_segments):
-                if self.text_orientation == 'ttb':
-                    rx = ((cbx + text_max_w/2) -
-                          ((len(text_segments) - i)*size[1]))
-
-                    ry = y
-                else:
-                    seg_size = font.getsize(text)
-                    rx = cbx - seg_size[0]/2
-                    ry = ((cby + (len(text_segments)*size[1])/2) -
-                          ((len(text_segments) - i)*size[1]))
-
-                write.text((rx, ry),
-                           text,
-                           font=font,
-                           fill=fill_type,
-                           direction=self.text_orientation)
-
-        # reisize bubble
-        aspect_ratio = h/w
-        new_height = round(np.sqrt(self.resize_to/aspect_ratio))
-        new_width = round(new_height * aspect_ratio)
-        bubble = bubble.resize((new_width, new_height))
-        mask = mask.resize((new_width, new_height))
-
-        # Make sure bubble doesn't bleed the page
-        x1, y1 = self.location
-        x2 = x1 + bubble.size[0]
-        y2 = y1 + bubble.size[1]
-
-        if x2 > cfg.page_width:
-            x1 = x1 - (x2-cfg.page_width)
-        if y2 > cfg.page_height:
-            y1 = y1 - (y2-cfg.page_height)
-
-        self.location = (x1, y1)
-
-        # perform rotation if it was in transforms
-        # TODO: Fix issue of bad crops with rotation
-        if "rotate" in self.transforms:
-            rotation = self.transform_metadata['rotation_amount']
-            bubble = bubble.rotate(rotation)
-            mask = mask.rotate(rotation)
+        states, bubble, mask, self.location = draw_speech_bubble(
+                                                    self.dump_data())
 
         return states, bubble, mask, self.location
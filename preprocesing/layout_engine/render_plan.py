@@ -0,0 +1,348 @@
+import numpy as np
+from PIL import Image, ImageDraw, ImageOps
+
+from .helpers import paste_illustration_in_bbox
+from .caches import (
+                     get_illustration, get_stored_illustration, get_font,
+                     get_speech_bubble_template
+                     )
+from .text_layout import layout_bubble_text, layout_column
+from .metadata_serializers import load_bubble_texts
+from .. import config_file as cfg
+
+
+def get_polygon(panel):
+    """
+    Get the polygon a panel is drawn with from it's metadata
+    the same way Panel.get_polygon does
+
+    :param panel: The panel's metadata
+
+    :type panel: dict
+
+    :return: A list of [x, y] vertices of the polygon
+    :rtype: list
+    """
+    coords = [list(coord) for coord in panel['coordinates']]
+    if panel['non_rect']:
+        return coords
+
+    return coords[:4] + coords[:1]
+
+
+def get_bubble_op(bubble):
+    """
+    Get what's needed to draw a speech bubble from it's
+    metadata and lay out it's text if that wasn't done
+    when the page was created
+
+    :param bubble: The speech bubble's data as dumped
+    by SpeechBubble.dump_data
+
+    :type bubble: dict
+
+    :return: The template, font, transforms, text layout,
+    size and location of the bubble
+    :rtype: dict
+    """
+    text_layout = bubble.get('text_layout')
+    if text_layout is None:
+        # Metadata from before font sizes were saved
+        if bubble.get('font_size') is None:
+            bubble = dict(bubble, font_size=np.random.randint(
+                                                cfg.min_font_size,
+                                                cfg.max_font_size))
+
+        # Compact metadata's texts are only read when they're laid out
+        if bubble['texts'] is None:
+            bubble = dict(bubble)
+            load_bubble_texts([bubble], text_columns=[layout_column])
+        text_layout = layout_bubble_text(bubble)
+
+    return dict(
+        speech_bubble=bubble['speech_bubble'],
+        font=bubble['font'],
+        text_orientation=bubble['text_orientation'],
+        transforms=bubble['transforms'],
+        transform_metadata=bubble['transform_metadata'],
+        text_layout=text_layout,
+        resize_to=bubble['resize_to'],
+        location=list(bubble['location'])
+    )
+
+
+def get_render_plan(data):
+    """
+    Flatten a page's metadata into the leaf panels and speech
+    bubbles that are drawn in the order they're drawn without
+    building the tree of Panel objects
+
+    :param data: The page's metadata as dumped
+    by Page.dump_data_dict
+
+    :type data: dict
+
+    :return: The page's name, background, polygon and
+    illustration of each panel and speech bubbles
+    :rtype: dict
+    """
+    leaf_panels = []
+    if data['num_panels'] > 1:
+        # Depth first from the first child like get_leaf_panels
+        stack = list(reversed(data['children']))
+        while stack:
+            panel = stack.pop()
+            if len(panel['children']) > 0:
+                stack.extend(reversed(panel['children']))
+            else:
+                leaf_panels.append(panel)
+        bubble_panels = leaf_panels
+    else:
+        bubble_panels = [data]
+
+    return dict(
+        name=data['name'],
+        background=data['background'],
+        panels=[dict(polygon=get_polygon(panel), image=panel['image'])
+                for panel in leaf_panels],
+        speech_bubbles=[get_bubble_op(bubble)
+                        for panel in bubble_panels
+                        for bubble in panel['speech_bubbles']]
+    )
+
+
+def is_render_plan(data):
+    """
+    Check whether a page's metadata is it's render plan
+
+    :param data: The page's metadata
+
+    :type data: dict
+
+    :rtype: bool
+    """
+    return 'panels' in data and 'children' not in data
+
+
+def get_text_direction(text_orientation):
+    """
+    Get the direction text is drawn in by Pillow from a speech
+    bubble's text orientation. Left to right is the default so
+    it's drawn without a direction which would need libraqm.
+
+    :param text_orientation: "ltr" or "ttb"
+
+    :type text_orientation: str
+
+    :return: The direction or None for the default
+
+    :rtype: str
+    """
+    if text_orientation == "ltr":
+        return None
+
+    return text_orientation
+
+
+def draw_speech_bubble(bubble):
+    """
+    Draw a speech bubble with it's text
+
+    :param bubble: The speech bubble's draw op from
+    get_bubble_op or it's data as dumped by
+    SpeechBubble.dump_data
+
+    :type bubble: dict
+
+    :return: A list of states of the speech bubble,
+    the speech bubble itself, it's mask and it's location
+    on the page
+    :rtype: tuple
+    """
+
+    bubble_img = get_speech_bubble_template(bubble['speech_bubble']).copy()
+    mask = bubble_img.copy()
+
+    w, h = bubble_img.size
+
+    transforms = bubble['transforms']
+    transform_metadata = bubble['transform_metadata']
+
+    # States is used to indicate whether this bubble is
+    # inverted or not to the page render function
+    states = []
+
+    # Pre-rendering transforms
+    for transform in transforms:
+        if transform == "invert":
+            states.append("inverted")
+            bubble_img = ImageOps.invert(bubble_img)
+
+        elif transform == "flip vertical":
+            bubble_img = ImageOps.flip(bubble_img)
+            mask = ImageOps.flip(mask)
+            states.append("vflip")
+
+        elif transform == "flip horizontal":
+            bubble_img = ImageOps.mirror(bubble_img)
+            mask = ImageOps.mirror(mask)
+            states.append("hflip")
+
+        elif transform == "stretch x":
+
+            stretch_factor = transform_metadata['stretch_x_factor']
+            new_size = (round(w*(1+stretch_factor)), h)
+            # Reassign for resizing later
+            w, h = new_size
+            bubble_img = bubble_img.resize(new_size)
+            mask = mask.resize(new_size)
+            states.append("xstretch")
+
+        elif transform == "stretch y":
+            stretch_factor = transform_metadata['stretch_y_factor']
+            new_size = (w, round(h*(1+stretch_factor)))
+
+            # Reassign for resizing later
+            w, h = new_size
+            bubble_img = bubble_img.resize(new_size)
+            mask = mask.resize(new_size)
+            states.append("ystretch")
+
+    # Write text into bubble
+    write = ImageDraw.Draw(bubble_img)
+    if "inverted" in states:
+        fill_type = "white"
+    else:
+        fill_type = "black"
+
+    # Use the layout from the metadata if there is one
+    text_layout = bubble['text_layout']
+    if text_layout is None:
+        text_layout = layout_bubble_text(bubble)
+
+    direction = get_text_direction(bubble['text_orientation'])
+
+    for area_layout in text_layout:
+        font = get_font(bubble['font'], area_layout['font_size'])
+
+        # Render text
+        for rx, ry, text in area_layout['lines']:
+            write.text((rx, ry),
+                       text,
+                       font=font,
+                       fill=fill_type,
+                       direction=direction)
+
+    # reisize bubble
+    aspect_ratio = h/w
+    new_height = round(np.sqrt(bubble['resize_to']/aspect_ratio))
+    new_width = round(new_height * aspect_ratio)
+    bubble_img = bubble_img.resize((new_width, new_height))
+    mask = mask.resize((new_width, new_height))
+
+    # Make sure bubble doesn't bleed the page
+    x1, y1 = bubble['location']
+    x2 = x1 + bubble_img.size[0]
+    y2 = y1 + bubble_img.size[1]
+
+    if x2 > cfg.page_width:
+        x1 = x1 - (x2-cfg.page_width)
+    if y2 > cfg.page_height:
+        y1 = y1 - (y2-cfg.page_height)
+
+    # perform rotation if it was in transforms
+    # TODO: Fix issue of bad crops with rotation
+    if "rotate" in transforms:
+        rotation = transform_metadata['rotation_amount']
+        bubble_img = bubble_img.rotate(rotation)
+        mask = mask.rotate(rotation)
+
+    return states, bubble_img, mask, (x1, y1)
+
+
+def render_page_plan(plan):
+    """
+    Render a page to an image from it's render plan
+
+    :param plan: The page's render plan from get_render_plan
+    or Page.get_render_plan
+
+    :type plan: dict
+
+    :return: The page's image
+    :rtype: PIL.Image
+    """
+
+    W = cfg.page_width
+    H = cfg.page_height
+
+    # Create a new blank image
+    page_img = Image.new(size=(W, H), mode="L", color="white")
+    draw_rect = ImageDraw.Draw(page_img)
+
+    # Set background if needed
+    if plan['background'] is not None:
+        bg = get_illustration(plan['background'], (W, H))
+        page_img.paste(bg, (0, 0))
+
+    # Render panels
+    for panel in plan['panels']:
+
+        # Panel coords
+        rect = tuple(tuple(coord) for coord in panel['polygon'])
+        image = panel['image']
+
+        # Only composite within the panel's bounding box
+        if image is not None and cfg.panel_compositing == "bbox":
+            # Page sized stored illustrations are just cropped
+            # and ones stored at other sizes are resampled
+            img = get_stored_illustration(image)
+            if img is None:
+                img = get_illustration(image)
+
+        # Open the illustration to put within panel
+        elif image is not None:
+            # It's cleaned up by cropping the black areas and
+            # resized to the page's size as a simple
+            # way to crop differnt parts of it
+
+            # TODO: Figure out how to do different types of
+            # image crops for smaller panels
+            img = get_illustration(image, (W, H))
+
+            # Create a mask for the panel illustration
+            mask = Image.new("L", cfg.page_size, 0)
+            draw_mask = ImageDraw.Draw(mask)
+
+            # On the mask draw and therefore cut out the panel's
+            # area so that the illustration can be fit into
+            # the page itself
+            draw_mask.polygon(rect, fill=255)
+
+        # Draw outline
+        draw_rect.line(rect, fill="black", width=cfg.boundary_width)
+
+        # Paste illustration onto the page
+        if image is not None and cfg.panel_compositing == "bbox":
+            paste_illustration_in_bbox(page_img, img, rect)
+        elif image is not None:
+            page_img.paste(img, (0, 0), mask)
+
+    # Render bubbles
+    for bubble in plan['speech_bubbles']:
+        states, bubble_img, mask, location = draw_speech_bubble(bubble)
+        # Slightly shift mask so that you get outline for bubbles
+        new_mask_width = mask.size[0]+cfg.bubble_mask_x_increase
+        new_mask_height = mask.size[1]+cfg.bubble_mask_y_increase
+        bubble_mask = mask.resize((new_mask_width, new_mask_height))
+
+        w, h = bubble_img.size
+        crop_dims = (
+            5, 5,
+            5+w, 5+h,
+        )
+        # Uses a mask so that the "L" type bubble is cropped
+        bubble_mask = bubble_mask.crop(crop_dims)
+        page_img.paste(bubble_img, location, bubble_mask)
+
+    return page_img
@@ -0,0 +1,209 @@
+import os
+import hashlib
+import json
+import types
+import numpy as np
+import pandas as pd
+
+from .speech_bubble_catalog import SpeechBubbleCatalog
+from .text_sampler import TextSampler
+from .font_index import FontIndex
+from .. import config_file as cfg
+
+
+# Settings that only change how pages are rendered, written or
+# cached and not what's in them so changing them doesn't stop
+# pages being made again from their seeds
+render_only_settings = {
+    "output_format",
+    "image_encoder_options",
+    "image_writer_threads",
+    "image_writer_max_in_flight",
+    "boundary_width",
+    "panel_compositing",
+    "illustration_catalog_file",
+    "illustration_store_dir",
+    "illustration_store_size",
+    "illustration_store_shard_bytes",
+    "illustration_pack_dir",
+    "illustration_pack_shard_bytes",
+    "illustration_cache_max_items",
+    "illustration_cache_max_bytes",
+    "font_cache_max_fonts",
+    "font_cache_in_memory",
+    "font_file_cache_max_bytes",
+    "speech_bubble_cache_max_items",
+    "render_chunksize",
+    "render_fork_preload",
+    "metadata_format",
+    "metadata_compression",
+    "metadata_store_shard_bytes"
+}
+
+
+def get_config_fingerprint():
+    """
+    Hash the settings of the config that pages are made from
+
+    :return: The hash
+
+    :rtype: str
+    """
+    settings = ["%s=%r" % (name, value)
+                for name, value in sorted(vars(cfg).items())
+                if not name.startswith("_") and
+                name not in render_only_settings and
+                not isinstance(value, types.ModuleType)]
+
+    return hashlib.sha1("\n".join(settings).encode("utf-8")).hexdigest()
+
+
+# How many evenly spaced texts of the corpus are hashed
+fingerprint_texts = 1024
+
+
+def get_assets_fingerprint(assets):
+    """
+    Hash the assets that pages are made from. Only the length,
+    columns, size of it's file and some evenly spaced texts of the
+    text corpus are hashed since reading all of it would take as
+    long as making many pages.
+
+    :param assets: A tuple of the assets in the order
+    create_page_metadata takes them
+
+    :type assets: tuple
+
+    :return: The hash
+
+    :rtype: str
+    """
+    (image_dir, image_dir_path, font_files, text_dataset,
+     speech_bubble_files, speech_bubble_tags) = assets
+
+    sha1 = hashlib.sha1()
+
+    def update(value):
+        sha1.update(str(value).encode("utf-8"))
+        sha1.update(b"\0")
+
+    update(image_dir_path)
+    update("\n".join(image_dir))
+
+    update("\n".join(font_files[:]))
+    if isinstance(font_files, FontIndex):
+        sha1.update(font_files.chars.tobytes())
+        sha1.update(font_files.bits.tobytes())
+
+    update(len(text_dataset))
+    indices = np.unique(np.linspace(0, len(text_dataset) - 1,
+                                    min(len(text_dataset),
+                                        fingerprint_texts),
+                                    dtype=np.int64))
+    if isinstance(text_dataset, TextSampler):
+        update(text_dataset.column_names)
+        update(json.dumps(text_dataset.get_texts(indices)))
+        if text_dataset.corpus_file is not None:
+            update(os.path.getsize(text_dataset.corpus_file))
+    else:
+        update(list(text_dataset.columns))
+        update(json.dumps(text_dataset.iloc[indices].to_dict("records")))
+
+    update("\n".join(speech_bubble_files))
+    if isinstance(speech_bubble_tags, SpeechBubbleCatalog):
+        update("\n".join(speech_bubble_tags.files))
+        update(json.dumps(speech_bubble_tags.writing_areas))
+    elif isinstance(speech_bubble_tags, pd.DataFrame):
+        update("\n".join(speech_bubble_tags['imagename']))
+        update("\n".join(speech_bubble_tags['label']))
+
+    return sha1.hexdigest()
+
+
+def get_fingerprint(assets):
+    """
+    Hash everything a page depends on other than it's seed
+
+    :param assets: A tuple of the assets in the order
+    create_page_metadata takes them
+
+    :type assets: tuple
+
+    :return: The hash of the config and assets
+
+    :rtype: str
+    """
+    return get_config_fingerprint() + "-" + get_assets_fingerprint(assets)
+
+
+def make_seed_record(name, seed, page_idx, fingerprint):
+    """
+    Make the metadata of a page that's made again from
+    it's seed when it's rendered
+
+    :param name: Name of the page
+
+    :type name: str
+
+    :param seed: Seed of the run the page is from
+
+    :type seed: int
+
+    :param page_idx: Index of the page in the run
+
+    :type page_idx: int
+
+    :param fingerprint: Hash of the config and assets
+    the page was made from
+
+    :type fingerprint: str
+
+    :return: The page's metadata
+
+    :rtype: dict
+    """
+    return dict(name=name,
+                seed=int(seed),
+                page_idx=int(page_idx),
+                fingerprint=fingerprint)
+
+
+def is_seed_record(data):
+    """
+    Check whether a page's metadata is only it's seed
+
+    :param data: The page's metadata
+
+    :type data: dict
+
+    :rtype: bool
+    """
+    return 'seed' in data and 'children' not in data
+
+
+def check_fingerprint(data, fingerprint):
+    """
+    Make sure a page is made again from the same
+    config and assets it was first made from
+
+    :param data: The page's seed metadata
+
+    :type data: dict
+
+    :param fingerprint: Hash of the config and assets
+    that are loaded
+
+    :type fingerprint: str
+    """
+    if data['fingerprint'] == fingerprint:
+        return
+
+    config_hash = data['fingerprint'].split("-")[0]
+    if config_hash != fingerprint.split("-")[0]:
+        changed = "config"
+    else:
+        changed = "assets"
+
+    raise ValueError("Page " + data['name'] + " can't be made from it's " +
+                     "seed since the " + changed + " changed after it " +
+                     "was created")
@@ -0,0 +1,237 @@
+import os
+import json
+import pickle
+import numpy as np
+from PIL import Image
+
+
+class SpeechBubbleCatalog(object):
+    """
+    A class that indexes the speech bubble templates so that
+    picking one and getting it's writing areas and size
+    doesn't need a scan of the writing area labels or any I/O
+
+    :param files: Paths of the speech bubble templates
+
+    :type files: list
+
+    :param writing_areas: The writing areas of each template
+
+    :type writing_areas: list
+
+    :param sizes: Width and height of each template
+
+    :type sizes: list
+    """
+
+    # Bump when the cached format changes
+    version = 1
+
+    def __init__(self, files, writing_areas, sizes):
+        """
+        Constructor method
+        """
+
+        self.files = list(files)
+        self.writing_areas = writing_areas
+        self.sizes = [tuple(size) for size in sizes]
+
+        # Writing areas as x, y, width and height in pixels
+        self.pixel_areas = []
+        for areas in self.writing_areas:
+            pixel_areas = []
+            for area in areas:
+                og_width = area['original_width']
+                og_height = area['original_height']
+                pixel_areas.append((
+                    (area['x']/100)*og_width,
+                    (area['y']/100)*og_height,
+                    (area['width']/100)*og_width,
+                    (area['height']/100)*og_height
+                ))
+            self.pixel_areas.append(pixel_areas)
+
+        self.index = {path: idx for idx, path in enumerate(self.files)}
+
+    def __len__(self):
+        return len(self.files)
+
+    @classmethod
+    def build(cls, speech_bubble_files, speech_bubble_tags):
+        """
+        Build the catalog from the template files and their labels
+
+        :param speech_bubble_files: list of base speech bubble
+        template files
+
+        :type speech_bubble_files: list
+
+        :param speech_bubble_tags: The writing area labels by filename
+
+        :type speech_bubble_tags: pandas.DataFrame
+
+        :return: The catalog
+
+        :rtype: SpeechBubbleCatalog
+        """
+        labels = dict(zip(speech_bubble_tags['imagename'],
+                          speech_bubble_tags['label']))
+
+        files = []
+        writing_areas = []
+        sizes = []
+        for path in speech_bubble_files:
+            if path not in labels:
+                print("No writing areas for speech bubble:", path)
+                continue
+
+            with Image.open(path) as img:
+                size = img.size
+
+            files.append(path)
+            writing_areas.append(json.loads(labels[path]))
+            sizes.append(size)
+
+        return cls(files, writing_areas, sizes)
+
+    def get(self, idx):
+        """
+        Get a template's path, writing areas and size
+
+        :param idx: Index of the template
+
+        :type idx: int
+
+        :return: A tuple of the template's path, a copy of it's
+        writing areas that can be changed and it's width and height
+
+        :rtype: tuple
+        """
+        writing_areas = [dict(area) for area in self.writing_areas[idx]]
+        return self.files[idx], writing_areas, self.sizes[idx]
+
+    def sample(self):
+        """
+        Pick a random template
+
+        :return: A tuple of the template's path, a copy of it's
+        writing areas that can be changed and it's width and height
+
+        :rtype: tuple
+        """
+        idx = np.random.randint(0, len(self.files))
+        return self.get(idx)
+
+    def to_dict(self):
+        """
+        Get the catalog's data so that it can be stored
+
+        :return: A dictionary of the catalog's version,
+        templates, writing areas and sizes
+
+        :rtype: dict
+        """
+        return dict(
+            version=self.version,
+            files=self.files,
+            writing_areas=self.writing_areas,
+            sizes=self.sizes
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Make a catalog from it's stored data
+
+        :param data: Data from to_dict
+
+        :type data: dict
+
+        :return: The catalog or None if the data is
+        from a different version
+
+        :rtype: SpeechBubbleCatalog
+        """
+        if data.get('version') != cls.version:
+            return None
+
+        return cls(data['files'], data['writing_areas'], data['sizes'])
+
+    def save(self, filename):
+        """
+        Write the catalog to a cache file
+
+        :param filename: Path of the cache file
+
+        :type filename: str
+        """
+        with open(filename, "wb") as catalog_file:
+            pickle.dump(self.to_dict(), catalog_file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Read a catalog from a cache file
+
+        :param filename: Path of the cache file
+
+        :type filename: str
+
+        :return: The catalog or None if the cache is
+        from a different version
+
+        :rtype: SpeechBubbleCatalog
+        """
+        with open(filename, "rb") as catalog_file:
+            data = pickle.load(catalog_file)
+
+        return cls.from_dict(data)
+
+
+def load_speech_bubble_catalog(speech_bubble_files,
+                               speech_bubble_tags,
+                               labels_file,
+                               catalog_file):
+    """
+    Load the speech bubble catalog from it's cache file or
+    build it and cache it if the cache is missing or older
+    than the labels or templates
+
+    :param speech_bubble_files: list of base speech bubble
+    template files
+
+    :type speech_bubble_files: list
+
+    :param speech_bubble_tags: The writing area labels by filename
+
+    :type speech_bubble_tags: pandas.DataFrame
+
+    :param labels_file: Path of the writing area labels CSV
+
+    :type labels_file: str
+
+    :param catalog_file: Path of the cache file
+
+    :type catalog_file: str
+
+    :return: The catalog
+
+    :rtype: SpeechBubbleCatalog
+    """
+    sources = [labels_file] + [os.path.dirname(path)
+                               for path in speech_bubble_files[:1]]
+
+    if os.path.isfile(catalog_file):
+        cache_mtime = os.path.getmtime(catalog_file)
+        if all(os.path.getmtime(path) <= cache_mtime for path in sources):
+            catalog = SpeechBubbleCatalog.load(catalog_file)
+            if catalog is not None and \
+                    sorted(catalog.files) == sorted(speech_bubble_files):
+                return catalog
+
+    catalog = SpeechBubbleCatalog.build(speech_bubble_files,
+                                        speech_bubble_tags)
+    catalog.save(catalog_file)
+
+    return catalog
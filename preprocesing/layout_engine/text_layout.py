@@ -0,0 +1,329 @@
+import numpy as np
+
+from .caches import LRUCache, get_font
+from .. import config_file as cfg
+
+
+# Measured advances of characters by font path and size
+glyph_advance_cache = LRUCache(cfg.font_cache_max_fonts)
+
+# Column of the text corpus that bubbles' texts are laid out from
+layout_column = "Japanese"
+
+
+def get_char_advances(font_path, font_size, text):
+    """
+    Get how far each character of a text moves the pen
+    along a line when written with a font
+
+    :param font_path: Path to the font file
+
+    :type font_path: str
+
+    :param font_size: Font size
+
+    :type font_size: int
+
+    :param text: Text to measure
+
+    :type text: str
+
+    :return: Advance of each character in pixels
+
+    :rtype: numpy.ndarray
+    """
+    font_size = int(font_size)
+    advances = glyph_advance_cache.get((font_path, font_size), dict)
+
+    font = None
+    text_advances = np.empty(len(text))
+    for idx, char in enumerate(text):
+        if char not in advances:
+            if font is None:
+                font = get_font(font_path, font_size)
+            advances[char] = font.getlength(char)
+        text_advances[idx] = advances[char]
+
+    return text_advances
+
+
+def get_line_height(font_path, font_size):
+    """
+    Get the thickness of a line of text written with a font
+
+    :param font_path: Path to the font file
+
+    :type font_path: str
+
+    :param font_size: Font size
+
+    :type font_size: int
+
+    :return: Height of a line in pixels
+
+    :rtype: int
+    """
+    ascent, descent = get_font(font_path, font_size).getmetrics()
+    return ascent + descent
+
+
+def break_lines(advances, max_length):
+    """
+    Break a text into lines no longer than a maximum
+    length using the advances of it's characters
+
+    :param advances: Advance of each character of the text
+
+    :type advances: numpy.ndarray
+
+    :param max_length: Maximum length of a line in pixels
+
+    :type max_length: float
+
+    :return: A list of start and end indices of each line
+
+    :rtype: list
+    """
+    ends = np.cumsum(advances)
+    lines = []
+    start = 0
+    while start < len(advances):
+        line_start = 0.0
+        if start > 0:
+            line_start = ends[start - 1]
+
+        # Last character that still fits but
+        # each line has at least one character
+        end = int(np.searchsorted(ends, line_start + max_length,
+                                  side="right"))
+        end = max(end, start + 1)
+        lines.append((start, end))
+        start = end
+
+    return lines
+
+
+def fit_text(font_path,
+             font_size,
+             text,
+             line_length,
+             lines_extent,
+             min_font_size=None):
+    """
+    Fit a text into a writing area by finding the largest font size
+    no bigger than the given one for which the wrapped lines fit.
+    If the text doesn't fit at the minimum font size it's truncated
+    to the lines that do fit.
+
+    :param font_path: Path to the font file
+
+    :type font_path: str
+
+    :param font_size: Largest font size to use
+
+    :type font_size: int
+
+    :param text: Text to fit
+
+    :type text: str
+
+    :param line_length: Length available along a line i.e. the height
+    for top to bottom text and width for left to right
+
+    :type line_length: float
+
+    :param lines_extent: Length available to stack lines i.e.
+    the width for top to bottom text and height for left to right
+
+    :type lines_extent: float
+
+    :param min_font_size: Smallest font size to use, defaults to
+    the config's minimum font size
+
+    :type min_font_size: int, optional
+
+    :return: A tuple of the font size, text segments and line height
+
+    :rtype: tuple
+    """
+    if min_font_size is None:
+        min_font_size = cfg.min_font_size
+
+    font_size = int(font_size)
+    min_font_size = min(int(min_font_size), font_size)
+
+    def layout(size):
+        advances = get_char_advances(font_path, size, text)
+        lines = break_lines(advances, line_length)
+        return lines, get_line_height(font_path, size)
+
+    # Binary search for the largest font size that fits
+    best = None
+    low, high = min_font_size, font_size
+    while low <= high:
+        size = (low + high)//2
+        lines, line_height = layout(size)
+        if len(lines)*line_height <= lines_extent:
+            best = (size, lines, line_height)
+            low = size + 1
+        else:
+            high = size - 1
+
+    # Otherwise keep as many lines as fit at the smallest size
+    if best is None:
+        lines, line_height = layout(min_font_size)
+        num_lines = max(int(lines_extent//line_height), 0)
+        best = (min_font_size, lines[:num_lines], line_height)
+
+    size, lines, line_height = best
+    segments = [text[start:end] for start, end in lines]
+
+    return size, segments, line_height
+
+
+def transform_writing_areas(bubble):
+    """
+    Apply a speech bubble's flips and stretches to it's writing
+    areas so that they line up with the transformed bubble
+
+    :param bubble: The speech bubble's data as dumped
+    by SpeechBubble.dump_data
+
+    :type bubble: dict
+
+    :return: Transformed copies of the writing areas
+    :rtype: list
+    """
+
+    # Center of bubble
+    w, h = bubble['width'], bubble['height']
+    cx, cy = w/2, h/2
+
+    transform_metadata = bubble['transform_metadata']
+    writing_areas = [dict(area) for area in bubble['writing_areas']]
+    for transform in bubble['transforms']:
+        if transform == "flip vertical":
+            for area in writing_areas:
+                og_height = area['original_height']
+
+                # Convert from percentage to actual values
+                px_height = (area['height']/100)*og_height
+
+                og_y = ((area['y']/100)*og_height)
+                cydist = abs(cy - og_y)
+                new_y = (2*cydist + og_y) - px_height
+                new_y = (new_y/og_height)*100
+                area['y'] = new_y
+
+        elif transform == "flip horizontal":
+            for area in writing_areas:
+                og_width = area['original_width']
+
+                # Convert from percentage to actual values
+                px_width = (area['width']/100)*og_width
+
+                og_x = ((area['x']/100)*og_width)
+                cxdist = abs(cx - og_x)
+                new_x = (2*cxdist + og_x) - px_width
+                new_x = (new_x/og_width)*100
+                area['x'] = new_x
+
+        elif transform == "stretch x":
+            stretch_factor = transform_metadata['stretch_x_factor']
+            for area in writing_areas:
+                og_width = area['original_width']
+                area['original_width'] = og_width*(1+stretch_factor)
+
+        elif transform == "stretch y":
+            stretch_factor = transform_metadata['stretch_y_factor']
+            for area in writing_areas:
+                og_height = area['original_height']
+                area['original_height'] = og_height*(1+stretch_factor)
+
+    return writing_areas
+
+
+def layout_bubble_text(bubble):
+    """
+    Fit the text of each of a speech bubble's writing areas
+    and work out where each of it's lines is drawn on the bubble
+
+    :param bubble: The speech bubble's data as dumped
+    by SpeechBubble.dump_data
+
+    :type bubble: dict
+
+    :return: A list with the font size and a list of
+    [x, y, text] lines for each writing area
+    :rtype: list
+    """
+
+    font_path = bubble['font']
+    text_orientation = bubble['text_orientation']
+
+    text_layout = []
+    for i, area in enumerate(transform_writing_areas(bubble)):
+        og_width = area['original_width']
+        og_height = area['original_height']
+
+        # Convert from percentage to actual values
+        px_width = (area['width']/100)*og_width
+        px_height = (area['height']/100)*og_height
+
+        og_x = ((area['x']/100)*og_width)
+        og_y = ((area['y']/100)*og_height)
+
+        # Padded
+        y = og_y + 20
+
+        # More padding
+        max_y = px_height - 20
+
+        text = bubble['texts'][i][layout_column]
+        text = text+text+text+text+text
+
+        # Shrink the font and then truncate the text till it fits
+        if text_orientation == "ttb":
+            font_size, text_segments, line_height = fit_text(
+                                                font_path,
+                                                bubble['font_size'],
+                                                text,
+                                                max_y,
+                                                px_width
+                                                )
+        # if text left to right
+        else:
+            font_size, text_segments, line_height = fit_text(
+                                                font_path,
+                                                bubble['font_size'],
+                                                text,
+                                                px_width,
+                                                px_height
+                                                )
+
+        text_max_w = len(text_segments)*line_height
+
+        # Center bubble x axis
+        cbx = og_x + (px_width/2)
+        cby = og_y + (px_height/2)
+
+        lines = []
+        for j, segment in enumerate(text_segments):
+            if text_orientation == 'ttb':
+                rx = ((cbx + text_max_w/2) -
+                      ((len(text_segments) - j)*line_height))
+
+                ry = y
+            else:
+                seg_width = get_char_advances(font_path,
+                                              font_size,
+                                              segment).sum()
+                rx = cbx - seg_width/2
+                ry = ((cby + (len(text_segments)*line_height)/2) -
+                      ((len(text_segments) - j)*line_height))
+
+            lines.append([float(rx), float(ry), segment])
+
+        text_layout.append(dict(font_size=font_size, lines=lines))
+
+    return text_layout
@@ -0,0 +1,375 @@
+import bisect
+import os
+from codecs import utf_8_decode
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class TextSampler(object):
+    """
+    A class that picks random texts from the text corpus
+    and reads them from contiguous Arrow string columns
+    instead of a row at a time from a DataFrame
+
+    :param columns: Arrow string arrays of the corpus by column name.
+    If no columns are given the sampler only picks indices
+
+    :type columns: dict
+
+    :param num_texts: Number of texts in the corpus, defaults to
+    None i.e. the length of the columns
+
+    :type num_texts: int, optional
+
+    :param corpus_file: Arrow file the columns are memory
+    mapped from, defaults to None
+
+    :type corpus_file: str, optional
+    """
+
+    def __init__(self, columns, num_texts=None, corpus_file=None):
+        """
+        Constructor method
+        """
+
+        self.columns = columns
+        self.column_names = list(columns)
+
+        # Texts are read straight from the chunks of each column
+        self.column_chunks = {name: get_text_chunks(column)
+                              for name, column in columns.items()}
+
+        if num_texts is None:
+            num_texts = len(columns[self.column_names[0]])
+        self.num_texts = num_texts
+
+        # Arrow file the columns are memory mapped from if any
+        self.corpus_file = corpus_file
+
+    def __len__(self):
+        return self.num_texts
+
+    def __getstate__(self):
+        # Memory mapped samplers are sent to workers as their
+        # file so that each worker maps the same pages
+        # instead of getting it's own copy of the corpus
+        if self.corpus_file is not None:
+            return dict(corpus_file=self.corpus_file,
+                        column_names=self.column_names)
+        return dict(columns=self.columns, num_texts=self.num_texts)
+
+    def __setstate__(self, state):
+        if 'columns' in state:
+            self.__init__(state['columns'], state['num_texts'])
+            return
+
+        sampler = load_text_corpus(state['corpus_file'],
+                                   state['column_names'])
+        self.__dict__.update(sampler.__dict__)
+
+    @classmethod
+    def from_table(cls, table, columns=None, corpus_file=None):
+        """
+        Make a sampler from an Arrow table of the corpus
+
+        :param table: The text corpus
+
+        :type table: pyarrow.Table
+
+        :param columns: Names of the columns to read texts from,
+        defaults to None i.e. all of them
+
+        :type columns: list, optional
+
+        :param corpus_file: Arrow file the table is memory
+        mapped from, defaults to None
+
+        :type corpus_file: str, optional
+
+        :return: The sampler
+
+        :rtype: TextSampler
+        """
+        if columns is None:
+            columns = table.column_names
+
+        return cls({name: table.column(name) for name in columns},
+                   num_texts=table.num_rows,
+                   corpus_file=corpus_file)
+
+    @classmethod
+    def from_dataframe(cls, text_dataset, columns=None):
+        """
+        Make a sampler from a DataFrame of the corpus
+
+        :param text_dataset: The text corpus
+
+        :type text_dataset: pandas.DataFrame
+
+        :param columns: Names of the columns to read texts from,
+        defaults to None i.e. all of them
+
+        :type columns: list, optional
+
+        :return: The sampler
+
+        :rtype: TextSampler
+        """
+        if columns is None:
+            columns = list(text_dataset.columns)
+
+        return cls({name: pa.array(text_dataset[name], type=pa.string())
+                    for name in columns},
+                   num_texts=len(text_dataset))
+
+    def sample_indices(self, num_texts):
+        """
+        Pick the indices of random texts
+
+        :param num_texts: How many texts to pick
+
+        :type num_texts: int
+
+        :return: Indices of the texts
+
+        :rtype: numpy.ndarray
+        """
+        return np.random.randint(0, self.num_texts, size=num_texts)
+
+    def get_column_texts(self, name, indices):
+        """
+        Read the texts of one column of the corpus
+
+        :param name: Name of the column
+
+        :type name: str
+
+        :param indices: Indices of the texts
+
+        :type indices: numpy.ndarray
+
+        :return: The texts
+
+        :rtype: list
+        """
+        # Taking a few texts from a column is mostly overhead and
+        # a column of many chunks gets concatenated so each text
+        # is sliced out of the chunk it's in instead
+        chunk_starts, chunks = self.column_chunks[name]
+        indices = np.asarray(indices).tolist()
+
+        if len(chunks) == 1 and chunks[0][1] is not None:
+            _, offsets, data = chunks[0]
+            return [utf_8_decode(data[offsets[idx]:offsets[idx + 1]])[0]
+                    for idx in indices]
+
+        texts = []
+        for idx in indices:
+            chunk_id = 0
+            if len(chunks) > 1:
+                chunk_id = bisect.bisect_right(chunk_starts, idx) - 1
+            chunk, offsets, data = chunks[chunk_id]
+            idx -= chunk_starts[chunk_id]
+
+            if offsets is None:
+                texts.append(chunk[idx].as_py())
+            else:
+                texts.append(
+                    utf_8_decode(data[offsets[idx]:offsets[idx + 1]])[0])
+        return texts
+
+    def get_texts(self, indices, columns=None):
+        """
+        Read texts from the corpus
+
+        :param indices: Indices of the texts
+
+        :type indices: numpy.ndarray
+
+        :param columns: Names of the columns to read,
+        defaults to None i.e. all of them
+
+        :type columns: list, optional
+
+        :return: A dictionary of each text's columns per index
+
+        :rtype: list
+        """
+        if columns is None:
+            columns = self.column_names
+
+        if len(columns) == 0:
+            return [{} for idx in indices]
+
+        values = [self.get_column_texts(name, indices) for name in columns]
+
+        return [dict(zip(columns, row)) for row in zip(*values)]
+
+    def sample(self, num_texts):
+        """
+        Pick random texts
+
+        :param num_texts: How many texts to pick
+
+        :type num_texts: int
+
+        :return: A tuple of the texts' indices and their columns
+
+        :rtype: tuple
+        """
+        indices = self.sample_indices(num_texts)
+        return indices.tolist(), self.get_texts(indices)
+
+
+def get_text_chunks(column):
+    """
+    Get the chunks of a column of the corpus with the offsets and
+    data of their strings so that texts are sliced out of them
+
+    :param column: The column
+
+    :type column: pyarrow.Array or pyarrow.ChunkedArray
+
+    :return: Where each chunk starts and a tuple of each chunk
+    and it's offsets and data or None if it has missing texts or
+    isn't strings
+
+    :rtype: tuple
+    """
+    if isinstance(column, pa.ChunkedArray):
+        chunks = column.chunks
+    else:
+        chunks = [column]
+
+    chunk_starts = np.cumsum([0] + [len(chunk) for chunk
+                                    in chunks]).tolist()
+
+    text_chunks = []
+    for chunk in chunks:
+        offsets = data = None
+        is_string = pa.types.is_string(chunk.type)
+        is_large_string = pa.types.is_large_string(chunk.type)
+
+        if (is_string or is_large_string) and chunk.null_count == 0:
+            offset_type, offset_size = ("q", 8) if is_large_string \
+                else ("i", 4)
+            num_offsets = chunk.offset + len(chunk) + 1
+
+            _, offset_buffer, data_buffer = chunk.buffers()
+            offsets = memoryview(offset_buffer)[:num_offsets*offset_size]
+            offsets = offsets.cast(offset_type)[chunk.offset:]
+            data = memoryview(b"" if data_buffer is None else data_buffer)
+        text_chunks.append((chunk, offsets, data))
+
+    return chunk_starts, text_chunks
+
+
+def get_parquet_files(text_dataset_path):
+    """
+    List the Parquet files of the text corpus in the order
+    they're read in
+
+    :param text_dataset_path: Path of the text corpus parquet
+    files or of a single Parquet file
+
+    :type text_dataset_path: str
+
+    :return: Paths of the files
+
+    :rtype: list
+    """
+    if not os.path.isdir(text_dataset_path):
+        return [text_dataset_path]
+
+    # Metadata and hidden files are left out like pyarrow does
+    return [os.path.join(text_dataset_path, filename)
+            for filename in sorted(os.listdir(text_dataset_path))
+            if not filename.startswith(("_", "."))]
+
+
+def convert_corpus_to_arrow(text_dataset_path, corpus_file,
+                            batch_size=65536):
+    """
+    Write the text corpus' Parquet files as a single uncompressed
+    Arrow file that can be memory mapped. The files are read a
+    batch of rows at a time so the whole corpus is never in memory.
+
+    :param text_dataset_path: Path of the text corpus parquet files
+
+    :type text_dataset_path: str
+
+    :param corpus_file: Path of the Arrow file to write
+
+    :type corpus_file: str
+
+    :param batch_size: Most rows read at once, defaults to 65536
+
+    :type batch_size: int, optional
+    """
+    parquet_files = get_parquet_files(text_dataset_path)
+
+    # Leave out index columns written by dask or pandas
+    schema = pq.ParquetFile(parquet_files[0]).schema_arrow
+    names = [name for name in schema.names if not name.startswith("__")]
+    schema = pa.schema([schema.field(name) for name in names])
+
+    # Write it under another name first so that other processes
+    # never map a half written file and an interrupted
+    # conversion is never taken for a finished one
+    tmp_file = corpus_file + ".tmp%d" % os.getpid()
+    try:
+        with pa.OSFile(tmp_file, "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                for filename in parquet_files:
+                    parquet_file = pq.ParquetFile(filename)
+                    for batch in parquet_file.iter_batches(
+                            batch_size=batch_size, columns=names):
+                        writer.write_batch(pa.RecordBatch.from_arrays(
+                            [batch.column(name) for name in names],
+                            schema=schema))
+    except BaseException:
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+    os.replace(tmp_file, corpus_file)
+
+
+def load_text_corpus(text_dataset_path, columns=None):
+    """
+    Memory map the text corpus and make a sampler from it.
+    The corpus is converted to an Arrow file next to the
+    Parquet files the first time or if they've changed.
+    Only the pages of the columns that are read are loaded and
+    they're shared by all processes through the OS page cache.
+
+    :param text_dataset_path: Path of the text corpus parquet files
+    or of an Arrow file of it
+
+    :type text_dataset_path: str
+
+    :param columns: Names of the columns to read texts from,
+    defaults to None i.e. all of them
+
+    :type columns: list, optional
+
+    :return: The sampler
+
+    :rtype: TextSampler
+    """
+    if text_dataset_path.endswith(".arrow"):
+        corpus_file = text_dataset_path
+    else:
+        corpus_file = text_dataset_path.rstrip("/") + ".arrow"
+
+        if (not os.path.isfile(corpus_file) or
+                os.path.getmtime(corpus_file) <
+                os.path.getmtime(text_dataset_path)):
+            print("Converting text corpus to Arrow:", corpus_file)
+            convert_corpus_to_arrow(text_dataset_path, corpus_file)
+
+    source = pa.memory_map(corpus_file, "r")
+    table = pa.ipc.open_file(source).read_all()
+
+    return TextSampler.from_table(table, columns, corpus_file=corpus_file)
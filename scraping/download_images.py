@@ -2,9 +2,14 @@ import os
 import json
 
 
-def download_db_illustrations():
+def download_db_illustrations(unzip=True):
     """
     Downloads the Tagged Anime Illustrations Kaggle dataset
+
+    :param unzip: Whether to extract the archive, defaults to True.
+    The images can be converted straight from the archive instead
+
+    :type unzip: bool, optional
     """
 
     kaggle_json = "config/kaggle.json"
@@ -28,6 +33,10 @@ def download_db_illustrations():
                                    unzip=False
                                    )
 
+    if not unzip:
+        print("Finished downloading")
+        return
+
     print("Finished downloading now unzipping")
     output_dir = "datasets/image_dataset/tagged-anime-illustrations/"
 
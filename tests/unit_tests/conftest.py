@@ -0,0 +1,118 @@
+import pytest
+import json
+import numpy as np
+import pandas as pd
+from PIL import Image
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+
+def make_test_font(path, chars):
+    """
+    Build a small TrueType font where every character
+    is a box so that fonts can be loaded and measured
+    without the font dataset
+
+    :param path: Where to save the font
+
+    :type path: str
+
+    :param chars: Characters the font should have glyphs for
+
+    :type chars: str
+    """
+    glyph_names = [".notdef"] + ["uni%04X" % ord(char) for char in chars]
+
+    fb = FontBuilder(1000, isTTF=True)
+    fb.setupGlyphOrder(glyph_names)
+    fb.setupCharacterMap({ord(char): "uni%04X" % ord(char)
+                          for char in chars})
+
+    glyphs = {}
+    for name in glyph_names:
+        pen = TTGlyphPen(None)
+        pen.moveTo((100, 0))
+        pen.lineTo((100, 800))
+        pen.lineTo((900, 800))
+        pen.lineTo((900, 0))
+        pen.closePath()
+        glyphs[name] = pen.glyph()
+
+    fb.setupGlyf(glyphs)
+    fb.setupHorizontalMetrics({name: (1000, 100) for name in glyph_names})
+    fb.setupHorizontalHeader(ascent=880, descent=-120)
+    fb.setupNameTable({"familyName": "Test", "styleName": "Regular"})
+    fb.setupOS2(sTypoAscender=880, sTypoDescender=-120,
+                usWinAscent=880, usWinDescent=120)
+    fb.setupPost()
+    fb.save(path)
+
+
+@pytest.fixture(scope="session")
+def font_file(tmp_path_factory):
+    """
+    A font file covering some Japanese and latin characters
+
+    :return: Path to the font file
+
+    :rtype: str
+    """
+    path = str(tmp_path_factory.mktemp("fonts") / "test_font.ttf")
+    make_test_font(path, "あいうえおかきくけこ日本語 abc")
+
+    return path
+
+
+@pytest.fixture(scope="session")
+def page_assets(tmp_path_factory, font_file):
+    """
+    A small set of illustrations, texts, speech bubbles and fonts
+    that pages can be created and rendered from without the datasets
+
+    :return: A tuple of the assets in the order
+    create_page_metadata takes them
+
+    :rtype: tuple
+    """
+    assets_dir = tmp_path_factory.mktemp("assets")
+
+    image_dir_path = str(assets_dir) + "/images/"
+    (assets_dir / "images").mkdir()
+    image_dir = []
+    for i in range(3):
+        img_array = np.full((120, 90), 60*(i + 1), dtype=np.uint8)
+        filename = "illustration_%d.png" % i
+        Image.fromarray(img_array).save(image_dir_path + filename)
+        image_dir.append(filename)
+
+    text_dataset = pd.DataFrame({
+        "English": ["Hello", "Good morning", "Thank you", "Yes"],
+        "Japanese": ["こんにちは", "おはよう", "ありがとう", "はい"]
+    })
+
+    (assets_dir / "files").mkdir()
+    speech_bubble_files = []
+    labels = []
+    for i, size in enumerate([(200, 150), (160, 220)]):
+        path = str(assets_dir / "files" / ("bubble_%d.png" % i))
+        Image.new("L", size, 255).save(path)
+        speech_bubble_files.append(path)
+
+        writing_areas = [
+            dict(x=20.0, y=20.0, width=60.0, height=60.0,
+                 original_width=size[0], original_height=size[1])
+        ]
+        labels.append(json.dumps(writing_areas))
+
+    speech_bubble_tags = pd.DataFrame({
+        "imagename": speech_bubble_files,
+        "label": labels
+    })
+
+    return (image_dir,
+            image_dir_path,
+            [font_file],
+            text_dataset,
+            speech_bubble_files,
+            speech_bubble_tags
+            )
@@ -0,0 +1,229 @@
+import pytest
+import os
+import time
+import pickle
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.assets import (
+    build_manifest, load_manifest, load_assets, load_render_assets
+)
+from preprocesing.layout_engine.speech_bubble_catalog import (
+    SpeechBubbleCatalog
+)
+from preprocesing.layout_engine.text_sampler import TextSampler
+from preprocesing.layout_engine.illustration_catalog import (
+    IllustrationCatalog
+)
+
+
+@pytest.fixture
+def dataset_paths(page_assets, tmp_path):
+    """
+    The page assets laid out like the datasets folder
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to lay the datasets out in
+
+    :type tmp_path: pathlib.Path
+
+    :return: A dictionary of the paths load_assets takes
+
+    :rtype: dict
+    """
+    (image_dir, image_dir_path, font_files, text_dataset,
+     speech_bubble_files, speech_bubble_tags) = page_assets
+
+    (tmp_path / "text_dataset").mkdir()
+    text_dataset_path = str(tmp_path / "text_dataset" / "jesc_dialogues")
+    text_dataset.to_parquet(text_dataset_path)
+
+    # The templates are copied so that the folder can be changed
+    speech_bubbles_path = str(tmp_path / "speech_bubbles_dataset") + "/"
+    os.makedirs(speech_bubbles_path + "files/")
+    speech_bubble_tags = speech_bubble_tags.copy()
+    for idx, path in enumerate(speech_bubble_files):
+        new_path = speech_bubbles_path + "files/" + os.path.basename(path)
+        with open(path, "rb") as src, open(new_path, "wb") as dst:
+            dst.write(src.read())
+        # Written the way kaggle breaks them
+        speech_bubble_tags.loc[idx, 'imagename'] = new_path.replace("-", "~")
+    speech_bubble_tags.to_csv(speech_bubbles_path +
+                              "writing_area_labels.csv", index=False)
+
+    font_files_path = str(tmp_path / "font_dataset") + "/"
+    os.makedirs(font_files_path)
+    with open(font_files_path + "viable_fonts.csv", "w") as viable_fonts:
+        for path in font_files:
+            viable_fonts.write(path + ",True\n")
+        viable_fonts.write("not_viable.ttf,False\n")
+
+    return dict(image_dir_path=image_dir_path,
+                text_dataset_path=text_dataset_path,
+                speech_bubbles_path=speech_bubbles_path,
+                font_files_path=font_files_path,
+                manifest_file=str(tmp_path / "asset_manifest.pkl"))
+
+
+def test_load_assets_from_manifest(page_assets, dataset_paths):
+    """
+    This tests whether loading the assets builds the manifest
+    and gives the same assets once it's built
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param dataset_paths: Paths of the datasets
+
+    :type dataset_paths: dict
+    """
+    assets = load_assets(**dataset_paths)
+    assert os.path.isfile(dataset_paths['manifest_file'])
+
+    (image_dir, image_dir_path, font_files, text_dataset,
+     speech_bubble_files, speech_bubble_tags) = assets
+
+    assert sorted(image_dir) == sorted(page_assets[0])
+    assert font_files == page_assets[2]
+    assert isinstance(text_dataset, TextSampler)
+    assert len(text_dataset) == 4
+    assert isinstance(speech_bubble_tags, SpeechBubbleCatalog)
+    assert len(speech_bubble_files) == 2
+
+    cached_assets = load_assets(**dataset_paths)
+    assert cached_assets[0] == image_dir
+    assert cached_assets[2] == font_files
+    assert cached_assets[4] == speech_bubble_files
+    assert cached_assets[5].writing_areas == speech_bubble_tags.writing_areas
+
+    render_assets = load_render_assets(
+                        dataset_paths['speech_bubbles_path'],
+                        dataset_paths['font_files_path'],
+                        dataset_paths['manifest_file'])
+    assert render_assets == (font_files, speech_bubble_files)
+
+
+def test_manifest_invalidation(dataset_paths):
+    """
+    This tests whether the manifest goes stale when
+    a dataset folder changes
+
+    :param dataset_paths: Paths of the datasets
+
+    :type dataset_paths: dict
+    """
+    paths = (dataset_paths['image_dir_path'],
+             dataset_paths['speech_bubbles_path'],
+             dataset_paths['font_files_path'])
+    manifest_file = dataset_paths['manifest_file']
+
+    assert load_manifest(*paths, manifest_file=manifest_file) is None
+
+    build_manifest(*paths, manifest_file=manifest_file)
+    manifest = load_manifest(*paths, manifest_file=manifest_file)
+    assert len(manifest['speech_bubble_catalog']['files']) == 2
+
+    # Make sure the folder's modification time moves
+    time.sleep(0.01)
+    new_file = dataset_paths['speech_bubbles_path'] + "files/new.png"
+    with open(new_file, "wb"):
+        pass
+
+    assert load_manifest(*paths, manifest_file=manifest_file) is None
+
+
+def test_manifest_skips_invalid_illustrations(page_assets,
+                                              dataset_paths,
+                                              tmp_path,
+                                              monkeypatch):
+    """
+    This tests whether illustrations the catalog flagged
+    are left out of the manifest
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param dataset_paths: Paths of the datasets
+
+    :type dataset_paths: dict
+
+    :param tmp_path: Directory to write the catalog to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to point to the catalog
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    catalog_file = str(tmp_path / "illustration_catalog.npz")
+    monkeypatch.setattr(cfg, "illustration_catalog_file", catalog_file)
+
+    image_dir = sorted(page_assets[0])
+    IllustrationCatalog(image_dir,
+                        [(90, 120)]*3,
+                        [(0, 0, 90, 120)]*3,
+                        [True, False, True]).save(catalog_file)
+
+    assets = load_assets(**dataset_paths)
+    assert sorted(assets[0]) == [image_dir[0], image_dir[2]]
+
+
+def test_manifest_skips_partial_illustrations(dataset_paths, tmp_path):
+    """
+    This tests whether partial images left by interrupted
+    conversions are left out of the manifest
+
+    :param dataset_paths: Paths of the datasets
+
+    :type dataset_paths: dict
+
+    :param tmp_path: Directory to write the illustrations to
+
+    :type tmp_path: pathlib.Path
+    """
+    image_dir_path = str(tmp_path / "images") + "/"
+    os.makedirs(image_dir_path)
+    for filename in ["illustration_0.png", "illustration_1.png.tmp"]:
+        with open(image_dir_path + filename, "wb"):
+            pass
+
+    manifest = build_manifest(image_dir_path,
+                              dataset_paths['speech_bubbles_path'],
+                              dataset_paths['font_files_path'],
+                              manifest_file=dataset_paths['manifest_file'])
+    assert manifest['image_dir'] == ["illustration_0.png"]
+
+
+def test_manifest_rebuilt_for_other_catalog_version(dataset_paths):
+    """
+    This tests whether a manifest with a speech bubble catalog
+    from a different version is rebuilt
+
+    :param dataset_paths: Paths of the datasets
+
+    :type dataset_paths: dict
+    """
+    manifest_file = dataset_paths['manifest_file']
+    build_manifest(dataset_paths['image_dir_path'],
+                   dataset_paths['speech_bubbles_path'],
+                   dataset_paths['font_files_path'],
+                   manifest_file=manifest_file)
+
+    with open(manifest_file, "rb") as f:
+        manifest = pickle.load(f)
+    manifest['speech_bubble_catalog']['version'] = -1
+    with open(manifest_file, "wb") as f:
+        pickle.dump(manifest, f)
+
+    assets = load_assets(**dataset_paths)
+    assert isinstance(assets[5], SpeechBubbleCatalog)
+    assert len(assets[4]) == 2
+
+    with open(manifest_file, "rb") as f:
+        manifest = pickle.load(f)
+    assert manifest['speech_bubble_catalog']['version'] == \
+        SpeechBubbleCatalog.version
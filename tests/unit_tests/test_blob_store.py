@@ -0,0 +1,101 @@
+import os
+import pickle
+import numpy as np
+from PIL import Image
+
+from preprocesing.layout_engine.blob_store import (
+    BlobStore, pack_files, unpack_files
+)
+from preprocesing.layout_engine.caches import (
+    load_illustration, set_illustration_pack
+)
+
+
+def make_images(image_dir):
+    """
+    Write a few small illustrations
+
+    :param image_dir: Folder to write them to
+
+    :type image_dir: pathlib.Path
+
+    :return: Filenames of the illustrations
+
+    :rtype: list
+    """
+    names = []
+    for i in range(4):
+        img_array = np.zeros((40, 30), dtype=np.uint8)
+        img_array[5:35, 5:25] = 50*(i + 1)
+        name = "image_%d.png" % i
+        Image.fromarray(img_array).save(image_dir / name)
+        names.append(name)
+
+    return names
+
+
+def test_pack_and_unpack(tmp_path):
+    """
+    This tests whether files packed across several shards
+    are read back and unpacked unchanged
+
+    :param tmp_path: Directory to write the files and pack to
+
+    :type tmp_path: pathlib.Path
+    """
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    names = make_images(image_dir)
+    file_size = os.path.getsize(image_dir / names[0])
+
+    pack_dir = str(tmp_path / "pack")
+    pack_files(str(image_dir), pack_dir, int(file_size*2.5))
+    store = BlobStore.load(pack_dir)
+
+    assert store.names == names
+    assert len(set(store.shards.tolist())) > 1
+
+    for name in names:
+        with open(image_dir / name, "rb") as f:
+            assert bytes(store.get_bytes(name)) == f.read()
+
+    img = store.open_image(names[2])
+    assert np.array_equal(np.asarray(img),
+                          np.asarray(Image.open(image_dir / names[2])))
+    assert store.get_bytes("missing.png") is None
+
+    # Maps are remade rather than pickled
+    unpickled = pickle.loads(pickle.dumps(store))
+    assert bytes(unpickled.get_bytes(names[1])) == \
+        bytes(store.get_bytes(names[1]))
+
+    out_dir = tmp_path / "unpacked"
+    assert unpack_files(pack_dir, str(out_dir)) == 4
+    assert sorted(os.listdir(out_dir)) == names
+
+
+def test_load_illustration_from_pack(tmp_path):
+    """
+    This tests whether illustrations are read from the pack
+    when their files aren't there
+
+    :param tmp_path: Directory to write the files and pack to
+
+    :type tmp_path: pathlib.Path
+    """
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    names = make_images(image_dir)
+    path = str(image_dir / names[1])
+    expected = np.asarray(load_illustration(path))
+
+    store = pack_files(str(image_dir), str(tmp_path / "pack"), 1024**2)
+    os.remove(path)
+
+    set_illustration_pack(store)
+    try:
+        img = load_illustration(path)
+    finally:
+        set_illustration_pack(None)
+
+    assert np.array_equal(np.asarray(img), expected)
@@ -0,0 +1,98 @@
+import numpy as np
+from PIL import Image
+
+from preprocesing.layout_engine.caches import (
+    LRUCache, get_illustration, illustration_cache,
+    get_font, font_cache, font_file_cache
+)
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """
+    This tests whether the cache keeps to it's item bound
+    and evicts the least recently used item first
+    """
+    cache = LRUCache(max_items=2)
+
+    cache.get("a", lambda: 1)
+    cache.get("b", lambda: 2)
+
+    # Touch a so that b is the least recently used
+    assert cache.get("a", lambda: None) == 1
+    cache.get("c", lambda: 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 3
+    assert stats['evictions'] == 1
+
+
+def test_lru_cache_memory_budget():
+    """
+    This tests whether the cache keeps to it's memory budget
+    and doesn't store items bigger than it
+    """
+    cache = LRUCache(max_items=10, max_bytes=10, get_size=len)
+
+    cache.get("a", lambda: "aaaa")
+    cache.get("b", lambda: "bbbb")
+    cache.get("c", lambda: "cccc")
+
+    assert cache.current_bytes <= 10
+    assert "a" not in cache
+
+    cache.get("d", lambda: "d"*11)
+    assert "d" not in cache
+
+
+def test_get_illustration_crops_resizes_and_caches(tmp_path):
+    """
+    This tests whether illustrations are cropped, resized
+    and then served from the cache
+    """
+    img_array = np.zeros((40, 30), dtype=np.uint8)
+    img_array[10:30, 5:25] = 200
+    path = str(tmp_path / "illustration.png")
+    Image.fromarray(img_array).save(path)
+
+    illustration_cache.clear()
+
+    img = get_illustration(path)
+    assert img.mode == "L"
+    assert img.size == (20, 20)
+
+    resized = get_illustration(path, (60, 80))
+    assert resized.size == (60, 80)
+    assert get_illustration(path, (60, 80)) is resized
+
+    stats = illustration_cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+
+
+def test_get_font_caches_by_path_and_size(font_file):
+    """
+    This tests whether font objects are reused for the
+    same font file and size
+
+    :param font_file: Path to a test font
+
+    :type font_file: str
+    """
+    font_cache.clear()
+    font_file_cache.clear()
+
+    font = get_font(font_file, 20)
+    assert get_font(font_file, 20) is font
+    assert get_font(font_file, 21) is not font
+    assert font.size == 20
+
+    assert font_cache.stats()['hits'] == 1
+    assert font_cache.stats()['misses'] == 2
+
+    # The font file was only read once
+    assert font_file_cache.stats()['misses'] == 1
@@ -0,0 +1,185 @@
+import pickle
+import numpy as np
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.page_object_classes import Panel
+from preprocesing.layout_engine.page_dataset_creator import (
+    create_single_panel_metadata
+)
+from preprocesing.extract_and_verify_fonts import (
+    get_font_codepoints, get_font_coverage, verify_font_files
+)
+from preprocesing.layout_engine.font_index import FontIndex
+from preprocesing.layout_engine.assets import load_font_index
+from conftest import make_test_font
+
+
+def test_font_coverage(font_file):
+    """
+    This tests whether a font's codepoints and coverage
+    of a set of characters are found
+
+    :param font_file: Path to a test font
+
+    :type font_file: str
+    """
+    codepoints = get_font_codepoints(font_file)
+
+    assert ord("あ") in codepoints
+    assert ord("ん") not in codepoints
+    assert np.all(np.diff(codepoints) > 0)
+
+    chars = np.array([ord(char) for char in "あいんを"])
+    assert get_font_coverage(codepoints, chars) == 0.5
+
+
+def test_verify_font_files(tmp_path, monkeypatch):
+    """
+    This tests whether fonts are marked viable by their
+    coverage, unreadable fonts don't stop verification
+    and fonts are cached by their contents
+
+    :param tmp_path: Directory to write the fonts to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to set the coverage needed
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    monkeypatch.setattr(cfg, "font_character_coverage", 0.6)
+
+    font_dir = tmp_path / "font_files"
+    font_dir.mkdir()
+    make_test_font(str(font_dir / "full.ttf"), "あいうえお")
+    make_test_font(str(font_dir / "half.ttf"), "あい")
+    with open(font_dir / "broken.ttf", "wb") as broken_font:
+        broken_font.write(b"not a font")
+
+    render_text_test_file = tmp_path / "render_test_text.txt"
+    with open(render_text_test_file, "w") as test_file:
+        test_file.write(" ".join("あいうえお"))
+
+    dataset_path = str(tmp_path) + "/"
+    font_file_dir = str(font_dir) + "/"
+    for run in range(2):
+        verify_font_files(None, str(render_text_test_file),
+                          font_file_dir, dataset_path, workers=2)
+
+        with open(dataset_path + "viable_fonts.csv") as viable_fonts:
+            lines = viable_fonts.read().splitlines()
+
+        assert lines == [font_file_dir + "broken.ttf,False",
+                         font_file_dir + "full.ttf,True",
+                         font_file_dir + "half.ttf,False"]
+
+    with open(dataset_path + "font_codepoints_cache.pkl", "rb") as f:
+        cache = pickle.load(f)
+    assert len(cache) == 3
+
+    font_index = load_font_index(dataset_path,
+                                 [font_file_dir + "full.ttf"])
+    assert isinstance(font_index, FontIndex)
+    assert font_index.font_files == [font_file_dir + "full.ttf"]
+    assert list(font_index.get_compatible_fonts("あお")) == [0]
+
+    # An index for other fonts isn't used
+    assert load_font_index(dataset_path, []) == []
+
+
+def test_font_index(tmp_path):
+    """
+    This tests whether the fonts that have every character
+    of a text are found and picked fonts are swapped for them
+
+    :param tmp_path: Directory to write the index to
+
+    :type tmp_path: pathlib.Path
+    """
+    font_files = ["a.ttf", "b.ttf", "c.ttf"]
+    font_codepoints = [np.array([ord(c) for c in "あいう"]),
+                       np.array([ord(c) for c in "あい"]),
+                       np.array([ord(c) for c in "う"])]
+    chars = [ord(c) for c in "あいう"]
+    font_index = FontIndex.build(font_files, font_codepoints, chars)
+
+    assert len(font_index) == 3
+    assert font_index[1] == "b.ttf"
+    assert list(font_index.get_compatible_fonts("あい")) == [0, 1]
+    assert list(font_index.get_compatible_fonts("う")) == [0, 2]
+    # Characters that aren't indexed don't rule fonts out
+    assert list(font_index.get_compatible_fonts("x")) == [0, 1, 2]
+
+    assert font_index.choose_font(1, "あい") == 1
+    assert font_index.choose_font(1, "いう") == 0
+
+    # Swapped fonts are drawn evenly from the compatible ones
+    np.random.seed(0)
+    chosen = [font_index.choose_font(2, "あ") for i in range(200)]
+    assert set(chosen) == {0, 1}
+    assert 70 < chosen.count(0) < 130
+
+    assert list(font_index.get_coverage("あいう")) == [3, 2, 1]
+
+    filename = str(tmp_path / "font_index.npz")
+    font_index.save(filename)
+    loaded = FontIndex.load(filename)
+    assert loaded.font_files == font_files
+    assert np.array_equal(loaded.bits, font_index.bits)
+    assert list(loaded.get_compatible_fonts("いう")) == [0]
+
+    # With no compatible font the one with the most characters is used
+    font_index = FontIndex.build(font_files[1:], font_codepoints[1:], chars)
+    assert font_index.choose_font(1, "あいう") == 0
+    assert font_index.choose_font(0, "あいう") == 0
+    assert font_index.choose_font(1, "うx") == 1
+
+
+def test_panel_picks_compatible_font(page_assets, monkeypatch):
+    """
+    This tests whether speech bubbles swap fonts that
+    don't have their text's characters without changing
+    anything else about the panel
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param monkeypatch: Used to make sure panels have speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 4)
+    monkeypatch.setattr(cfg, "precompute_text_layout", False)
+
+    (image_dir, image_dir_path, font_files, text_dataset,
+     speech_bubble_files, speech_bubble_tags) = page_assets
+
+    font_files = ["tofu.ttf"] + font_files
+    chars = [ord(c) for c in "".join(text_dataset["Japanese"])]
+    font_index = FontIndex.build(font_files,
+                                 [np.array([], dtype=np.int64),
+                                  np.unique(chars)],
+                                 chars)
+
+    dumps = []
+    for fonts in [font_files, font_index]:
+        np.random.seed(0)
+        coords = [(0, 0), (0, 500), (400, 500), (400, 0), (0, 0)]
+        panel = Panel(coords, "panel", None, "h")
+        create_single_panel_metadata(panel,
+                                     image_dir,
+                                     image_dir_path,
+                                     fonts,
+                                     text_dataset,
+                                     speech_bubble_files,
+                                     speech_bubble_tags,
+                                     minimum_speech_bubbles=2
+                                     )
+        dumps.append([bubble.dump_data() for bubble in panel.speech_bubbles])
+
+    assert "tofu.ttf" in [bubble['font'] for bubble in dumps[0]]
+    for bubble, indexed_bubble in zip(*dumps):
+        assert indexed_bubble['font'] == font_files[1]
+        bubble['font'] = font_files[1]
+        assert indexed_bubble == bubble
@@ -0,0 +1,265 @@
+import pytest
+import os
+import time
+import zipfile
+from io import BytesIO
+import numpy as np
+from PIL import Image
+
+from preprocesing.convert_images import (
+    catalog_single_image, catalog_images, convert_zip_to_bw,
+    convert_images_to_bw, list_images, init_zip_worker, convert_zip_member
+)
+from preprocesing.layout_engine.caches import (
+    load_illustration, set_illustration_catalog
+)
+from preprocesing.layout_engine.illustration_catalog import (
+    IllustrationCatalog
+)
+
+
+def make_illustrations(image_dir):
+    """
+    Write an illustration with a black border, an all black
+    one, a tiny one and a corrupt one
+
+    :param image_dir: Folder to write them to
+
+    :type image_dir: pathlib.Path
+    """
+    img_array = np.zeros((100, 80), dtype=np.uint8)
+    img_array[10:90, 5:60] = 200
+    Image.fromarray(img_array).save(image_dir / "bordered.png")
+
+    Image.new("L", (100, 100), 0).save(image_dir / "black.png")
+    Image.new("L", (8, 8), 255).save(image_dir / "tiny.png")
+
+    with open(image_dir / "corrupt.jpg", "wb") as corrupt_file:
+        corrupt_file.write(b"not an image")
+
+
+def test_catalog_single_image(tmp_path):
+    """
+    This tests whether illustrations get the right crop
+    boxes and unusable ones are flagged
+
+    :param tmp_path: Directory to write illustrations to
+
+    :type tmp_path: pathlib.Path
+    """
+    make_illustrations(tmp_path)
+
+    size, crop_box, valid = catalog_single_image(str(tmp_path /
+                                                     "bordered.png"))
+    assert size == (80, 100)
+    assert crop_box == (5, 10, 60, 90)
+    assert valid
+
+    for name in ["black.png", "tiny.png", "corrupt.jpg"]:
+        assert not catalog_single_image(str(tmp_path / name))[2]
+
+
+def test_catalog_images(tmp_path):
+    """
+    This tests whether a folder of illustrations is
+    cataloged and the catalog can be read back
+
+    :param tmp_path: Directory to write illustrations to
+
+    :type tmp_path: pathlib.Path
+    """
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    make_illustrations(image_dir)
+    catalog_file = str(tmp_path / "catalog.npz")
+
+    catalog = catalog_images(str(image_dir) + "/", catalog_file, workers=2)
+    loaded = IllustrationCatalog.load(catalog_file)
+
+    assert loaded.names == catalog.names
+    assert loaded.valid_names() == ["bordered.png"]
+    assert loaded.get("bordered.png") == ((80, 100), (5, 10, 60, 90), True)
+    assert loaded.get("missing.png") is None
+
+
+def test_load_illustration_with_catalog(tmp_path):
+    """
+    This tests whether cropping with the cataloged crop box
+    gives the same illustration as finding the crop box
+
+    :param tmp_path: Directory to write illustrations to
+
+    :type tmp_path: pathlib.Path
+    """
+    make_illustrations(tmp_path)
+    path = str(tmp_path / "bordered.png")
+
+    set_illustration_catalog(None)
+    expected = load_illustration(path, (60, 40))
+
+    size, crop_box, valid = catalog_single_image(path)
+    catalog = IllustrationCatalog(["bordered.png"], [size], [crop_box],
+                                  [valid])
+    set_illustration_catalog(catalog)
+    try:
+        img = load_illustration(path, (60, 40))
+    finally:
+        set_illustration_catalog(None)
+
+    assert np.array_equal(np.asarray(img), np.asarray(expected))
+
+
+def test_empty_catalog(tmp_path):
+    """
+    This tests whether an empty catalog can be saved and read back
+
+    :param tmp_path: Directory to write the catalog to
+
+    :type tmp_path: pathlib.Path
+    """
+    catalog_file = str(tmp_path / "catalog.npz")
+    IllustrationCatalog([], [], [], []).save(catalog_file)
+
+    assert len(IllustrationCatalog.load(catalog_file)) == 0
+
+
+def make_illustration_zip(zip_path):
+    """
+    Write an archive laid out like the Kaggle dataset with a
+    colour illustration with a black border and a corrupt one
+
+    :param zip_path: Path of the archive
+
+    :type zip_path: pathlib.Path
+    """
+    img_array = np.zeros((100, 80, 3), dtype=np.uint8)
+    img_array[10:90, 5:60] = (200, 120, 40)
+    img_buffer = BytesIO()
+    Image.fromarray(img_array).save(img_buffer, "JPEG", quality=95)
+
+    folder = "danbooru-images/danbooru-images/0000/"
+    with zipfile.ZipFile(zip_path, "w") as zip_file:
+        zip_file.writestr(folder + "colour.jpg", img_buffer.getvalue())
+        zip_file.writestr(folder + "corrupt.jpg", b"not an image")
+        zip_file.writestr("tags.json", b"{}")
+
+
+@pytest.mark.parametrize("crop", [False, True])
+def test_convert_zip_to_bw(crop, tmp_path):
+    """
+    This tests whether illustrations are converted to black and
+    white and cataloged straight from the archive
+
+    :param crop: Whether to crop the illustrations
+
+    :type crop: bool
+
+    :param tmp_path: Directory to write the archive and images to
+
+    :type tmp_path: pathlib.Path
+    """
+    zip_path = str(tmp_path / "illustrations.zip")
+    make_illustration_zip(zip_path)
+    output_dir = str(tmp_path / "bw") + "/"
+    catalog_file = str(tmp_path / "catalog.npz")
+
+    # A partial image left by an interrupted run
+    os.mkdir(output_dir)
+    with open(output_dir + "colour.jpg.tmp", "wb") as partial_file:
+        partial_file.write(b"partial")
+
+    catalog = convert_zip_to_bw(zip_path, output_dir, crop=crop,
+                                catalog_file=catalog_file, workers=2)
+
+    assert sorted(os.listdir(output_dir)) == ["colour.jpg"]
+    img = Image.open(output_dir + "colour.jpg")
+    assert img.mode == "L"
+
+    assert IllustrationCatalog.load(catalog_file).names == catalog.names
+    assert catalog.valid_names() == ["colour.jpg"]
+    size, crop_box, valid = catalog.get("colour.jpg")
+    assert size == img.size
+    if crop:
+        assert crop_box == (0, 0) + img.size
+    else:
+        assert size == (80, 100)
+        # JPEG artifacts can leave the border slightly above black
+        assert crop_box[0] <= 5 and crop_box[1] <= 10
+        assert crop_box[2] >= 60 and crop_box[3] >= 90
+
+
+def test_convert_images_to_bw_skips_converted(tmp_path, capsys):
+    """
+    This tests whether images are converted from every folder
+    and only reconverted when their source changes
+
+    :param tmp_path: Directory to write the images to
+
+    :type tmp_path: pathlib.Path
+
+    :param capsys: Used to read what was reported
+
+    :type capsys: pytest.CaptureFixture
+    """
+    dataset_dir = tmp_path / "danbooru-images"
+    for i, folder in enumerate(["0000", "0001"]):
+        (dataset_dir / folder).mkdir(parents=True)
+        img_array = np.full((20, 20, 3), 60*(i + 1), dtype=np.uint8)
+        Image.fromarray(img_array).save(dataset_dir / folder /
+                                        ("image_%d.jpg" % i))
+    with open(dataset_dir / "0001" / "corrupt.jpg", "wb") as corrupt_file:
+        corrupt_file.write(b"not an image")
+
+    # A partial image left by an interrupted run
+    output_dir = str(tmp_path / "bw") + "/"
+    os.mkdir(output_dir)
+    with open(output_dir + "image_0.jpg.tmp", "wb") as partial_file:
+        partial_file.write(b"partial")
+    assert list_images(output_dir) == []
+
+    convert_images_to_bw(str(dataset_dir) + "/", output_dir, workers=2)
+
+    assert sorted(os.listdir(output_dir)) == ["image_0.jpg", "image_1.jpg"]
+    assert Image.open(output_dir + "image_0.jpg").mode == "L"
+    assert "1 images couldn't be converted" in capsys.readouterr().out
+
+    # Only the changed image is converted again
+    source = dataset_dir / "0000" / "image_0.jpg"
+    os.utime(source, (time.time() + 10, time.time() + 10))
+    convert_images_to_bw(str(dataset_dir) + "/", output_dir, workers=2)
+
+    out = capsys.readouterr().out
+    assert "Skipping 1 images" in out
+    assert "Converted 1 images" in out
+
+
+def test_failed_zip_member_write(tmp_path, monkeypatch):
+    """
+    This tests whether an image that failed to be written
+    from the archive doesn't leave a partial image behind
+
+    :param tmp_path: Directory to write the archive and images to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to make writing images fail
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    zip_path = str(tmp_path / "illustrations.zip")
+    make_illustration_zip(zip_path)
+    output_dir = str(tmp_path / "bw") + "/"
+    os.mkdir(output_dir)
+
+    def save(img, fp, *args, **kwargs):
+        with open(fp, "wb") as partial_file:
+            partial_file.write(b"partial")
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(Image.Image, "save", save)
+    init_zip_worker(zip_path)
+    member = "danbooru-images/danbooru-images/0000/colour.jpg"
+    with pytest.raises(OSError):
+        convert_zip_member((member, output_dir, False))
+
+    assert os.listdir(output_dir) == []
@@ -0,0 +1,183 @@
+import os
+import numpy as np
+from PIL import Image
+
+from preprocesing import config_file as cfg
+from preprocesing.convert_images import store_images
+from preprocesing.layout_engine.caches import (
+    load_illustration, set_illustration_store, set_illustration_catalog,
+    illustration_cache
+)
+from preprocesing.layout_engine.illustration_store import (
+    IllustrationStore, write_illustration_store
+)
+from preprocesing.layout_engine.page_dataset_creator import get_base_panels
+from preprocesing.layout_engine.helpers import get_leaf_panels
+
+
+def test_write_and_read_store(tmp_path):
+    """
+    This tests whether illustrations written across several
+    files are read back as views of those files
+
+    :param tmp_path: Directory to write the store to
+
+    :type tmp_path: pathlib.Path
+    """
+    size = (30, 20)
+    illustrations = [("image_%d.jpg" % i,
+                      np.full((20, 30), i*40, dtype=np.uint8))
+                     for i in range(5)]
+
+    # Two illustrations per file
+    write_illustration_store(str(tmp_path), size, illustrations, 1500)
+    store = IllustrationStore.load(str(tmp_path))
+
+    assert len(store) == 5
+    assert store.shards.tolist() == [0, 0, 1, 1, 2]
+
+    for name, img_array in illustrations:
+        stored = store.get(name)
+        assert np.array_equal(stored, img_array)
+        assert isinstance(stored.base, np.memmap)
+
+    assert store.get("image_1.jpg", (30, 20)) is not None
+    assert store.get("image_1.jpg", (20, 30)) is None
+    assert store.get("missing.jpg") is None
+
+    # Rewriting it with fewer files removes the ones it doesn't use
+    write_illustration_store(str(tmp_path), size, illustrations[:2], 1500)
+    assert sorted(os.listdir(tmp_path)) == ["illustrations_000.bin",
+                                            "index.npz"]
+    store = IllustrationStore.load(str(tmp_path))
+    assert len(store) == 2
+    assert np.array_equal(store.get("image_1.jpg"), illustrations[1][1])
+
+
+def test_store_images(tmp_path, monkeypatch):
+    """
+    This tests whether the stored illustrations are the
+    same as loading and resizing them
+
+    :param tmp_path: Directory to write illustrations and the store to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to not use a catalog
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    monkeypatch.setattr(cfg, "illustration_catalog_file",
+                        str(tmp_path / "missing.npz"))
+    set_illustration_catalog(None)
+
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    for i in range(3):
+        img_array = np.zeros((50, 40), dtype=np.uint8)
+        img_array[5:45, 5:35] = 50*(i + 1)
+        img_array[20, 20] = 255
+        Image.fromarray(img_array).save(image_dir / ("image_%d.png" % i))
+
+    store = store_images(str(image_dir) + "/", str(tmp_path / "store"),
+                         (32, 24), workers=2)
+
+    assert sorted(store.names) == ["image_0.png", "image_1.png",
+                                   "image_2.png"]
+    for name in store.names:
+        expected = load_illustration(str(image_dir / name), (32, 24))
+        assert np.array_equal(store.get(name), np.asarray(expected))
+
+
+def test_render_from_store(tmp_path, monkeypatch):
+    """
+    This tests whether pages rendered from page sized stored
+    illustrations match pages rendered from the files
+
+    :param tmp_path: Directory to write illustrations and the store to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to switch compositing modes
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    x = np.linspace(0, 255, 300)
+    y = np.linspace(0, 255, 400)
+    img_array = ((x[None, :] + y[:, None])/2).astype(np.uint8)
+    image_path = str(tmp_path / "illustration.png")
+    Image.fromarray(img_array).save(image_path)
+
+    page = get_base_panels(num_panels=4, layout_type="vh")
+    leaf_children = []
+    get_leaf_panels(page, leaf_children)
+    for panel in leaf_children:
+        panel.image = image_path
+
+    monkeypatch.setattr(cfg, "panel_compositing", "page")
+    set_illustration_store(None)
+    expected = np.asarray(page.render(show=False))
+
+    page_sized = np.asarray(load_illustration(image_path, cfg.page_size))
+    store = write_illustration_store(str(tmp_path / "store"),
+                                     cfg.page_size,
+                                     [("illustration.png", page_sized)],
+                                     cfg.illustration_store_shard_bytes)
+    illustration_cache.clear()
+    set_illustration_store(store)
+    try:
+        for compositing in ["page", "bbox"]:
+            monkeypatch.setattr(cfg, "panel_compositing", compositing)
+            rendered = np.asarray(page.render(show=False))
+            assert np.array_equal(rendered, expected)
+
+        # Nothing was decoded
+        assert illustration_cache.stats()['misses'] == 0
+    finally:
+        set_illustration_store(None)
+
+
+def test_render_from_smaller_store(tmp_path, monkeypatch):
+    """
+    This tests whether illustrations stored smaller than the
+    page are resampled to each panel rather than decoded again
+
+    :param tmp_path: Directory to write illustrations and the store to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to composite within each panel's box
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    x = np.linspace(0, 255, 300)
+    y = np.linspace(0, 255, 400)
+    img_array = ((x[None, :] + y[:, None])/2).astype(np.uint8)
+    image_path = str(tmp_path / "illustration.png")
+    Image.fromarray(img_array).save(image_path)
+
+    page = get_base_panels(num_panels=4, layout_type="vh")
+    leaf_children = []
+    get_leaf_panels(page, leaf_children)
+    for panel in leaf_children:
+        panel.image = image_path
+
+    monkeypatch.setattr(cfg, "panel_compositing", "bbox")
+    set_illustration_store(None)
+    expected = np.asarray(page.render(show=False)).astype(int)
+
+    size = (cfg.page_width//2, cfg.page_height//2)
+    half_sized = np.asarray(load_illustration(image_path, size))
+    store = write_illustration_store(str(tmp_path / "store"), size,
+                                     [("illustration.png", half_sized)],
+                                     cfg.illustration_store_shard_bytes)
+    illustration_cache.clear()
+    set_illustration_store(store)
+    try:
+        rendered = np.asarray(page.render(show=False)).astype(int)
+        assert np.abs(rendered - expected).mean() < 1
+
+        # Nothing was decoded
+        assert illustration_cache.stats()['misses'] == 0
+    finally:
+        set_illustration_store(None)
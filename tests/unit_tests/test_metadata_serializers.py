@@ -0,0 +1,247 @@
+import pytest
+import os
+import json
+import time
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.page_object_classes import Page
+from preprocesing.layout_engine.page_creator import (
+    create_pages_metadata, create_seeded_page, load_render_plan
+)
+from preprocesing.layout_engine.metadata_serializers import (
+    CompactSerializer, JSONSerializer, get_metadata_file, get_serializer,
+    is_metadata_file, loads_metadata, read_metadata
+)
+from preprocesing.layout_engine.text_sampler import TextSampler
+from preprocesing.layout_engine.caches import set_text_corpus
+
+
+@pytest.mark.parametrize("compression", [None, "zlib", "lzma"])
+def test_compact_round_trip(compression, page_assets, monkeypatch):
+    """
+    This tests whether compact metadata reads back as the
+    same metadata the JSON does with it's texts read
+    from the corpus and is much smaller
+
+    :param compression: How to compress the metadata
+
+    :type compression: str
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param monkeypatch: Used to lay out the text of bubbles
+    when creating pages
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    monkeypatch.setattr(cfg, "precompute_text_layout", True)
+    text_corpus = TextSampler.from_dataframe(page_assets[3])
+
+    serializer = CompactSerializer(compression)
+    for page_idx in range(5):
+        data = create_seeded_page(11, page_idx, page_assets).dump_data_dict()
+        page_json = JSONSerializer().dumps(data)
+        metadata = serializer.dumps(data)
+
+        assert loads_metadata(metadata, text_corpus) == json.loads(page_json)
+        assert len(metadata) < len(page_json.encode("utf-8"))/4
+
+
+def test_compact_keeps_unusual_metadata():
+    """
+    This tests whether bubbles without text indices, writing
+    areas with other keys and lines that aren't in their text
+    are kept as they are
+    """
+    bubble = dict(
+        texts=[{"Japanese": "はい"}, {"Japanese": "いいえ"}],
+        text_indices=None,
+        font="font.ttf",
+        font_size=60,
+        speech_bubble="bubble.png",
+        writing_areas=[
+            dict(x=1.5, y=2, width=30, height=40.25,
+                 original_width=200, original_height=100,
+                 rotation=0, rectanglelabels=["text"]),
+            dict(x=1, y=2, width=3, height=4,
+                 original_width=5, original_height=6)
+        ],
+        resize_to=100.0,
+        location=[3, 4],
+        width=200,
+        height=100,
+        transforms=["rotate"],
+        transform_metadata={"rotation_amount": 12},
+        text_orientation="ttb",
+        text_layout=[
+            dict(font_size=58, lines=[[1.0, 2.0, "はいは"],
+                                      [1.5, 2.0, "いはい"]]),
+            dict(font_size=54, lines=[[3.0, 4.0, "ねこ"]])
+        ]
+    )
+    data = dict(
+        name="page",
+        num_panels=1,
+        page_type="v",
+        page_size=[1700, 2400],
+        background="background.png",
+        children=[dict(name="page-0",
+                       coordinates=[[0.0, 0.0], [1700, 0.0], [1700, 2400]],
+                       orientation=None,
+                       children=[],
+                       non_rect=False,
+                       sliced=False,
+                       no_render=False,
+                       image=None,
+                       speech_bubbles=[bubble])],
+        speech_bubbles=[]
+    )
+
+    metadata = CompactSerializer("zlib").dumps(data)
+    assert loads_metadata(metadata) == data
+
+    with pytest.raises(ValueError):
+        CompactSerializer("gzip")
+
+
+def test_load_either_format(page_assets, tmp_path, monkeypatch):
+    """
+    This tests whether pages are loaded the same from JSON and
+    compact metadata files and metadata written in either format
+    is found in a folder
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the metadata to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to make sure pages have speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 4)
+
+    metadata_dir = str(tmp_path) + "/"
+    names = create_pages_metadata(3, metadata_dir, seed=5, workers=1,
+                                  assets=page_assets,
+                                  metadata_format="compact")
+    page = create_seeded_page(5, 0, page_assets)
+    page.dump_data(metadata_dir, dry=False, metadata_format="json")
+
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [name + ".meta" for name in names] + [page.name + ".json"])
+    assert all(is_metadata_file(filename)
+               for filename in os.listdir(tmp_path))
+    assert not is_metadata_file("page.png")
+
+    # Texts are only read from the corpus when they're needed
+    compact_page = Page()
+    compact_page.load_data(get_metadata_file(metadata_dir, names[0],
+                                             "compact"))
+    assert len(compact_page.get_child(0).speech_bubbles) > 0
+    assert compact_page.get_child(0).speech_bubbles[0].texts is None
+
+    set_text_corpus(TextSampler.from_dataframe(page_assets[3]))
+    try:
+        compact_data = compact_page.dump_data_dict()
+    finally:
+        set_text_corpus(None)
+
+    json_page = Page()
+    json_page.load_data(get_metadata_file(metadata_dir, page.name, "json"))
+
+    assert compact_data == json_page.dump_data_dict()
+
+    # The texts can't be read without the corpus
+    with pytest.raises(ValueError):
+        read_metadata(get_metadata_file(metadata_dir, names[0], "compact"))
+
+    # Metadata written before there were formats
+    legacy = read_metadata("tests/unit_tests/test_files/test.json")
+    assert legacy['num_panels'] == 8
+
+    with pytest.raises(ValueError):
+        get_serializer("xml")
+
+
+def test_render_compact_metadata(page_assets, tmp_path, monkeypatch):
+    """
+    This tests whether a page is rendered the same from compact
+    metadata which only reads the texts it lays out from the corpus
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the metadata to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to make sure pages have speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 4)
+
+    metadata_dir = str(tmp_path) + "/"
+    page = create_seeded_page(5, 0, page_assets)
+    page.dump_data(metadata_dir, dry=False, metadata_format="json")
+    page.dump_data(metadata_dir, dry=False, metadata_format="compact")
+
+    set_text_corpus(TextSampler.from_dataframe(page_assets[3],
+                                               ["Japanese"]))
+    try:
+        plan = load_render_plan(get_metadata_file(metadata_dir, page.name,
+                                                  "compact"))
+    finally:
+        set_text_corpus(None)
+
+    assert plan == load_render_plan(get_metadata_file(metadata_dir,
+                                                      page.name, "json"))
+    assert len(plan['speech_bubbles']) > 0
+
+
+def test_compact_loads_as_fast_as_json(page_assets, tmp_path, monkeypatch):
+    """
+    This tests whether pages load from compact metadata at
+    least as fast as from JSON comparing the fastest of a
+    few times each format takes to load the same pages
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the metadata to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to make sure pages have speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 4)
+
+    metadata_dir = str(tmp_path) + "/"
+    filenames = {"json": [], "compact": []}
+    for page_idx in range(50):
+        page = create_seeded_page(3, page_idx, page_assets)
+        for metadata_format, names in filenames.items():
+            page.dump_data(metadata_dir, dry=False,
+                           metadata_format=metadata_format)
+            names.append(get_metadata_file(metadata_dir, page.name,
+                                           metadata_format))
+
+    times = {metadata_format: [] for metadata_format in filenames}
+    for i in range(20):
+        for metadata_format, names in filenames.items():
+            start = time.process_time()
+            for filename in names:
+                Page().load_data(filename)
+            times[metadata_format].append(time.process_time() - start)
+
+    assert min(times["compact"]) <= min(times["json"])
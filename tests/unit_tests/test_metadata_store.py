@@ -0,0 +1,174 @@
+import os
+import json
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.page_creator import (
+    create_pages_metadata, create_seeded_page, render_pages
+)
+from preprocesing.layout_engine.metadata_store import (
+    MetadataStore, MetadataStoreWriter, is_metadata_store, close_shards,
+    open_shards
+)
+
+
+def test_store_writers_and_readers(page_assets, tmp_path):
+    """
+    This tests whether pages written by several writers to size
+    capped shards are read back by name and in shard order and
+    partly written records are left out
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the store to
+
+    :type tmp_path: pathlib.Path
+    """
+    store_dir = str(tmp_path / "store")
+    pages = [create_seeded_page(2, page_idx, page_assets)
+             for page_idx in range(6)]
+    expected = {page.name: json.loads(page.dump_data("", dry=True))
+                for page in pages}
+
+    page_bytes = len(json.dumps(expected[pages[0].name]))
+    writers = [MetadataStoreWriter(store_dir, "json",
+                                   shard_bytes=page_bytes*2)
+               for i in range(2)]
+    for idx, page in enumerate(pages):
+        shard_file, offset, length = writers[idx % 2].write_page(page)
+        assert os.path.dirname(shard_file) == store_dir
+
+    # A shard is a JSON Lines file
+    with open(shard_file) as shard:
+        assert json.loads(shard.readline())['name'] in expected
+
+    # A record that was cut off and it's index line
+    writers[0].write("cut_off", b"{")
+    with open(writers[0].shard_file.name, "r+b") as shard:
+        shard.truncate(writers[0].position - 1)
+    writers[0].index_file.write("half_written\t0")
+    writers[0].index_file.flush()
+
+    for writer in writers:
+        writer.close()
+
+    assert is_metadata_store(store_dir)
+    assert not is_metadata_store(str(tmp_path))
+
+    store = MetadataStore.load(store_dir)
+    assert len(store) == 6
+    assert len(store.shard_files) > 2
+    assert "cut_off" not in store
+
+    for name, data in expected.items():
+        assert store.get(name) == data
+    assert store.get("missing") is None
+
+    names = [data['name'] for data in store.iter_pages()]
+    assert sorted(names) == sorted(expected)
+
+    # Each shard is read from start to end in turn
+    locations = store.get_locations()
+    read_shards = [locations[0][0]]
+    for prev, location in zip(locations, locations[1:]):
+        if prev[0] == location[0]:
+            assert prev[1] < location[1]
+        else:
+            assert location[0] not in read_shards
+            read_shards.append(location[0])
+
+    # A page written again is read from where it was last written
+    writer = MetadataStoreWriter(store_dir, "json")
+    data = dict(expected[pages[0].name], background="background.png")
+    writer.write(pages[0].name, writer.serializer.dumps(data))
+    writer.close()
+    store = MetadataStore.load(store_dir)
+    assert len(store) == 6
+    assert store.get(pages[0].name)['background'] == "background.png"
+
+    # Shards opened to read records from are closed
+    assert len(open_shards) > 0
+    close_shards()
+    assert len(open_shards) == 0
+
+
+def test_store_keeps_last_written_record(tmp_path):
+    """
+    This tests whether a page written more than once is read from
+    the record written last whichever shard was written to last
+    and whether indices without when records were written are read
+
+    :param tmp_path: Directory to write the store to
+
+    :type tmp_path: pathlib.Path
+    """
+    store_dir = str(tmp_path / "store")
+    first, second = [MetadataStoreWriter(store_dir, "json")
+                     for i in range(2)]
+
+    first.write("page", b'{"name": "page", "copy": 1}')
+    second.write("page", b'{"name": "page", "copy": 2}')
+    # The first writer's index is written to last
+    first.write("other", b'{"name": "other"}')
+    os.utime(first.index_file.name, (1e10, 1e10))
+    index_file_name = second.index_file.name
+    first.close()
+    second.close()
+
+    store = MetadataStore.load(store_dir)
+    assert len(store) == 2
+    assert store.get("page")['copy'] == 2
+
+    # Indices from before records had when they were written
+    with open(index_file_name) as index_file:
+        lines = index_file.readlines()
+    with open(index_file_name, "w") as index_file:
+        for line in lines:
+            index_file.write(line.rsplit("\t", 1)[0] + "\n")
+
+    store = MetadataStore.load(store_dir)
+    assert store.get("page")['copy'] == 1
+    close_shards()
+
+
+def test_render_from_store(page_assets, tmp_path, monkeypatch):
+    """
+    This tests whether pages created by several workers into a
+    metadata store are all rendered from it
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the store and pages to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to leave out speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    # Rendering bubble text needs libraqm
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 1)
+
+    metadata_dir = tmp_path / "metadata"
+    images_dir = tmp_path / "images"
+    images_dir.mkdir()
+
+    names = create_pages_metadata(6, str(metadata_dir) + "/", seed=8,
+                                  workers=2, assets=page_assets,
+                                  metadata_store=True)
+
+    assert not any(filename.endswith(".json")
+                   for filename in os.listdir(metadata_dir))
+    store = MetadataStore.load(str(metadata_dir))
+    assert sorted(store.names) == sorted(names)
+
+    page = create_seeded_page(8, 3, page_assets)
+    assert store.get(names[3]) == json.loads(page.dump_data("", dry=True))
+
+    render_pages(str(metadata_dir) + "/", str(images_dir) + "/",
+                 workers=2)
+    assert sorted(os.listdir(images_dir)) == sorted(
+        name + cfg.output_format for name in names)
@@ -1,7 +1,11 @@
 import pytest
+import os
 import json
+import numpy as np
 import pandas as pd
-import os
+from PIL import Image
+
+from preprocesing import config_file as cfg
 
 from preprocesing.layout_engine.page_object_classes import (
                                 Page, Panel, SpeechBubble
@@ -10,41 +14,60 @@ from preprocesing.layout_engine.page_dataset_creator import (
                                 get_base_panels, populate_panels
                                 )
 from preprocesing.layout_engine.helpers import get_leaf_panels
+from preprocesing.layout_engine.assets import (
+    image_dir_path, text_dataset_path, speech_bubbles_path, font_files_path,
+    load_viable_fonts, load_speech_bubble_files, load_font_index
+)
+from preprocesing.layout_engine.speech_bubble_catalog import (
+    load_speech_bubble_catalog
+)
+from preprocesing.layout_engine.text_sampler import (
+    convert_corpus_to_arrow, load_text_corpus
+)
 
 
 @pytest.fixture(scope="module")
-def data_files():
-
-    image_dir_path = "datasets/image_dataset/db_illustrations_bw/"
-    image_dir = os.listdir(image_dir_path)
-
-    text_dataset = pd.read_parquet("datasets/text_dataset/jesc_dialogues")
-
-    speech_bubbles_path = "datasets/speech_bubbles_dataset/"
-
-    speech_bubble_files = os.listdir(speech_bubbles_path+"/files/")
-    speech_bubble_files = [speech_bubbles_path+"files/"+filename
-                           for filename in speech_bubble_files
-                           ]
-
-    speech_bubble_tags = pd.read_csv(speech_bubbles_path +
-                                     "writing_area_labels.csv")
+def data_files(tmp_path_factory):
+    """
+    The assets of the datasets folder loaded the way load_assets
+    does but with the Arrow corpus and speech bubble catalog
+    written to a temporary folder rather than the datasets folder
 
-    font_files_path = "datasets/font_dataset/"
-    viable_font_files = []
-    with open(font_files_path+"viable_fonts.csv") as viable_fonts:
+    :return: A tuple of the assets in the order
+    create_page_metadata takes them
 
-        for line in viable_fonts.readlines():
-            path, viable = line.split(",")
-            viable = viable.replace("\n", "")
-            if viable == "True":
-                viable_font_files.append(path)
+    :rtype: tuple
+    """
+    cache_dir = tmp_path_factory.mktemp("dataset_caches")
+
+    image_dir = [name for name in os.listdir(image_dir_path)
+                 if not name.endswith(".tmp")]
+
+    corpus_file = str(cache_dir / "jesc_dialogues.arrow")
+    convert_corpus_to_arrow(text_dataset_path, corpus_file)
+    text_dataset = load_text_corpus(corpus_file, cfg.text_columns)
+
+    speech_bubble_files = load_speech_bubble_files(speech_bubbles_path)
+    labels_file = speech_bubbles_path + "writing_area_labels.csv"
+    speech_bubble_tags = pd.read_csv(labels_file)
+    # fix kaggle path error
+    speech_bubble_tags['imagename'] = speech_bubble_tags[
+                                        'imagename'].str.replace('~', '-')
+    speech_bubble_tags = load_speech_bubble_catalog(
+                            speech_bubble_files,
+                            speech_bubble_tags,
+                            labels_file,
+                            str(cache_dir / "catalog.pkl")
+                            )
+
+    font_files = load_font_index(font_files_path,
+                                 load_viable_fonts(font_files_path))
 
     return (image_dir,
             image_dir_path,
-            viable_font_files,
+            font_files,
             text_dataset,
-            speech_bubble_files,
+            speech_bubble_tags.files,
             speech_bubble_tags
             )
 
@@ -276,3 +299,103 @@ def test_page_rendering(num_panels, speech_bubbles, data_files):
         page = populate_panels(page, *data_files)
 
     page.render(show=False)
+
+
+def test_page_bbox_compositing_matches_page_compositing(tmp_path,
+                                                        monkeypatch):
+    """
+    This tests whether compositing illustrations within each
+    panel's bounding box gives the same page as compositing
+    them with page sized masks
+
+    :param tmp_path: Directory to write the test illustration to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to switch compositing modes
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    # A gradient so that misaligned crops would show up
+    x = np.linspace(0, 255, 300)
+    y = np.linspace(0, 255, 400)
+    img_array = ((x[None, :] + y[:, None])/2).astype(np.uint8)
+    img_array[0:10, :] = 0
+    image_path = str(tmp_path / "illustration.png")
+    Image.fromarray(img_array).save(image_path)
+
+    page = get_base_panels(num_panels=5, layout_type="vh")
+    leaf_children = []
+    get_leaf_panels(page, leaf_children)
+    for panel in leaf_children:
+        panel.image = image_path
+
+    monkeypatch.setattr(cfg, "panel_compositing", "page")
+    page_composited = np.asarray(page.render(show=False), dtype=int)
+
+    monkeypatch.setattr(cfg, "panel_compositing", "bbox")
+    bbox_composited = np.asarray(page.render(show=False), dtype=int)
+
+    assert np.abs(page_composited - bbox_composited).max() <= 2
+
+
+@pytest.mark.parametrize("text_orientation", ["ttb", "ltr"])
+def test_speech_bubble_text_layout(text_orientation, font_file, tmp_path):
+    """
+    This tests whether a speech bubble's text layout can be
+    worked out without rendering, doesn't change the bubble's
+    writing areas and survives dumping and loading a page
+
+    :param text_orientation: Whether the text of this speech bubble
+    is written left to right ot top to bottom
+
+    :type text_orientation: str
+
+    :param font_file: Path to a test font
+
+    :type font_file: str
+
+    :param tmp_path: Directory to dump the page to
+
+    :type tmp_path: pathlib.Path
+    """
+    writing_areas = [
+        dict(x=10.0, y=10.0, width=60.0, height=70.0,
+             original_width=400, original_height=300)
+    ]
+    bubble = SpeechBubble(texts=[{"English": "Hi", "Japanese": "日本語"}],
+                          text_indices=[0],
+                          font=font_file,
+                          speech_bubble="bubble.png",
+                          writing_areas=writing_areas,
+                          resize_to=20000,
+                          location=[10, 10],
+                          width=400,
+                          height=300,
+                          transforms=["flip horizontal", "stretch x"],
+                          transform_metadata={"stretch_x_factor": 0.2},
+                          text_orientation=text_orientation
+                          )
+
+    transformed = bubble.transform_writing_areas()
+    assert bubble.writing_areas[0]['x'] == 10.0
+    assert transformed[0]['x'] != 10.0
+    assert transformed[0]['original_width'] == pytest.approx(480)
+
+    text_layout = bubble.layout_text()
+    assert len(text_layout) == 1
+    font_size = text_layout[0]['font_size']
+    assert cfg.min_font_size <= font_size <= bubble.font_size
+    assert len(text_layout[0]['lines']) > 0
+
+    page = Page()
+    page.speech_bubbles.append(bubble)
+    bubble.text_layout = text_layout
+    page.dump_data(str(tmp_path) + "/", dry=False)
+
+    loaded_page = Page()
+    loaded_page.load_data(str(tmp_path / (page.name + ".json")))
+    loaded_bubble = loaded_page.speech_bubbles[0]
+
+    assert loaded_bubble.font_size == bubble.font_size
+    assert loaded_bubble.text_layout == text_layout
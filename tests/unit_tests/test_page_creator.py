@@ -0,0 +1,430 @@
+import pytest
+import os
+import json
+from PIL import Image
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine import page_creator
+from preprocesing.layout_engine.page_creator import (
+    create_pages_metadata, create_seeded_page, generate_and_render_pages,
+    pipeline_pages, render_pages, write_page_image, flush_page_images
+)
+from preprocesing.layout_engine.caches import (
+    warm_caches, font_file_cache, speech_bubble_cache
+)
+
+
+def test_seeded_pages_are_reproducible(page_assets):
+    """
+    This tests whether a page only depends on the
+    run's seed and it's index
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+    """
+    page = create_seeded_page(7, 3, page_assets)
+    same_page = create_seeded_page(7, 3, page_assets)
+    other_page = create_seeded_page(7, 4, page_assets)
+
+    assert page.dump_data("", dry=True) == same_page.dump_data("", dry=True)
+    assert page.name != other_page.name
+
+
+def test_metadata_independent_of_workers(page_assets, tmp_path):
+    """
+    This tests whether the same seed gives the same page metadata
+    whatever the number of workers creating it
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the metadata to
+
+    :type tmp_path: pathlib.Path
+    """
+    outputs = []
+    for workers in [1, 2]:
+        metadata_dir = tmp_path / str(workers)
+        metadata_dir.mkdir()
+        names = create_pages_metadata(6,
+                                      str(metadata_dir) + "/",
+                                      seed=1234,
+                                      workers=workers,
+                                      assets=page_assets
+                                      )
+
+        files = {}
+        for filename in os.listdir(metadata_dir):
+            with open(metadata_dir / filename) as json_file:
+                files[filename] = json_file.read()
+
+        assert len(files) == 6
+        outputs.append((names, files))
+
+    assert outputs[0] == outputs[1]
+
+
+def test_generate_and_render_pages(page_assets, tmp_path, monkeypatch):
+    """
+    This tests whether pages can be created and rendered in one go
+    with their metadata written as a side output that matches
+    what create_pages_metadata writes
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write pages to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to leave out speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    # Rendering bubble text needs libraqm
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 1)
+
+    images_dir = tmp_path / "images"
+    metadata_dir = tmp_path / "metadata"
+    images_dir.mkdir()
+    metadata_dir.mkdir()
+
+    names = generate_and_render_pages(4,
+                                      str(images_dir) + "/",
+                                      metadata_dir=str(metadata_dir) + "/",
+                                      seed=99,
+                                      workers=2,
+                                      assets=page_assets
+                                      )
+
+    assert sorted(os.listdir(images_dir)) == sorted(
+        name + cfg.output_format for name in names)
+
+    for idx, name in enumerate(names):
+        with open(metadata_dir / (name + ".json")) as json_file:
+            data = json.load(json_file)
+
+        page = create_seeded_page(99, idx, page_assets)
+        assert data == json.loads(page.dump_data("", dry=True))
+
+
+def test_failed_metadata_write(page_assets, tmp_path, monkeypatch):
+    """
+    This tests whether a page whose metadata couldn't be
+    written in the background fails the run
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write pages to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to make writing metadata fail
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    def write_metadata(filename, metadata):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(page_creator, "write_metadata", write_metadata)
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 1)
+
+    with pytest.raises(OSError, match="No space"):
+        generate_and_render_pages(2,
+                                  str(tmp_path) + "/",
+                                  metadata_dir=str(tmp_path) + "/",
+                                  seed=4,
+                                  workers=1,
+                                  assets=page_assets
+                                  )
+
+
+def test_pipeline_pages(page_assets, tmp_path, monkeypatch):
+    """
+    This tests whether pages flow from the metadata workers
+    to the render workers through a small queue
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write pages to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to leave out speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    # Rendering bubble text needs libraqm
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 1)
+
+    images_dir = tmp_path / "images"
+    metadata_dir = tmp_path / "metadata"
+    images_dir.mkdir()
+    metadata_dir.mkdir()
+
+    stage_rates = pipeline_pages(5,
+                                 str(metadata_dir) + "/",
+                                 str(images_dir) + "/",
+                                 seed=5,
+                                 metadata_workers=1,
+                                 render_workers=2,
+                                 queue_size=2,
+                                 assets=page_assets
+                                 )
+
+    assert len(os.listdir(metadata_dir)) == 5
+    assert len(os.listdir(images_dir)) == 5
+    assert stage_rates['metadata'] > 0
+    assert stage_rates['render'] > 0
+
+    # How busy each stage was shows which one holds the other up
+    assert 0 < stage_rates['metadata_busy'] <= 1
+    assert 0 < stage_rates['render_busy'] <= 1
+    assert 0 <= stage_rates['queue_full'] + stage_rates['queue_empty'] <= 1
+
+    # Dry runs still pass pages through their metadata
+    dry_metadata_dir = tmp_path / "dry_metadata"
+    pipeline_pages(2,
+                   str(dry_metadata_dir) + "/",
+                   str(tmp_path / "missing") + "/",
+                   seed=5,
+                   metadata_workers=1,
+                   render_workers=1,
+                   assets=page_assets,
+                   dry=True
+                   )
+    assert len(os.listdir(dry_metadata_dir)) == 2
+    assert not os.path.isdir(tmp_path / "missing")
+
+
+@pytest.mark.parametrize("preload", [False, True])
+def test_render_pages(preload, page_assets, tmp_path, monkeypatch):
+    """
+    This tests whether metadata files are rendered with chunked
+    dispatch both by workers that warm up themselves and by
+    workers forked from a warmed up process
+
+    :param preload: Whether to fork workers from a warmed up process
+
+    :type preload: bool
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write pages to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to leave out speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    # Rendering bubble text needs libraqm
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 1)
+
+    images_dir = tmp_path / "images"
+    metadata_dir = tmp_path / "metadata"
+    images_dir.mkdir()
+    metadata_dir.mkdir()
+
+    create_pages_metadata(5, str(metadata_dir) + "/", seed=3,
+                          workers=1, assets=page_assets)
+    render_pages(str(metadata_dir) + "/", str(images_dir) + "/",
+                 workers=2, chunksize=2, preload=preload)
+
+    assert len(os.listdir(images_dir)) == 5
+
+    # Pages that were already rendered aren't laid out again
+    def get_page_render_plan(data, assets=None):
+        raise AssertionError("Page " + data['name'] + " was laid out")
+
+    monkeypatch.setattr(page_creator, "get_page_render_plan",
+                        get_page_render_plan)
+    render_pages(str(metadata_dir) + "/", str(images_dir) + "/",
+                 workers=2, chunksize=2, preload=preload)
+
+
+def test_warm_caches(page_assets):
+    """
+    This tests whether warming up a worker loads
+    fonts and speech bubble templates into it's caches
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+    """
+    font_files = page_assets[2]
+    speech_bubble_files = page_assets[4]
+
+    font_file_cache.clear()
+    speech_bubble_cache.clear()
+    warm_caches(font_files, speech_bubble_files)
+
+    assert font_files[0] in font_file_cache
+    for path in speech_bubble_files:
+        assert path in speech_bubble_cache
+
+
+def test_warm_caches_within_budget(font_file, tmp_path, monkeypatch):
+    """
+    This tests whether warming up a worker stops reading font
+    files once the font file cache's memory budget is used up
+
+    :param font_file: A font file to copy
+
+    :type font_file: str
+
+    :param tmp_path: Directory to write the copies to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to shrink the memory budget
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    with open(font_file, "rb") as font:
+        font_bytes = font.read()
+
+    font_files = []
+    for i in range(4):
+        path = str(tmp_path / ("font_%d.ttf" % i))
+        with open(path, "wb") as font:
+            font.write(font_bytes)
+        font_files.append(path)
+
+    font_file_cache.clear()
+    monkeypatch.setattr(font_file_cache, "max_bytes", len(font_bytes)*2)
+    warm_caches(font_files)
+
+    assert font_files[0] in font_file_cache
+    assert font_files[1] in font_file_cache
+    assert font_files[2] not in font_file_cache
+    assert font_file_cache.misses == 2
+    assert font_file_cache.evictions == 0
+    font_file_cache.clear()
+
+
+@pytest.mark.parametrize("threads", [0, 2])
+def test_write_page_image(threads, tmp_path, monkeypatch):
+    """
+    This tests whether pages are written both straight away
+    and in the background with the encoder settings
+
+    :param threads: Number of writer threads
+
+    :type threads: int
+
+    :param tmp_path: Directory to write pages to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to change the writer settings
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    monkeypatch.setattr(cfg, "image_writer_threads", threads)
+    monkeypatch.setattr(cfg, "image_writer_max_in_flight", 1)
+    monkeypatch.setattr(cfg, "image_encoder_options",
+                        dict(compress_level=1))
+
+    for i in range(3):
+        img = Image.new("L", (50, 60), 255)
+        write_page_image(img, str(tmp_path / ("%d.png" % i)))
+    flush_page_images()
+
+    for i in range(3):
+        with Image.open(tmp_path / ("%d.png" % i)) as img:
+            assert img.size == (50, 60)
+
+
+@pytest.mark.parametrize("threads", [0, 2])
+def test_failed_page_image_write(threads, tmp_path, monkeypatch):
+    """
+    This tests whether a page that fails to be written half way
+    leaves no file behind to be taken as rendered and fails
+    the worker both straight away and in the background
+
+    :param threads: Number of writer threads
+
+    :type threads: int
+
+    :param tmp_path: Directory to write pages to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to make writing pages fail
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    def save(img, filename, **kwargs):
+        with open(filename, "wb") as page_file:
+            page_file.write(b"\x89PNG")
+        raise OSError("Disk quota exceeded")
+
+    monkeypatch.setattr(cfg, "image_writer_threads", threads)
+    monkeypatch.setattr(Image.Image, "save", save)
+
+    with pytest.raises(OSError, match="quota"):
+        write_page_image(Image.new("L", (50, 60), 255),
+                         str(tmp_path / "page.png"))
+        flush_page_images()
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_assets_loaded_before_workers(page_assets, tmp_path, monkeypatch):
+    """
+    This tests whether the assets are loaded once before the
+    workers start rather than by each worker
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write pages to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to only let this process load the assets
+    and leave out speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    # Rendering bubble text needs libraqm
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 1)
+
+    parent = os.getpid()
+    loaded = []
+
+    def load_assets():
+        if os.getpid() != parent:
+            raise AssertionError("A worker loaded the assets")
+        loaded.append(parent)
+        return page_assets
+
+    monkeypatch.setattr(page_creator, "load_assets", load_assets)
+
+    metadata_dir = str(tmp_path / "metadata") + "/"
+    images_dir = tmp_path / "images"
+    os.makedirs(metadata_dir)
+    images_dir.mkdir()
+
+    create_pages_metadata(2, metadata_dir, seed=9, workers=2,
+                          metadata_format="seed")
+    assert len(loaded) == 1
+
+    render_pages(metadata_dir, str(images_dir) + "/", workers=2)
+    assert len(loaded) == 2
+    assert len(os.listdir(images_dir)) == 2
+
+    generate_and_render_pages(2, str(tmp_path / "generated") + "/",
+                              seed=9, workers=2, dry=True)
+    assert len(loaded) == 3
@@ -0,0 +1,191 @@
+import pytest
+import os
+import json
+import numpy as np
+from PIL import Image
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.page_creator import (
+    create_pages_metadata, create_seeded_page, load_page, load_render_plan,
+    render_pages
+)
+from preprocesing.layout_engine.page_object_classes import Page
+from preprocesing.layout_engine.metadata_serializers import (
+    get_metadata_file, get_serializer, read_metadata
+)
+from preprocesing.layout_engine.render_plan import (
+    get_render_plan, get_text_direction, is_render_plan, render_page_plan
+)
+
+
+def test_plan_matches_page(page_assets, monkeypatch):
+    """
+    This tests whether the render plan flattened from a page's
+    metadata is the one of the page loaded from it, survives
+    JSON and has the text of it's bubbles laid out
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param monkeypatch: Used to make sure pages have speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 4)
+
+    num_bubbles = 0
+    for page_idx in range(8):
+        data = create_seeded_page(6, page_idx, page_assets).dump_data_dict()
+        page = Page()
+        page.load_data_dict(data)
+
+        plan = get_render_plan(data)
+        assert plan == page.get_render_plan()
+        assert json.loads(json.dumps(plan)) == plan
+        assert is_render_plan(plan)
+        assert not is_render_plan(data)
+
+        if data['num_panels'] > 1:
+            assert len(plan['panels']) > 0
+        for bubble in plan['speech_bubbles']:
+            assert len(bubble['text_layout']) == 1
+        num_bubbles += len(plan['speech_bubbles'])
+
+    assert num_bubbles > 0
+
+
+def test_render_from_plans(page_assets, tmp_path, monkeypatch):
+    """
+    This tests whether render plans written when pages are
+    created render the same images as the pages themselves
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the plans and pages to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to leave out speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    # Rendering bubble text needs libraqm
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 1)
+
+    metadata_dir = str(tmp_path / "metadata") + "/"
+    images_dir = tmp_path / "images"
+    os.makedirs(metadata_dir)
+    images_dir.mkdir()
+
+    names = create_pages_metadata(4, metadata_dir, seed=17, workers=1,
+                                  assets=page_assets,
+                                  metadata_format="plan")
+    assert sorted(os.listdir(metadata_dir)) == sorted(
+        name + ".plan" for name in names)
+
+    render_pages(metadata_dir, str(images_dir) + "/", workers=2)
+
+    for page_idx, name in enumerate(names):
+        page = create_seeded_page(17, page_idx, page_assets)
+        filename = get_metadata_file(metadata_dir, name, "plan")
+        assert read_metadata(filename) == page.get_render_plan()
+        assert load_render_plan(filename) == page.get_render_plan()
+
+        expected = np.asarray(page.render(show=False))
+        assert np.array_equal(np.asarray(render_page_plan(
+            page.get_render_plan())), expected)
+
+        rendered = Image.open(str(images_dir / (name + cfg.output_format)))
+        assert np.array_equal(np.asarray(rendered), expected)
+
+    # Plans can only be rendered
+    with pytest.raises(ValueError):
+        load_page(filename)
+
+
+def set_left_to_right(data):
+    """
+    Make the text of every speech bubble of a page's
+    metadata left to right and lay it out again
+
+    NOTE: This function performs actions by reference
+
+    :param data: The page's or a panel's metadata
+
+    :type data: dict
+    """
+    for bubble in data['speech_bubbles']:
+        bubble['text_orientation'] = "ltr"
+        bubble['text_layout'] = None
+    for child in data['children']:
+        set_left_to_right(child)
+
+
+def test_render_speech_bubbles(page_assets, tmp_path, monkeypatch):
+    """
+    This tests whether pages with speech bubbles are drawn the
+    same from their objects, their render plans and by
+    render_pages. Their text is left to right so that it can be
+    drawn without libraqm.
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the plans and pages to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to make sure pages have speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 4)
+
+    metadata_dir = str(tmp_path / "metadata") + "/"
+    images_dir = tmp_path / "images"
+    os.makedirs(metadata_dir)
+    images_dir.mkdir()
+
+    serializer = get_serializer("plan")
+    expected = {}
+    for page_idx in range(4):
+        data = create_seeded_page(5, page_idx, page_assets).dump_data_dict()
+        set_left_to_right(data)
+        page = Page()
+        page.load_data_dict(data)
+
+        plan = page.get_render_plan()
+        if len(plan['speech_bubbles']) == 0:
+            continue
+
+        rendered = np.asarray(page.render(show=False))
+        assert np.array_equal(np.asarray(render_page_plan(plan)),
+                              rendered)
+
+        # The bubbles and their text were drawn
+        no_bubbles = np.asarray(render_page_plan(dict(plan,
+                                                      speech_bubbles=[])))
+        assert not np.array_equal(rendered, no_bubbles)
+        no_text = dict(plan, speech_bubbles=[
+            dict(bubble, text_layout=[]) for bubble in plan['speech_bubbles']
+        ])
+        assert not np.array_equal(np.asarray(render_page_plan(no_text)),
+                                  rendered)
+
+        with open(get_metadata_file(metadata_dir, page.name, "plan"),
+                  "w") as plan_file:
+            plan_file.write(serializer.dumps(plan))
+        expected[page.name] = rendered
+
+    assert len(expected) > 0
+    assert get_text_direction("ltr") is None
+    assert get_text_direction("ttb") == "ttb"
+
+    render_pages(metadata_dir, str(images_dir) + "/", workers=2)
+    for name, rendered in expected.items():
+        image = Image.open(str(images_dir / (name + cfg.output_format)))
+        assert np.array_equal(np.asarray(image), rendered)
@@ -0,0 +1,159 @@
+import pytest
+import os
+import json
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.page_creator import (
+    create_pages_metadata, create_seeded_page, load_page, regenerate_page,
+    render_pages
+)
+from preprocesing.layout_engine.page_object_classes import Page
+from preprocesing.layout_engine.metadata_serializers import (
+    get_metadata_file, read_metadata
+)
+from preprocesing.layout_engine.metadata_store import MetadataStore
+from preprocesing.layout_engine.seed_metadata import (
+    get_fingerprint, is_seed_record
+)
+
+
+def test_pages_made_from_seeds(page_assets, tmp_path):
+    """
+    This tests whether seed metadata is tiny and makes the
+    same pages as the ones created when it was written
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the metadata to
+
+    :type tmp_path: pathlib.Path
+    """
+    metadata_dir = str(tmp_path) + "/"
+    names = create_pages_metadata(4, metadata_dir, seed=13, workers=1,
+                                  assets=page_assets,
+                                  metadata_format="seed")
+
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        name + ".seed" for name in names)
+
+    for page_idx, name in enumerate(names):
+        filename = get_metadata_file(metadata_dir, name, "seed")
+        assert os.path.getsize(filename) < 200
+
+        data = read_metadata(filename)
+        assert is_seed_record(data)
+
+        page = create_seeded_page(13, page_idx, page_assets)
+        assert page.name == name
+        assert regenerate_page(data, page_assets).dump_data_dict() == \
+            page.dump_data_dict()
+
+    # A page is only dumped as a seed when it's created
+    with pytest.raises(ValueError):
+        page.dump_data(metadata_dir, metadata_format="seed")
+
+
+def test_fingerprint_mismatch(page_assets, tmp_path, monkeypatch):
+    """
+    This tests whether pages aren't made from their seeds after
+    the config they were made with changed unless only how
+    they're rendered changed
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the metadata to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to change the config
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    metadata_dir = str(tmp_path) + "/"
+    names = create_pages_metadata(1, metadata_dir, seed=3, workers=1,
+                                  assets=page_assets,
+                                  metadata_format="seed")
+    data = read_metadata(get_metadata_file(metadata_dir, names[0], "seed"))
+    fingerprint = get_fingerprint(page_assets)
+    assert data['fingerprint'] == fingerprint
+
+    monkeypatch.setattr(cfg, "output_format", ".jpg")
+    monkeypatch.setattr(cfg, "metadata_format", "compact")
+    assert get_fingerprint(page_assets) == fingerprint
+    regenerate_page(data, page_assets)
+
+    monkeypatch.setattr(cfg, "page_width", cfg.page_width + 1)
+    with pytest.raises(ValueError, match="config"):
+        regenerate_page(data, page_assets)
+    monkeypatch.undo()
+
+    other_assets = list(page_assets)
+    other_assets[2] = page_assets[2][:-1]
+    with pytest.raises(ValueError, match="assets"):
+        regenerate_page(data, tuple(other_assets))
+
+    # A corpus of the same length with different texts
+    other_assets = list(page_assets)
+    other_assets[3] = page_assets[3].copy()
+    other_assets[3].loc[1, 'Japanese'] = "こんばんは"
+    with pytest.raises(ValueError, match="assets"):
+        regenerate_page(data, tuple(other_assets))
+
+
+def test_render_from_seeds(page_assets, tmp_path, monkeypatch):
+    """
+    This tests whether pages are rendered from seed metadata
+    files and from seed records of a metadata store
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the metadata and pages to
+
+    :type tmp_path: pathlib.Path
+
+    :param monkeypatch: Used to leave out speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    # Rendering bubble text needs libraqm
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 1)
+
+    for metadata_store in [False, True]:
+        metadata_dir = tmp_path / ("store" if metadata_store else "files")
+        images_dir = tmp_path / ("store_images" if metadata_store
+                                 else "images")
+        metadata_dir.mkdir()
+        images_dir.mkdir()
+
+        names = create_pages_metadata(3, str(metadata_dir) + "/", seed=21,
+                                      workers=2, assets=page_assets,
+                                      metadata_format="seed",
+                                      metadata_store=metadata_store)
+
+        if metadata_store:
+            store = MetadataStore.load(str(metadata_dir))
+            location = store.get_location(names[1])
+            # Shards of seed records are JSON Lines files
+            with open(location[0]) as shard:
+                assert all(is_seed_record(json.loads(line))
+                           for line in shard)
+            page = load_page(location, page_assets)
+        else:
+            filename = get_metadata_file(str(metadata_dir) + "/",
+                                         names[1], "seed")
+            page = load_page(filename, page_assets)
+
+        assert isinstance(page, Page)
+        assert page.dump_data_dict() == \
+            create_seeded_page(21, 1, page_assets).dump_data_dict()
+
+        render_pages(str(metadata_dir) + "/", str(images_dir) + "/",
+                     workers=2, assets=page_assets)
+        assert sorted(os.listdir(images_dir)) == sorted(
+            name + cfg.output_format for name in names)
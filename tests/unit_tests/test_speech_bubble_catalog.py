@@ -0,0 +1,109 @@
+import numpy as np
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.page_object_classes import Panel
+from preprocesing.layout_engine.page_dataset_creator import (
+    create_single_panel_metadata
+)
+from preprocesing.layout_engine.speech_bubble_catalog import (
+    SpeechBubbleCatalog, load_speech_bubble_catalog
+)
+
+
+def test_catalog_lookup(page_assets):
+    """
+    This tests whether the catalog has the parsed writing areas,
+    pixel areas and size of each template and hands out copies
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+    """
+    speech_bubble_files, speech_bubble_tags = page_assets[4:]
+    catalog = SpeechBubbleCatalog.build(speech_bubble_files,
+                                        speech_bubble_tags)
+
+    assert len(catalog) == 2
+    path, writing_areas, size = catalog.get(1)
+    assert path == speech_bubble_files[1]
+    assert size == (160, 220)
+    assert writing_areas[0]['width'] == 60.0
+    assert catalog.pixel_areas[1][0] == (32.0, 44.0, 96.0, 132.0)
+
+    writing_areas[0]['width'] = 10.0
+    assert catalog.get(1)[1][0]['width'] == 60.0
+
+
+def test_catalog_cache_file(page_assets, tmp_path):
+    """
+    This tests whether the catalog is written to and read
+    back from it's cache file
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the cache to
+
+    :type tmp_path: pathlib.Path
+    """
+    speech_bubble_files, speech_bubble_tags = page_assets[4:]
+    labels_file = tmp_path / "writing_area_labels.csv"
+    speech_bubble_tags.to_csv(labels_file, index=False)
+    catalog_file = str(tmp_path / "catalog.pkl")
+
+    catalog = load_speech_bubble_catalog(speech_bubble_files,
+                                         speech_bubble_tags,
+                                         str(labels_file),
+                                         catalog_file)
+
+    # The labels aren't read again once they're cached
+    cached = load_speech_bubble_catalog(speech_bubble_files,
+                                        None,
+                                        str(labels_file),
+                                        catalog_file)
+
+    assert cached.files == catalog.files
+    assert cached.writing_areas == catalog.writing_areas
+    assert cached.sizes == catalog.sizes
+
+
+def test_catalog_matches_dataframe_lookup(page_assets, monkeypatch):
+    """
+    This tests whether panels get the same speech bubbles
+    from the catalog as from the writing area labels
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param monkeypatch: Used to make sure panels have speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 4)
+    monkeypatch.setattr(cfg, "precompute_text_layout", False)
+
+    (image_dir, image_dir_path, font_files, text_dataset,
+     speech_bubble_files, speech_bubble_tags) = page_assets
+    catalog = SpeechBubbleCatalog.build(speech_bubble_files,
+                                        speech_bubble_tags)
+
+    dumps = []
+    for tags in [speech_bubble_tags, catalog]:
+        np.random.seed(42)
+        coords = [(0, 0), (0, 500), (400, 500), (400, 0), (0, 0)]
+        panel = Panel(coords, "panel", None, "h")
+        create_single_panel_metadata(panel,
+                                     image_dir,
+                                     image_dir_path,
+                                     font_files,
+                                     text_dataset,
+                                     speech_bubble_files,
+                                     tags,
+                                     minimum_speech_bubbles=2
+                                     )
+        dumps.append([bubble.dump_data() for bubble in panel.speech_bubbles])
+
+    assert len(dumps[0]) >= 2
+    assert dumps[0] == dumps[1]
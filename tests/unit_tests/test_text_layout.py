@@ -0,0 +1,88 @@
+import pytest
+import numpy as np
+
+from preprocesing.layout_engine.text_layout import (
+    break_lines, fit_text, get_char_advances, get_line_height
+)
+
+
+def test_break_lines():
+    """
+    This tests whether lines are broken at the last
+    character that fits and that each line has at least
+    one character
+    """
+    advances = np.array([10, 10, 10, 10, 10])
+
+    assert break_lines(advances, 25) == [(0, 2), (2, 4), (4, 5)]
+    assert break_lines(advances, 50) == [(0, 5)]
+    assert break_lines(advances, 5) == [(0, 1), (1, 2), (2, 3),
+                                        (3, 4), (4, 5)]
+
+
+@pytest.mark.parametrize(
+    "line_length, lines_extent",
+    [
+        (400, 400),
+        (200, 300),
+        (1000, 100),
+        (150, 1000),
+    ]
+)
+def test_fit_text_fits(line_length, lines_extent, font_file):
+    """
+    This tests whether the fitted text fits in the writing area
+    and that the font size found is the largest one that fits
+
+    :param line_length: Length available along a line
+
+    :type line_length: float
+
+    :param lines_extent: Length available to stack lines
+
+    :type lines_extent: float
+
+    :param font_file: Path to a test font
+
+    :type font_file: str
+    """
+    text = "あいうえおかきくけこ日本語"
+    size, segments, line_height = fit_text(font_file, 40, text,
+                                           line_length, lines_extent,
+                                           min_font_size=10)
+
+    assert 10 <= size <= 40
+    assert len(segments)*line_height <= lines_extent
+    for segment in segments:
+        length = get_char_advances(font_file, size, segment).sum()
+        assert length <= line_length or len(segment) == 1
+
+    # Nothing is truncated if a font size fits
+    if size > 10:
+        assert "".join(segments) == text
+
+    # The next font size up doesn't fit
+    if size < 40:
+        advances = get_char_advances(font_file, size + 1, text)
+        lines = break_lines(advances, line_length)
+        next_height = get_line_height(font_file, size + 1)
+        assert len(lines)*next_height > lines_extent
+
+
+def test_fit_text_truncates(font_file):
+    """
+    This tests whether text that doesn't fit at the minimum
+    font size is truncated to the lines that fit
+
+    :param font_file: Path to a test font
+
+    :type font_file: str
+    """
+    text = "あいうえお"*20
+    size, segments, line_height = fit_text(font_file, 30, text,
+                                           100, 50,
+                                           min_font_size=20)
+
+    assert size == 20
+    assert len(segments) == 50//line_height
+    assert text.startswith("".join(segments))
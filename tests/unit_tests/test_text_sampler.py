@@ -0,0 +1,178 @@
+import pytest
+import os
+import pickle
+import numpy as np
+import pyarrow as pa
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.page_object_classes import Panel
+from preprocesing.layout_engine.page_dataset_creator import (
+    create_single_panel_metadata
+)
+from preprocesing.layout_engine.text_sampler import (
+    TextSampler, convert_corpus_to_arrow, load_text_corpus
+)
+
+
+def test_sampler_matches_dataframe(page_assets):
+    """
+    This tests whether the sampler picks the same
+    texts as indexing the DataFrame would
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+    """
+    text_dataset = page_assets[3]
+    sampler = TextSampler.from_dataframe(text_dataset)
+
+    np.random.seed(0)
+    text_indices, texts = sampler.sample(10)
+
+    np.random.seed(0)
+    expected_indices = [np.random.randint(0, len(text_dataset))
+                        for i in range(10)]
+
+    assert text_indices == expected_indices
+    assert texts == [text_dataset.iloc[idx].to_dict()
+                     for idx in expected_indices]
+
+
+def test_sampler_columns(page_assets):
+    """
+    This tests whether the sampler can read only
+    some columns or only pick indices
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+    """
+    text_dataset = page_assets[3]
+    table = pa.Table.from_pandas(text_dataset, preserve_index=False)
+
+    sampler = TextSampler.from_table(table, columns=["Japanese"])
+    assert len(sampler) == 4
+    assert sampler.get_texts(np.array([3, 0])) == [{"Japanese": "はい"},
+                                                   {"Japanese": "こんにちは"}]
+
+    sampler = TextSampler({}, num_texts=len(text_dataset))
+    text_indices, texts = sampler.sample(3)
+    assert len(text_indices) == 3
+    assert texts == [{}, {}, {}]
+
+
+def test_sampler_panel_metadata(page_assets, monkeypatch):
+    """
+    This tests whether panels get the same texts
+    from the sampler as from the DataFrame
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param monkeypatch: Used to make sure panels have speech bubbles
+
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    monkeypatch.setattr(cfg, "max_speech_bubbles_per_panel", 4)
+    monkeypatch.setattr(cfg, "precompute_text_layout", False)
+
+    (image_dir, image_dir_path, font_files, text_dataset,
+     speech_bubble_files, speech_bubble_tags) = page_assets
+
+    dumps = []
+    for texts in [text_dataset, TextSampler.from_dataframe(text_dataset)]:
+        np.random.seed(5)
+        coords = [(0, 0), (0, 500), (400, 500), (400, 0), (0, 0)]
+        panel = Panel(coords, "panel", None, "h")
+        create_single_panel_metadata(panel,
+                                     image_dir,
+                                     image_dir_path,
+                                     font_files,
+                                     texts,
+                                     speech_bubble_files,
+                                     speech_bubble_tags,
+                                     minimum_speech_bubbles=2
+                                     )
+        dumps.append([bubble.dump_data() for bubble in panel.speech_bubbles])
+
+    assert len(dumps[0]) >= 2
+    assert dumps[0] == dumps[1]
+
+
+def test_memory_mapped_corpus(page_assets, tmp_path):
+    """
+    This tests whether the corpus is converted to an Arrow
+    file, memory mapped with only the columns asked for and
+    sent to other processes as it's file
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the corpus to
+
+    :type tmp_path: pathlib.Path
+    """
+    text_dataset = page_assets[3]
+    text_dataset_path = tmp_path / "jesc_dialogues"
+    text_dataset_path.mkdir()
+    text_dataset.iloc[:2].to_parquet(text_dataset_path / "part.0.parquet")
+    text_dataset.iloc[2:].to_parquet(text_dataset_path / "part.1.parquet")
+
+    sampler = load_text_corpus(str(text_dataset_path), ["Japanese"])
+
+    assert os.path.isfile(str(text_dataset_path) + ".arrow")
+    assert len(sampler) == 4
+    assert sampler.column_names == ["Japanese"]
+    assert sampler.get_texts(np.arange(4)) == [
+        {"Japanese": text} for text in text_dataset["Japanese"]
+    ]
+
+    # Only the file is pickled not the texts
+    state = pickle.dumps(sampler)
+    assert "はい".encode() not in state
+
+    unpickled = pickle.loads(state)
+    assert unpickled.corpus_file == sampler.corpus_file
+    assert unpickled.get_texts([3]) == [{"Japanese": "はい"}]
+
+
+def test_corpus_converted_in_batches(page_assets, tmp_path):
+    """
+    This tests whether the corpus is converted a few rows at
+    a time and an interrupted conversion leaves no Arrow file
+
+    :param page_assets: Assets to create pages from
+
+    :type page_assets: tuple
+
+    :param tmp_path: Directory to write the corpus to
+
+    :type tmp_path: pathlib.Path
+    """
+    text_dataset = page_assets[3]
+    text_dataset_path = tmp_path / "jesc_dialogues"
+    text_dataset_path.mkdir()
+    text_dataset.iloc[:3].to_parquet(text_dataset_path / "part.0.parquet")
+    text_dataset.iloc[3:].to_parquet(text_dataset_path / "part.1.parquet")
+
+    corpus_file = str(tmp_path / "corpus.arrow")
+    convert_corpus_to_arrow(str(text_dataset_path), corpus_file,
+                            batch_size=2)
+
+    sampler = load_text_corpus(corpus_file)
+    assert sampler.column_names == ["English", "Japanese"]
+    assert sampler.columns["Japanese"].num_chunks == 3
+    assert sampler.get_texts(np.arange(4)) == \
+        text_dataset.to_dict("records")
+    assert sampler.get_texts([3, 0], ["Japanese"]) == \
+        text_dataset.loc[[3, 0], ["Japanese"]].to_dict("records")
+
+    with open(text_dataset_path / "part.2.parquet", "wb") as corrupt_file:
+        corrupt_file.write(b"not parquet")
+    other_file = str(tmp_path / "other.arrow")
+    with pytest.raises(pa.ArrowInvalid):
+        convert_corpus_to_arrow(str(text_dataset_path), other_file)
+    assert sorted(os.listdir(tmp_path)) == ["corpus.arrow",
+                                            "jesc_dialogues"]
@@ -1,16 +1,30 @@
 import os
+import sys
+
+# Run from the repository's root so the preprocessing code can be imported
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocesing.convert_images import pack_images  # noqa: E402
 
-print("Creating zip")
-zip_name = "db_illustrations_bw.zip"
 zip_folder = "db_illustrations_bw"
-if not os.path.isfile("dataset/image_dataset/"+zip_name):
-    os.system('cd datasets/image_dataset; zip -r -q %s %s' % (zip_name, zip_folder))
+
+# Pack the images into a few large files instead of a zip
+# that rendering can read them from directly
+if "--pack" in sys.argv:
+    print("Creating pack")
+    pack_images()
 else:
-    print("Zip file already exists")
+    print("Creating zip")
+    zip_name = "db_illustrations_bw.zip"
+    if not os.path.isfile("datasets/image_dataset/"+zip_name):
+        os.system('cd datasets/image_dataset; zip -r -q %s %s' % (zip_name,
+                                                                  zip_folder))
+    else:
+        print("Zip file already exists")
 
-print("Please confirm removal the folder of the zip now:")
+print("Please confirm removal the folder of the images now:")
 inp = input("y/n")
-if inp.lower() = "y":
+if inp.lower() == "y":
     os.system("cd datasets/image_dataset; rm -r %s" % zip_folder)
 else:
-    print("You have chosen not to remove the zip folder")
+    print("You have chosen not to remove the images folder")
@@ -1,13 +1,26 @@
 import os
+import sys
 
+# Run from the repository's root so the preprocessing code can be imported
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-print("Decompressing images")
-zip_file = "db_illustrations_bw.zip"
-os.system("cd datasets/image_dataset; unzip %s" % zip_file)
+from preprocesing import config_file as cfg  # noqa: E402
+from preprocesing.convert_images import unpack_images  # noqa: E402
 
-print("Please confirm removal of the zip:")
+# Unpack the images from their pack instead of a zip
+if "--pack" in sys.argv:
+    print("Unpacking images")
+    unpack_images()
+    remove_command = "rm -r %s" % cfg.illustration_pack_dir
+else:
+    print("Decompressing images")
+    zip_file = "db_illustrations_bw.zip"
+    os.system("cd datasets/image_dataset; unzip %s" % zip_file)
+    remove_command = "cd datasets/image_dataset; rm %s" % zip_file
+
+print("Please confirm removal of the archive:")
 inp = input("y/n")
-if inp.lower() = "y":
-    os.system("cd datasets/image_dataset; rm %s" % zip_file)
+if inp.lower() == "y":
+    os.system(remove_command)
 else:
-    print("You have chosen not to remove the zip folder")
\ No newline at end of file
+    print("You have chosen not to remove the archive")